@@ -0,0 +1,69 @@
+"""Benchmark of the memory usage and pickling time of the detailed points of a map (:class:`cartoreader_lite.high_level.study.CartoPointDetailData`),
+comparing the slotted representation holding the signals as arrays with a representation holding them as one DataFrame per signal type in the `__dict__` of each point.
+Signals are kept per point (i.e. not linked to a :class:`cartoreader_lite.high_level.study.SignalStore`).
+
+Usage: python benchmarks/bench_point_detail.py [--nr-points 1000 5000] [--nr-samples 2500] [--repeats 3]
+"""
+
+import argparse
+import pickle
+import time
+import tracemalloc
+import json
+import numpy as np
+import pandas as pd
+from cartoreader_lite.high_level.study import CartoPointDetailData, ecg_labels
+
+class DataFramePointDetailData():
+    """Former representation of the points, holding the signals as DataFrames
+    """
+
+    def __init__(self, point : CartoPointDetailData) -> None:
+        for k in CartoPointDetailData._main_attrs + ["ecg_gain", "ecg_metadata"]:
+            setattr(self, k, getattr(point, k))
+        self.surface_ecg = point.surface_ecg.copy()
+        self.egm = point.egm.copy()
+
+def create_points(nr_points : int, nr_samples : int, rng : np.random.Generator) -> list:
+    columns = [f"{l}({110 + i})" for i, l in enumerate(ecg_labels)] + [f"20A_{i + 1}({22 + i})" for i in range(20)]
+    metadata = {"WOI": {"From": "-100", "To": "100"}, "Annotations": {"StartTime": "0", "Reference_Annotation": "10", "Map_Annotation": "20"},
+                "Voltages": {"Unipolar": "1.5", "Bipolar": "0.5"}}
+    ecg_data = pd.DataFrame(rng.integers(-1000, 1000, size=[nr_samples, len(columns)]), columns=columns)
+    return [CartoPointDetailData(pd.Series({"Id": point_id, "Position3D": rng.normal(size=3), "CathOrientation": rng.normal(size=3), "Cath_Id": 3}),
+                                 (metadata, {"connector_data": {"MAGNETIC_20_POLE_A_CONNECTOR": None}, "ecg": (("v", "Raw ECG to MV (gain) = 0.003", ""), ecg_data)}))
+                for point_id in range(nr_points)]
+
+def measure(points : list, repeats : int) -> dict:
+    dump_timings, load_timings = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        data = pickle.dumps(points, protocol=pickle.HIGHEST_PROTOCOL)
+        dump_timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        pickle.loads(data)
+        load_timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    restored = pickle.loads(data)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del restored
+    return {"memory": memory, "pickle_size": len(data), "dump_time": min(dump_timings), "load_time": min(load_timings)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nr-points", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--nr-samples", type=int, default=2500)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for nr_points in args.nr_points:
+        points = create_points(nr_points, args.nr_samples, rng)
+        result = {"nr_points": nr_points, "nr_samples": args.nr_samples}
+        for name, representation in [("dataframe", [DataFramePointDetailData(p) for p in points]), ("slotted", points)]:
+            result.update({f"{name}_{k}": v for k, v in measure(representation, args.repeats).items()})
+        result["memory_overhead_ratio"] = (result["dataframe_memory"] - result["slotted_memory"]) / result["slotted_memory"]
+        result["dump_speedup"] = result["dataframe_dump_time"] / result["slotted_dump_time"]
+        result["load_speedup"] = result["dataframe_load_time"] / result["slotted_load_time"]
+        print(json.dumps(result))
@@ -0,0 +1,47 @@
+"""Benchmark of the point import of a map, comparing the batched import (one size-balanced batch per worker)
+with the import of one task per point for different numbers of workers. See :meth:`cartoreader_lite.low_level.study.CartoLLMap.import_raw_points`.
+
+Usage: python benchmarks/bench_point_import.py [--nr-points 2000] [--workers 1 2 4 8] [--repeats 3]
+"""
+
+import argparse
+import tempfile
+import time
+import json
+import xml.etree.ElementTree as ET
+from cartoreader_lite.low_level.study import CartoLLMap
+from cartoreader_lite.low_level.execution import ExecutionContext
+from cartoreader_lite.low_level.utils import point_data_sizes
+from synthetic import write_study
+
+def time_import(ll_map : CartoLLMap, path_prefix : str, batched : bool, max_workers : int, repeats : int) -> float:
+    timings = []
+    with ExecutionContext("process", max_workers) as context:
+        context.submit(int).result() #Start the pool before timing
+        for _ in range(repeats):
+            start = time.perf_counter()
+            ll_map.import_raw_points(path_prefix, batched=batched, context=context)
+            timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nr-points", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        study_fname = write_study(tmp_dir, nr_maps=1, nr_points=args.nr_points, nr_triangles=1000, nr_egm_channels=(10, 60))
+        map_elem = ET.parse(study_fname).getroot().find("Maps/Map")
+        ll_map = CartoLLMap(map_elem, tmp_dir, load_point_details=False, context="serial")
+        data_size = point_data_sizes(ll_map.name, ll_map.points_main_data["Id"], tmp_dir).sum()
+
+        for max_workers in args.workers:
+            result = {"nr_points": args.nr_points, "data_size": int(data_size), "workers": max_workers}
+            for batched in [True, False]:
+                mode = "batched" if batched else "per_point"
+                result[f"{mode}_time"] = time_import(ll_map, tmp_dir, batched, max_workers, args.repeats)
+                result[f"{mode}_points_per_s"] = args.nr_points / result[f"{mode}_time"]
+            result["speedup"] = result["per_point_time"] / result["batched_time"]
+            print(json.dumps(result))
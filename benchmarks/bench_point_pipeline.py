@@ -0,0 +1,63 @@
+"""Benchmark of the creation of the detailed points of a map, comparing the two-pass pipeline (reading the raw point data in the workers,
+then converting it to :class:`cartoreader_lite.high_level.study.CartoPointDetailData` in a second pass) with the fused pipeline that converts
+each point inside the worker that read it (see the `point_converter` of :class:`cartoreader_lite.low_level.study.CartoLLMap`).
+Reports the wall time and the number of pickled bytes transferred between the processes.
+
+Usage: python benchmarks/bench_point_pipeline.py [--nr-points 1000] [--workers 1 2 4] [--repeats 3]
+"""
+
+import argparse
+import pickle
+import tempfile
+import time
+import json
+import xml.etree.ElementTree as ET
+from cartoreader_lite.low_level.study import CartoLLMap
+from cartoreader_lite.low_level.execution import ExecutionContext
+from cartoreader_lite.high_level.study import CartoMap, CartoPointDetailData
+from synthetic import write_study
+
+def two_pass(map_elem : ET.Element, path_prefix : str, context : ExecutionContext) -> CartoMap:
+    return CartoMap(CartoLLMap(map_elem, path_prefix, context=context), discard_invalid_points=False, context=context)
+
+def fused(map_elem : ET.Element, path_prefix : str, context : ExecutionContext) -> CartoMap:
+    return CartoMap(CartoLLMap(map_elem, path_prefix, context=context, point_converter=CartoPointDetailData), discard_invalid_points=False, context=context)
+
+def time_pipeline(pipeline, map_elem : ET.Element, path_prefix : str, max_workers : int, repeats : int) -> float:
+    timings = []
+    with ExecutionContext("process", max_workers) as context:
+        context.submit(int).result() #Start the pool before timing
+        for _ in range(repeats):
+            start = time.perf_counter()
+            pipeline(map_elem, path_prefix, context)
+            timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def transferred_bytes(map_elem : ET.Element, path_prefix : str) -> dict:
+    """Approximate size of the pickled results (and arguments of the second pass) sent between the processes
+    """
+    raw_map = CartoLLMap(map_elem, path_prefix, context="serial")
+    details = [CartoPointDetailData(main_data, raw_data) for (row_i, main_data), raw_data in zip(raw_map.points_main_data.iterrows(), raw_map.point_raw_data)]
+    raw_size = len(pickle.dumps(raw_map.point_raw_data))
+    main_data_size = sum(len(pickle.dumps(main_data)) for row_i, main_data in raw_map.points_main_data.iterrows())
+    details_size = len(pickle.dumps(details))
+    return {"two_pass_bytes": 2 * raw_size + main_data_size + details_size, "fused_bytes": details_size}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nr-points", type=int, default=1000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        study_fname = write_study(tmp_dir, nr_maps=1, nr_points=args.nr_points, nr_triangles=1000)
+        map_elem = ET.parse(study_fname).getroot().find("Maps/Map")
+        sizes = transferred_bytes(map_elem, tmp_dir)
+
+        for max_workers in args.workers:
+            result = {"nr_points": args.nr_points, "workers": max_workers, **sizes}
+            for name, pipeline in [("two_pass", two_pass), ("fused", fused)]:
+                result[f"{name}_time"] = time_pipeline(pipeline, map_elem, tmp_dir, max_workers, args.repeats)
+            result["speedup"] = result["two_pass_time"] / result["fused_time"]
+            print(json.dumps(result))
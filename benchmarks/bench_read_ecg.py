@@ -0,0 +1,47 @@
+"""Benchmark of the ECG export parser, comparing the pandas engine and the numpy engine of :func:`cartoreader_lite.low_level.utils.read_ecg_files`,
+decoding either one file per call or batches of multiple files per call.
+
+Usage: python benchmarks/bench_read_ecg.py [--nr-files 2000] [--nr-samples 2500] [--batch-size 1 16 128] [--repeats 3]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import json
+import numpy as np
+from cartoreader_lite.low_level.utils import read_ecg_files
+from synthetic import write_ecg_file
+
+def time_read(fnames : list, engine : str, batch_size : int, repeats : int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for batch_start in range(0, len(fnames), batch_size):
+            read_ecg_files(fnames[batch_start:batch_start + batch_size], engine=engine)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nr-files", type=int, default=2000)
+    parser.add_argument("--nr-samples", type=int, default=2500)
+    parser.add_argument("--nr-egm-channels", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 16, 128])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rng = np.random.default_rng(0)
+        fnames = [os.path.join(tmp_dir, f"Map_P{i}_ECG_Export.txt") for i in range(args.nr_files)]
+        for fname in fnames:
+            write_ecg_file(fname, args.nr_samples, args.nr_egm_channels, rng)
+        data_size = sum(os.path.getsize(fname) for fname in fnames)
+
+        pandas_time = time_read(fnames, "pandas", 1, args.repeats)
+        for batch_size in args.batch_size:
+            result = {"nr_files": args.nr_files, "nr_samples": args.nr_samples, "data_size": data_size, "batch_size": batch_size,
+                      "pandas_time": pandas_time, "numpy_time": time_read(fnames, "numpy", batch_size, args.repeats)}
+            result["files_per_s"] = args.nr_files / result["numpy_time"]
+            result["speedup"] = result["pandas_time"] / result["numpy_time"]
+            print(json.dumps(result))
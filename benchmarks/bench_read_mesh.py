@@ -0,0 +1,38 @@
+"""Benchmark of the .mesh file parser, comparing the numpy and pandas engines of :func:`cartoreader_lite.low_level.read_mesh.read_mesh_file`.
+
+Usage: python benchmarks/bench_read_mesh.py [--nr-triangles 10000 100000 500000] [--repeats 3]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import json
+from cartoreader_lite.low_level.read_mesh import read_mesh_file
+from synthetic import write_mesh_file
+
+def time_read(fname : str, engine : str, repeats : int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        read_mesh_file(fname, engine=engine)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nr-triangles", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for nr_triangles in args.nr_triangles:
+            fname = os.path.join(tmp_dir, f"sphere_{nr_triangles}.mesh")
+            mesh = write_mesh_file(fname, nr_triangles)
+            result = {"nr_triangles": mesh.n_cells, "nr_vertices": mesh.n_points, "file_size": os.path.getsize(fname)}
+            for engine in ["numpy", "pandas"]:
+                result[f"{engine}_time"] = time_read(fname, engine, args.repeats)
+            result["speedup"] = result["pandas_time"] / result["numpy_time"]
+            results.append(result)
+            print(json.dumps(result))
@@ -0,0 +1,54 @@
+"""Benchmark of the VisiTag time resampling used by :class:`cartoreader_lite.AblationSites`, comparing the per-column interp1d engine
+and the vectorized engine of :func:`cartoreader_lite.low_level.utils.interpolate_time_data` on synthetic multi-hour ablation logs.
+
+Usage: python benchmarks/bench_resample.py [--hours 1 4] [--kind quadratic linear] [--repeats 3]
+"""
+
+import argparse
+import time
+import json
+import numpy as np
+import pandas as pd
+from cartoreader_lite.low_level.utils import unify_time_data
+
+def ablation_logs(hours : float, rng : np.random.Generator) -> list:
+    """Creates RawPositions, AblationData and ContactForceData like logs with different sampling intervals (in ms)
+    """
+    def log(interval : int, columns : dict) -> pd.DataFrame:
+        time_stamps = np.arange(0, int(hours * 3600e3), interval)
+        df = pd.DataFrame({"TimeStamp": time_stamps})
+        for col_name, (scale, offset) in columns.items():
+            df[col_name] = offset + scale * np.cumsum(rng.normal(size=time_stamps.size)) / np.sqrt(time_stamps.size)
+        return df
+
+    raw_positions = log(33, {"X": (10, 0), "Y": (10, 20), "Z": (10, 5)})
+    raw_positions.insert(0, "Session", raw_positions["TimeStamp"] // 600000 + 1) #Ten minute sessions
+    ablation_data = log(100, {"Impedance": (20, 100), "PowerWatt": (5, 30), "Temperature": (3, 30)})
+    contact_force = log(50, {"Force": (5, 10), "AxialAngle": (10, 45), "LateralAngle": (10, 20)})
+    contact_force["ChannelID"] = rng.choice(["A", "B"], len(contact_force))
+    return [raw_positions, ablation_data, contact_force]
+
+def time_resample(dfs : list, engine : str, kind : str, repeats : int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        unify_time_data(dfs, time_k="TimeStamp", time_interval=100, kind=kind, engine=engine)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hours", type=float, nargs="+", default=[1, 4])
+    parser.add_argument("--kind", nargs="+", default=["quadratic", "linear"])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for hours in args.hours:
+        dfs = ablation_logs(hours, rng)
+        for kind in args.kind:
+            result = {"hours": hours, "nr_rows": sum(len(df) for df in dfs), "kind": kind,
+                      "interp1d_time": time_resample(dfs, "interp1d", kind, args.repeats),
+                      "vectorized_time": time_resample(dfs, "vectorized", kind, args.repeats)}
+            result["speedup"] = result["interp1d_time"] / result["vectorized_time"]
+            print(json.dumps(result))
@@ -0,0 +1,114 @@
+"""Benchmark suite timing and memory-profiling each stage of reading, simplifying and saving a synthetic CARTO3 study (see :mod:`synthetic`).
+Each stage prints one JSON line holding the study parameters, the best wall time over all repeats and the peak memory allocated during the stage.
+The peak memory is measured by tracemalloc in an extra run using a serial context, so the allocations of work otherwise done by worker processes are included (see `memory_method`).
+Append the output to a file (e.g. with --output) to track regressions over time.
+
+Stages: xml, mesh, points, visitag, simplify, projection, save_<format>, load_<format> and study (complete load of the directory and zip file)
+
+Usage: python benchmarks/bench_suite.py [--nr-maps 3] [--nr-points 100] [--nr-triangles 10000] [--nr-samples 2500] [--nr-sessions 4]
+                                        [--context process] [--workers N] [--formats archive pickle] [--repeats 3] [--no-memory] [--output results.jsonl]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import json
+import platform
+import xml.etree.ElementTree as ET
+import cartoreader_lite
+from cartoreader_lite import CartoStudy, CartoMap, AblationSites
+from cartoreader_lite.high_level.study import CartoPointDetailData
+from cartoreader_lite.low_level.study import CartoLLMap
+from cartoreader_lite.low_level.read_mesh import read_mesh_file
+from cartoreader_lite.low_level.visitags import read_visitag_dir
+from cartoreader_lite.low_level.execution import ExecutionContext
+from cartoreader_lite.low_level.utils import xml_to_dataframe
+from cartoreader_lite.postprocessing.geometry import ProjectionIndex
+from synthetic import write_study, zip_study
+
+def run_stage(stage_f, context : ExecutionContext, repeats : int, memory : bool) -> dict:
+    """Runs `stage_f(context)` repeatedly and returns the best wall time and the peak memory allocated in an additional run.
+    tracemalloc only traces the current process, so the additional run uses a serial context instead of `context`.
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        stage_f(context)
+        timings.append(time.perf_counter() - start)
+
+    result = {"time": min(timings), "peak_memory": None, "memory_method": None}
+    if memory:
+        with ExecutionContext("serial") as serial_context:
+            tracemalloc.start()
+            stage_f(serial_context)
+            result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        result["memory_method"] = "tracemalloc_serial"
+    return result
+
+def save_study(study : CartoStudy, fname : str, file_format : str):
+    """Saves the study, replacing the output of a previous repeat (archives refuse to overwrite existing files)
+    """
+    if os.path.isdir(fname):
+        shutil.rmtree(fname)
+    elif os.path.exists(fname):
+        os.remove(fname)
+    study.save(fname, file_format=file_format)
+
+def benchmark_stages(study_dir : str, study_name : str, tmp_dir : str, context : ExecutionContext, formats : list, repeats : int, memory : bool):
+    """Yields the name and result of each stage. The stages reuse the results of the previous stages, which are not part of the measurements.
+    """
+    study_fname = os.path.join(study_dir, study_name + ".xml")
+    map_elems = list(ET.parse(study_fname).getroot().iter("Map"))
+    yield "xml", run_stage(lambda context: [xml_to_dataframe(points_elem) for points_elem in ET.parse(study_fname).getroot().iter("CartoPoints")], context, repeats, memory)
+    yield "mesh", run_stage(lambda context: [read_mesh_file(os.path.join(study_dir, map_elem.attrib["FileNames"])) for map_elem in map_elems], context, repeats, memory)
+
+    ll_maps = [CartoLLMap(map_elem, study_dir, load_point_details=False, context=context) for map_elem in map_elems]
+    yield "points", run_stage(lambda context: [ll_map.import_raw_points(study_dir, context=context, point_converter=CartoPointDetailData) for ll_map in ll_maps], context, repeats, memory)
+    yield "visitag", run_stage(lambda context: AblationSites(read_visitag_dir(os.path.join(study_dir, "VisiTagExport"))), context, repeats, memory)
+
+    carto_maps = []
+    yield "simplify", run_stage(lambda context: carto_maps.__setitem__(slice(None), [CartoMap(ll_map, proj_points=False, context=context) for ll_map in ll_maps]), context, repeats, memory)
+    yield "projection", run_stage(lambda context: [ProjectionIndex(carto_map.mesh).project(carto_map.points_xyz) for carto_map in carto_maps], context, repeats, memory)
+
+    study = CartoStudy(study_dir, study_name, context=context)
+    for file_format in formats:
+        fname = os.path.join(tmp_dir, f"study_{file_format}" + (".pkl.gz" if file_format == "pickle" else ".crlstudy"))
+        yield f"save_{file_format}", run_stage(lambda context: save_study(study, fname, file_format), context, repeats, memory)
+        yield f"load_{file_format}", run_stage(lambda context: CartoStudy(fname), context, repeats, memory)
+
+    yield "study", run_stage(lambda context: CartoStudy(study_dir, study_name, context=context), context, repeats, memory)
+    zip_fname = zip_study(study_dir, os.path.join(tmp_dir, study_name + ".zip"))
+    yield "study_zip", run_stage(lambda context: CartoStudy(zip_fname, context=context), context, repeats, memory)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nr-maps", type=int, default=3)
+    parser.add_argument("--nr-points", type=int, default=100)
+    parser.add_argument("--nr-triangles", type=int, default=10000)
+    parser.add_argument("--nr-samples", type=int, default=2500)
+    parser.add_argument("--nr-sessions", type=int, default=4)
+    parser.add_argument("--context", default="process", choices=list(ExecutionContext.backends.keys()))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--formats", nargs="+", default=["archive", "pickle"], choices=["archive", "directory", "pickle"])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the additional run measuring the peak memory")
+    parser.add_argument("--output", default=None, help="File to append the results to, in addition to printing them")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir, ExecutionContext(args.context, args.workers) as context:
+        study_dir = os.path.join(tmp_dir, "SynthStudy")
+        write_study(study_dir, "SynthStudy", args.nr_maps, args.nr_points, args.nr_triangles, args.nr_samples, nr_sessions=args.nr_sessions)
+        config = {"version": cartoreader_lite.__version__, "python": platform.python_version(), "nr_maps": args.nr_maps, "nr_points": args.nr_points,
+                  "nr_triangles": args.nr_triangles, "nr_samples": args.nr_samples, "nr_sessions": args.nr_sessions,
+                  "context": args.context, "workers": context.max_workers, "timestamp": time.time()}
+
+        for stage, result in benchmark_stages(study_dir, "SynthStudy", tmp_dir, context, args.formats, args.repeats, not args.no_memory):
+            line = json.dumps({**config, "stage": stage, **result})
+            print(line, flush=True)
+            if args.output is not None:
+                with open(args.output, "a") as f:
+                    f.write(line + "\n")
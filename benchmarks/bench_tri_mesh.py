@@ -0,0 +1,58 @@
+"""Benchmark of the conversion of CARTO meshes to trimesh objects, comparing the former conversion (triangulation and rebuilding the faces from `cells_dict`)
+with the conversion of :func:`cartoreader_lite.postprocessing.geometry.create_tri_mesh` used by the projection, which shares the faces of all-triangle meshes.
+The vertices are only shared if the mesh points are float64, otherwise trimesh copies them.
+Reports the latency, the peak of the memory allocated by numpy during the conversion and whether the faces and vertices are shared with the mesh.
+
+Usage: python benchmarks/bench_tri_mesh.py [--nr-triangles 100000 500000] [--repeats 3]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import json
+from functools import partial
+import numpy as np
+import trimesh
+import vtk
+from cartoreader_lite.low_level.read_mesh import read_mesh_file
+from cartoreader_lite.postprocessing.geometry import create_tri_mesh
+from synthetic import write_mesh_file
+
+def create_tri_mesh_triangulate(mesh) -> trimesh.Trimesh:
+    """Conversion used before sharing the faces
+    """
+    mesh = mesh.triangulate()
+    return trimesh.Trimesh(mesh.points, mesh.cells_dict[vtk.VTK_TRIANGLE])
+
+def time_conversion(convert, mesh, repeats : int) -> dict:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        tri_mesh = convert(mesh)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    tri_mesh = convert(mesh)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"time": min(timings), "peak_memory": peak_memory, "shares_faces": bool(np.shares_memory(tri_mesh.faces, mesh.cell_connectivity)),
+            "shares_vertices": bool(np.shares_memory(tri_mesh.vertices, mesh.points))}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nr-triangles", type=int, nargs="+", default=[100000, 500000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for nr_triangles in args.nr_triangles:
+            fname = os.path.join(tmp_dir, f"sphere_{nr_triangles}.mesh")
+            write_mesh_file(fname, nr_triangles)
+            mesh = read_mesh_file(fname)[0]
+            result = {"nr_triangles": mesh.n_cells, "nr_vertices": mesh.n_points, "vertex_dtype": str(mesh.points.dtype)}
+            for name, convert in [("triangulate", create_tri_mesh_triangulate), ("shared_faces", partial(create_tri_mesh, process=False))]:
+                result.update({f"{name}_{k}": v for k, v in time_conversion(convert, mesh, args.repeats).items()})
+            result["speedup"] = result["triangulate_time"] / result["shared_faces_time"]
+            print(json.dumps(result))
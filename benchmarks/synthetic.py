@@ -0,0 +1,317 @@
+"""Routines to write synthetic CARTO3 files for benchmarking purposes.
+The files are syntactically valid CARTO3 exports (study XML, meshes, point exports, ECG, connector, contact force and VisiTag files) with random content.
+
+Usage: python benchmarks/synthetic.py <output_dir> [--nr-maps 3] [--nr-points 100] [--nr-triangles 10000] [--nr-samples 2500] [--nr-sessions 4] [--zip]
+"""
+
+import argparse
+import os
+import zipfile
+import xml.etree.ElementTree as ET
+import numpy as np
+import pyvista as pv
+from typing import Tuple
+
+ecg_leads = ["I", "II", "III", "aVR", "aVL", "aVF"] + [f"V{i+1}" for i in range(6)]
+
+def create_sphere_mesh(nr_triangles : int, radius : float = 30.) -> pv.PolyData:
+    """Creates a triangulated sphere with approximately the given number of triangles
+
+    Parameters
+    ----------
+    nr_triangles : int
+        Approximate number of triangles of the mesh
+    radius : float, optional
+        Radius of the sphere, by default 30.
+
+    Returns
+    -------
+    pv.PolyData
+        The triangulated sphere, including point and cell normals
+    """
+    resolution = max(int(np.sqrt(nr_triangles / 2)), 4)
+    sphere = pv.Sphere(radius=radius, theta_resolution=resolution, phi_resolution=resolution).triangulate()
+    return sphere.compute_normals(cell_normals=True, point_normals=True)
+
+def write_mesh_file(fname : str, nr_triangles : int = 10000, vertex_colors : bool = True, seed : int = 0):
+    """Writes a synthetic mesh file in the CARTO3 .mesh format
+
+    Parameters
+    ----------
+    fname : str
+        Filename of the mesh file to write
+    nr_triangles : int, optional
+        Approximate number of triangles of the mesh, by default 10000
+    vertex_colors : bool, optional
+        If true, the VerticesColorsSection and VerticesAttributesSection will also be written, by default True
+    seed : int, optional
+        Seed for the random vertex colors, by default 0
+
+    Returns
+    -------
+    pv.PolyData
+        The mesh that was written to the file
+    """
+    rng = np.random.default_rng(seed)
+    mesh = create_sphere_mesh(nr_triangles)
+    points = np.asarray(mesh.points, dtype=np.float64)
+    tris = mesh.faces.reshape([-1, 4])[:, 1:]
+    vert_groups = np.zeros(len(points), dtype=np.int64)
+    tri_groups = np.where(np.arange(len(tris)) % 7 == 0, -1000000, 0)
+
+    with open(fname, "w") as f:
+        f.write("#TriangulatedMeshVersion2.0\n[GeneralAttributes]\n")
+        header = {"MeshID": "1", "MeshName": "", "NumVertex": str(len(points)), "NumTriangle": str(len(tris)),
+                  "TopologyStatus": "0", "MeshColor": "0.000000 1.000000 0.000000 1.000000",
+                  "Matrix": " ".join(["%.6f" % v for v in np.eye(4).ravel()]),
+                  "NumVertexColors": "3", "ColorsIDs": "1 2 3", "ColorsNames": "Unipolar Bipolar LAT"}
+        f.writelines([f"{k:<25s}= {v}\n" for k, v in header.items()])
+
+        f.write("\n[VerticesSection]\n;                   X             Y             Z        NormalX   NormalY   NormalZ  GroupID\n\n")
+        np.savetxt(f, np.column_stack([np.arange(len(points)), points, mesh.point_data["Normals"], vert_groups]), 
+                    fmt="%d = %15.6f %13.6f %13.6f %11.6f %11.6f %11.6f %8d")
+
+        f.write("\n[TrianglesSection]\n;       Vertex0  Vertex1  Vertex2   NormalX   NormalY   NormalZ  GroupID\n\n")
+        np.savetxt(f, np.column_stack([np.arange(len(tris)), tris, mesh.cell_data["Normals"], tri_groups]), 
+                    fmt="%d = %8d %8d %8d %11.6f %11.6f %11.6f %8d")
+
+        if vertex_colors:
+            f.write("\n[VerticesColorsSection]\n; Unipolar Bipolar LAT\n;    Unipolar     Bipolar    LAT\n\n")
+            np.savetxt(f, np.column_stack([np.arange(len(points)), rng.random([len(points), 3])]), fmt="%d = %11.6f %11.6f %11.6f")
+
+            f.write("\n[VerticesAttributesSection]\n; Attributes\n;    EML  SEML\n\n")
+            np.savetxt(f, np.column_stack([np.arange(len(points)), np.zeros([len(points), 2])]), fmt="%d = %d %d")
+
+    return mesh
+
+def write_point_files(dir_name : str, map_name : str, point_id : int, nr_samples : int = 2500, nr_egm_channels : int = 20, 
+                      rng : np.random.Generator = None) -> ET.Element:
+    """Writes the export XML, ECG, connector and contact force files of a single synthetic point
+
+    Parameters
+    ----------
+    dir_name : str
+        Directory of the study
+    map_name : str
+        Name of the map
+    point_id : int
+        ID of the point
+    nr_samples : int, optional
+        Number of ECG samples, by default 2500
+    nr_egm_channels : int, optional
+        Number of EGM channels in addition to the 12-lead ECG, by default 20
+    rng : np.random.Generator, optional
+        Random generator for the data, by default a new generator with seed 0
+
+    Returns
+    -------
+    ET.Element
+        The root element of the written point export XML
+    """
+    rng = np.random.default_rng(0) if rng is None else rng
+    prefix = f"{map_name}_P{point_id}"
+    root = ET.Element("Point", {"ID": str(point_id)})
+    positions = ET.SubElement(root, "Positions")
+    for suffix in ["Eleclectrode_Positions", "Eleclectrode_Positions_OnAnnotation"]:
+        connector_fname = f"{prefix}_MAGNETIC_20_POLE_A_CONNECTOR_{suffix}.txt"
+        ET.SubElement(positions, "Connector", {"MAGNETIC_20_POLE_A_CONNECTOR": connector_fname})
+        with open(os.path.join(dir_name, connector_fname), "w") as f:
+            f.write("Eleclectrode_Positions_2.0\nElectrode#        Time          X          Y          Z\n")
+            np.savetxt(f, np.column_stack([np.arange(4), np.arange(4) * 10, rng.random([4, 3])]), fmt="%10d%12d%11.3f%11.3f%11.3f")
+
+    ecg_fname = f"{prefix}_ECG_Export.txt"
+    ET.SubElement(root, "ECG", {"FileName": ecg_fname})
+    ET.SubElement(root, "WOI", {"From": "-100", "To": "100"})
+    ET.SubElement(root, "Annotations", {"StartTime": str(1000 * point_id), "Reference_Annotation": "500", "Map_Annotation": str(int(450 + 200 * rng.random()))})
+    ET.SubElement(root, "Voltages", {"Unipolar": "%.3f" % (rng.random() * 10), "Bipolar": "%.3f" % (rng.random() * 5)})
+
+    contact_force_fname = f"{prefix}_ContactForce.txt"
+    ET.SubElement(root, "ContactForce", {"FileName": contact_force_fname})
+    with open(os.path.join(dir_name, contact_force_fname), "w") as f:
+        f.write("ContactForce.txt_2.0\nRate=50\nNumber=10\nMode=0\nMagnetic=1\nCathName=X\nVersion=1\n")
+        f.write("Index   Time  Force   AxialAngle   LateralAngle  MetalSeverity  InAccurateSeverity  NeedZeroing\n")
+        np.savetxt(f, np.column_stack([np.arange(10), np.arange(10) * 50, rng.random([10, 3]) * [20, 90, 90], np.zeros([10, 3])]), 
+                    fmt="%5d %6d %6.2f %8.2f %8.2f %d %d %d")
+    ET.ElementTree(root).write(os.path.join(dir_name, f"{prefix}_Point_Export.xml"))
+
+    write_ecg_file(os.path.join(dir_name, ecg_fname), nr_samples, nr_egm_channels, rng)
+
+    return root
+
+def write_ecg_file(fname : str, nr_samples : int = 2500, nr_egm_channels : int = 20, rng : np.random.Generator = None):
+    """Writes a synthetic ECG export file with the 12-lead ECG and the given number of EGM channels
+
+    Parameters
+    ----------
+    fname : str
+        Name of the file to write
+    nr_samples : int, optional
+        Number of ECG samples, by default 2500
+    nr_egm_channels : int, optional
+        Number of EGM channels in addition to the 12-lead ECG, by default 20
+    rng : np.random.Generator, optional
+        Random generator for the data, by default a new generator with seed 0
+    """
+    rng = np.random.default_rng(0) if rng is None else rng
+    egm_names = [f"20A_{i+1}({i+22})" for i in range(nr_egm_channels)] + ["M1(1)", "M1-M2(2)"]
+    ecg_names = [f"{lead}({110+i})" for i, lead in enumerate(ecg_leads)]
+    channel_names = egm_names[:len(egm_names)//2] + ecg_names + egm_names[len(egm_names)//2:]
+    with open(fname, "w") as f:
+        f.write("ECG_Export_4.0\nRaw ECG to MV (gain) = 0.003000\n")
+        f.write("Unipolar Mapping Channel=20A_1 Bipolar Mapping Channel=20A_1-20A_2 Reference Channel=V1\n")
+        f.write("".join([f"{name:<15s}" for name in channel_names]) + "\n")
+        np.savetxt(f, rng.integers(-3000, 3000, size=(nr_samples, len(channel_names))), fmt="%6d")
+
+def write_visitag_files(dir_name : str, nr_sessions : int = 4, session_duration : int = 60000, rng : np.random.Generator = None):
+    """Writes the files of a synthetic VisiTag export, with one ablation site per session
+
+    Parameters
+    ----------
+    dir_name : str
+        The `VisiTagExport` directory. Will be created if it does not exist.
+    nr_sessions : int, optional
+        Number of ablation sessions, by default 4
+    session_duration : int, optional
+        Duration of each session in ms, by default 60000
+    rng : np.random.Generator, optional
+        Random generator for the data, by default a new generator with seed 0
+    """
+    rng = np.random.default_rng(0) if rng is None else rng
+    os.makedirs(dir_name, exist_ok=True)
+    session_starts = 10000 + np.arange(nr_sessions) * (session_duration + 5000)
+    site_pos = rng.random([nr_sessions, 3]) * 40 - 20
+
+    def session_log(interval : int) -> Tuple[np.ndarray, np.ndarray]:
+        time_stamps = [np.arange(start, start + session_duration, interval) for start in session_starts]
+        return np.repeat(np.arange(1, nr_sessions + 1), [len(t) for t in time_stamps]), np.concatenate(time_stamps)
+
+    def write_table(fname : str, columns : dict):
+        with open(os.path.join(dir_name, fname), "w") as f:
+            f.write(" ".join([f"{k:>14s}" for k in columns.keys()]) + "\n")
+            np.savetxt(f, np.column_stack(list(columns.values())), fmt=["%14d" if np.issubdtype(v.dtype, np.integer) else "%14.3f" for v in columns.values()])
+
+    sessions = np.arange(1, nr_sessions + 1)
+    write_table("Sites.txt", {"Session": sessions, "SiteIndex": sessions, "X": site_pos[:, 0], "Y": site_pos[:, 1], "Z": site_pos[:, 2],
+                              "DurationTime": np.full(nr_sessions, session_duration / 1000), "AverageForce": rng.random(nr_sessions) * 20,
+                              "MaxTemperature": 30 + rng.random(nr_sessions) * 10, "RFIndex": rng.random(nr_sessions) * 600, "BaseImpedance": 100 + rng.random(nr_sessions) * 20})
+    for fname, interval, columns in [("RawPositions.txt", 33, ["X", "Y", "Z"]), ("AllPositionInGrids.txt", 33, ["X", "Y", "Z"]), 
+                                     ("AblationData.txt", 100, ["Impedance", "PowerWatt"]), ("ContactForceData.txt", 50, ["Force", "AxialAngle", "LateralAngle"])]:
+        session_ids, time_stamps = session_log(interval)
+        if columns == ["X", "Y", "Z"]:
+            values = site_pos[session_ids - 1] + rng.normal(scale=0.5, size=[len(time_stamps), 3])
+        else:
+            values = rng.random([len(time_stamps), len(columns)]) * 50
+        table = {"Session": session_ids, "TimeStamp" if fname != "ContactForceData.txt" else "Time": time_stamps}
+        if fname == "AllPositionInGrids.txt":
+            table["UniqID"] = np.arange(len(time_stamps))
+        write_table(fname, {**table, **dict(zip(columns, values.T))})
+
+    with open(os.path.join(dir_name, "VisiTagSettings.txt"), "w") as f:
+        f.write("VisiTag Settings\n   MinForce=   3\n   MaxRange=   2.5\n   Name=   Synthetic\n")
+
+def write_study(dir_name : str, study_name : str = "SynthStudy", nr_maps : int = 3, nr_points : int = 100, nr_triangles : int = 10000,
+                nr_samples : int = 2500, nr_egm_channels : Tuple[int, int] = (20, 20), nr_sessions : int = 4, nr_aux_meshes : int = 1, seed : int = 0) -> str:
+    """Writes a synthetic CARTO3 study with the given number of maps and points
+
+    Parameters
+    ----------
+    dir_name : str
+        Directory the study will be written to. Will be created if it does not exist.
+    study_name : str, optional
+        Name of the study, by default "SynthStudy"
+    nr_maps : int, optional
+        Number of maps, by default 3
+    nr_points : int, optional
+        Number of points per map, by default 100
+    nr_triangles : int, optional
+        Approximate number of triangles of each map mesh, by default 10000
+    nr_samples : int, optional
+        Number of ECG samples per point, by default 2500
+    nr_egm_channels : Tuple[int, int], optional
+        Range (inclusive) of the number of EGM channels per point, by default (20, 20).
+        Different numbers will result in points of different sizes.
+    nr_sessions : int, optional
+        Number of ablation sessions in the VisiTag export, see :func:`write_visitag_files`. By default 4
+    nr_aux_meshes : int, optional
+        Number of auxiliary meshes, by default 1
+    seed : int, optional
+        Seed of the random data, by default 0
+
+    Returns
+    -------
+    str
+        Path to the study XML file
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(dir_name, exist_ok=True)
+    root = ET.Element("Study", {"name": study_name})
+    maps = ET.SubElement(root, "Maps", {"Count": str(nr_maps)})
+    tags_table = ET.SubElement(maps, "TagsTable")
+    ET.SubElement(tags_table, "Tag", {"ID": "1", "Short_Name": "A", "Full_Name": "Ablation"})
+    for map_i in range(nr_maps):
+        map_name = f"{map_i+1}-Map"
+        mesh = write_mesh_file(os.path.join(dir_name, f"{map_name}.mesh"), nr_triangles, seed=map_i)
+        map_elem = ET.SubElement(maps, "Map", {"Index": str(map_i), "Name": map_name, "FileNames": f"{map_name}.mesh"})
+        points_elem = ET.SubElement(map_elem, "CartoPoints", {"Count": str(nr_points)})
+        point_pos = np.asarray(mesh.points)[rng.integers(mesh.n_points, size=nr_points)] * 1.05
+        for point_i in range(nr_points):
+            point_id = point_i + 1
+            point_elem = ET.SubElement(points_elem, "Point", {"Id": str(point_id), "Position3D": " ".join(["%f" % v for v in point_pos[point_i]]),
+                                                             "CathOrientation": "0 0 1", "Cath_Id": "3"})
+            ET.SubElement(point_elem, "Tags", {"ID": "1"}).text = "1"
+            write_point_files(dir_name, map_name, point_id, nr_samples, int(rng.integers(nr_egm_channels[0], nr_egm_channels[1] + 1)), rng)
+
+        ET.SubElement(map_elem, "RefAnnotationConfig", {"Algorithm": "1", "Connector": "1"})
+        coloring_range_table = ET.SubElement(map_elem, "ColoringRangeTable")
+        ET.SubElement(coloring_range_table, "ColoringRange", {"Id": "1", "Min": "0", "Max": "1"})
+
+    meshes = ET.SubElement(root, "Meshes")
+    ET.SubElement(meshes, "RegistrationMatrix").text = " ".join(["%f" % v for v in np.eye(4).ravel()])
+    for mesh_i in range(nr_aux_meshes):
+        write_mesh_file(os.path.join(dir_name, f"AuxMesh{mesh_i + 1}.mesh"), nr_triangles, vertex_colors=False, seed=nr_maps + mesh_i)
+        ET.SubElement(meshes, "Mesh", {"FileName": f"AuxMesh{mesh_i + 1}.mesh"})
+
+    write_visitag_files(os.path.join(dir_name, "VisiTagExport"), nr_sessions, rng=rng)
+    study_fname = os.path.join(dir_name, study_name + ".xml")
+    ET.ElementTree(root).write(study_fname)
+    return study_fname
+
+def zip_study(dir_name : str, zip_fname : str) -> str:
+    """Compresses all files of a study directory into a zip file, as exported by the CARTO3 system
+
+    Parameters
+    ----------
+    dir_name : str
+        Directory of the study
+    zip_fname : str
+        Name of the zip file to write
+
+    Returns
+    -------
+    str
+        Name of the zip file
+    """
+    with zipfile.ZipFile(zip_fname, "w", zipfile.ZIP_DEFLATED) as zip_f:
+        for root_dir, _, fnames in os.walk(dir_name):
+            for fname in fnames:
+                zip_f.write(os.path.join(root_dir, fname), os.path.relpath(os.path.join(root_dir, fname), dir_name))
+    return zip_fname
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("output_dir")
+    parser.add_argument("--study-name", default="SynthStudy")
+    parser.add_argument("--nr-maps", type=int, default=3)
+    parser.add_argument("--nr-points", type=int, default=100)
+    parser.add_argument("--nr-triangles", type=int, default=10000)
+    parser.add_argument("--nr-samples", type=int, default=2500)
+    parser.add_argument("--nr-sessions", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--zip", action="store_true", help="Also write the study into <output_dir>.zip")
+    args = parser.parse_args()
+
+    study_fname = write_study(args.output_dir, args.study_name, args.nr_maps, args.nr_points, args.nr_triangles, args.nr_samples, 
+                              nr_sessions=args.nr_sessions, seed=args.seed)
+    print(study_fname)
+    if args.zip:
+        print(zip_study(args.output_dir, os.path.normpath(args.output_dir) + ".zip"))
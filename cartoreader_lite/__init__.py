@@ -1,4 +1,4 @@
-from .high_level.study import CartoStudy, CartoAuxMesh, CartoMap, CartoPointDetailData, AblationSites
+from .high_level.study import CartoStudy, CartoAuxMesh, CartoMap, CartoPointDetailData, CartoPointDetailHandle, SignalStore, StudyArchive, AblationSites
 
 __version__ = "1.0.1"
 __author__ = "Thomas Grandits"
@@ -0,0 +1,350 @@
+"""Bulk conversion of CARTO3 studies (zip files or directories) into saved studies (see :meth:`cartoreader_lite.CartoStudy.save`).
+Multiple studies are converted at the same time, sharing a single :class:`cartoreader_lite.low_level.execution.ExecutionContext`,
+so the total number of workers is bounded independent of the number of studies. Studies failing to convert are reported without stopping the others.
+Each finished study is appended to a manifest, and studies already converted according to the manifest are skipped when running the conversion again.
+
+Usage: cartoreader-convert exports/*.zip [more_exports/] --output converted/ [--format archive] [--workers N] [--max-in-flight 2] [--manifest converted/manifest.jsonl] [--force]
+"""
+
+import argparse
+import glob
+import json
+import logging as log
+import os
+import shutil
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Union
+from os import PathLike
+from .high_level.study import CartoStudy
+from .low_level.archive import archive_suffix
+from .low_level.execution import ExecutionContext
+from .low_level.stats import LoadStats
+from .low_level.storage import DirectoryStorage, ZipStorage
+
+def find_study_xml(study_path : Union[str, PathLike]) -> str:
+    """Finds the XML file of a CARTO3 study inside a directory or zip file, i.e. the XML file with the root element `Study` closest to the top level
+
+    Parameters
+    ----------
+    study_path : Union[str, PathLike]
+        Directory or zip file holding the study
+
+    Returns
+    -------
+    str
+        Name of the XML file relative to `study_path`, as expected by :class:`cartoreader_lite.CartoStudy`
+
+    Raises
+    ------
+    FileNotFoundError
+        If no study XML file was found
+    """
+    study_path = os.fspath(study_path)
+    is_zip = os.path.isfile(study_path) and study_path.endswith(".zip")
+    storage, dir_name = (ZipStorage(study_path), "") if is_zip else (DirectoryStorage(), study_path)
+    fnames = [fname if is_zip else os.path.relpath(fname, dir_name) for fname in storage.list_files(dir_name)]
+    #Skip the exports of the single points and VisiTag files
+    fnames = [fname for fname in fnames if fname.endswith(".xml") and not fname.endswith("_Point_Export.xml") and "VisiTagExport" not in fname]
+    for fname in sorted(fnames, key=lambda fname: (os.path.normpath(fname).count(os.sep), fname)):
+        with storage.open(os.path.join(dir_name, fname), "rb") as xml_f:
+            try:
+                root_tag = next(ET.iterparse(xml_f, events=("start",)))[1].tag
+            except ET.ParseError:
+                continue
+        if root_tag == "Study":
+            return fname
+
+    raise FileNotFoundError(f"No study XML found in {study_path}")
+
+def find_studies(inputs : List[Union[str, PathLike]]) -> List[str]:
+    """Lists the studies given by the inputs. Each input can be
+
+        * A zip file holding a study
+        * A directory holding a study, i.e. a study XML file at its top level
+        * A directory holding multiple studies as zip files or sub-directories
+        * A glob pattern matching any of the above
+
+    Parameters
+    ----------
+    inputs : List[Union[str, PathLike]]
+        Inputs holding the studies
+
+    Returns
+    -------
+    List[str]
+        Paths of the found studies in the order of the inputs, without duplicates
+    """
+    study_paths = []
+    for study_input in inputs:
+        study_input = os.fspath(study_input)
+        matches = sorted(glob.glob(study_input)) if glob.has_magic(study_input) else [study_input]
+        for match in matches:
+            is_study_dir = os.path.isdir(match) and any([fname.endswith(".xml") and os.path.isfile(os.path.join(match, fname)) for fname in os.listdir(match)])
+            if os.path.isdir(match) and not is_study_dir:
+                study_paths += [os.path.join(match, fname) for fname in sorted(os.listdir(match))
+                                    if fname.endswith(".zip") or os.path.isdir(os.path.join(match, fname))]
+            else:
+                study_paths.append(match)
+
+    return list(dict.fromkeys([os.path.normpath(study_path) for study_path in study_paths]))
+
+def output_name(study_path : Union[str, PathLike], output_dir : Union[str, PathLike], file_format : str = "archive") -> str:
+    """Returns the path of the converted study inside `output_dir`, named after the zip file or directory of the study
+    """
+    study_name = os.path.basename(os.path.normpath(study_path))
+    if study_name.endswith(".zip"):
+        study_name = study_name[:-len(".zip")]
+    return os.path.join(output_dir, study_name + (".pkl.gz" if file_format == "pickle" else archive_suffix))
+
+def _remove_path(path : str):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def _path_size(path : str) -> int:
+    return sum([os.path.getsize(fname) for fname in DirectoryStorage().list_files(path)]) if os.path.isdir(path) else os.path.getsize(path)
+
+def convert_study(study_path : Union[str, PathLike], output : Union[str, PathLike], file_format : str = "archive", context : ExecutionContext = None,
+                  study_kwargs : Dict = None, save_kwargs : Dict = None) -> Dict:
+    """Converts a single study into the saved format. The study is first written to a temporary path next to `output` and then renamed,
+    so `output` only exists if the conversion succeeded. An existing `output` is replaced.
+
+    Parameters
+    ----------
+    study_path : Union[str, PathLike]
+        Directory or zip file of the study, see :func:`find_study_xml`
+    output : Union[str, PathLike]
+        Path of the converted study
+    file_format : str, optional
+        Format of the converted study, see :meth:`cartoreader_lite.CartoStudy.save`. By default "archive"
+    context : ExecutionContext, optional
+        Execution context used to read the study, by default a process pool that is shut down afterwards
+    study_kwargs : Dict, optional
+        Additional keyword arguments passed to :class:`cartoreader_lite.CartoStudy`, by default None
+    save_kwargs : Dict, optional
+        Additional keyword arguments passed to :meth:`cartoreader_lite.CartoStudy.save`, by default None
+
+    Returns
+    -------
+    Dict
+        Record of the conversion, see :func:`convert_studies`
+    """
+    study_path, output = os.fspath(study_path), os.fspath(output)
+    start = time.perf_counter()
+    load_stats = LoadStats()
+    study = CartoStudy(study_path, find_study_xml(study_path), context=context, load_stats=load_stats, **({} if study_kwargs is None else study_kwargs))
+    load_time = time.perf_counter() - start
+
+    #Keep the file ending, since the pickle format requires it
+    tmp_output = os.path.join(os.path.dirname(output), ".partial-" + os.path.basename(output))
+    _remove_path(tmp_output)
+    study.save(tmp_output, file_format, **({} if save_kwargs is None else save_kwargs))
+    if context is not None:
+        context.submit(int).result() #Raises BrokenProcessPool if a worker died while the study was loaded, so the study is never recorded as converted
+    _remove_path(output)
+    os.replace(tmp_output, output)
+    wall_time = time.perf_counter() - start
+
+    return {"input": study_path, "output": output, "status": "done", "error": None, "nr_maps": study.nr_maps,
+            "nr_points": int(sum([m.nr_points for m in study.maps])), "bytes_in": _path_size(study_path), "bytes_read": load_stats.total_bytes_read(),
+            "bytes_out": _path_size(output), "load_time": load_time, "save_time": wall_time - load_time, "wall_time": wall_time, "timestamp": time.time()}
+
+def _convert_isolated(study_path : str, output : str, file_format : str, context : ExecutionContext, study_kwargs : Dict, save_kwargs : Dict,
+                      pool_broken : threading.Event) -> Union[Dict, None]:
+    """Runs :func:`convert_study` and returns a failed record instead of raising, so a single study can not stop the conversion of the others.
+    Returns None without converting the study if the worker pool broke before the study started, see :func:`convert_studies`.
+    """
+    if pool_broken.is_set():
+        return None
+
+    start = time.perf_counter()
+    try:
+        return convert_study(study_path, output, file_format, context, study_kwargs, save_kwargs)
+    except Exception as ex:
+        log.warning(f"Converting {study_path} failed", exc_info=True)
+        if isinstance(ex, BrokenProcessPool):
+            #A worker died (e.g. out of memory). The pool is not recreated here, since the other studies still run in their threads.
+            pool_broken.set()
+        _remove_path(os.path.join(os.path.dirname(output), ".partial-" + os.path.basename(output)))
+        return {"input": study_path, "output": output, "status": "failed", "error": f"{type(ex).__name__}: {ex}",
+                "wall_time": time.perf_counter() - start, "timestamp": time.time()}
+
+def read_manifest(manifest_fname : Union[str, PathLike]) -> Dict[str, Dict]:
+    """Reads the latest record of each study from a manifest written by :func:`convert_studies`
+
+    Parameters
+    ----------
+    manifest_fname : Union[str, PathLike]
+        Path of the manifest. A missing manifest is treated as empty
+
+    Returns
+    -------
+    Dict[str, Dict]
+        The latest record of each study, by the path of the study
+    """
+    records = {}
+    if manifest_fname is None or not os.path.isfile(manifest_fname):
+        return records
+
+    with open(manifest_fname, "r") as manifest_f:
+        for line in manifest_f:
+            if len(line.strip()) > 0:
+                record = json.loads(line)
+                records[record["input"]] = record
+    return records
+
+def convert_studies(study_paths : List[Union[str, PathLike]], output_dir : Union[str, PathLike], file_format : str = "archive", max_workers : int = None,
+                    max_in_flight : int = 2, manifest_fname : Union[str, PathLike] = None, force : bool = False, study_kwargs : Dict = None,
+                    save_kwargs : Dict = None, callback : Callable = None) -> List[Dict]:
+    """Converts multiple studies in parallel, see :func:`convert_study`.
+    Studies whose latest record in the manifest is "done" and whose output still exists are skipped, so an interrupted conversion can be resumed.
+
+    Parameters
+    ----------
+    study_paths : List[Union[str, PathLike]]
+        Directories or zip files of the studies, e.g. found by :func:`find_studies`
+    output_dir : Union[str, PathLike]
+        Directory the converted studies are written to, see :func:`output_name`. Will be created if missing
+    file_format : str, optional
+        Format of the converted studies, see :meth:`cartoreader_lite.CartoStudy.save`. By default "archive"
+    max_workers : int, optional
+        Number of worker processes shared by all studies, also used as the number of compression threads while saving.
+        By default the number of CPUs available to the current process
+    max_in_flight : int, optional
+        Maximum number of studies converted at the same time, bounding the memory used. By default 2
+    manifest_fname : Union[str, PathLike], optional
+        Manifest the record of each study is appended to, as one JSON line. By default `manifest.jsonl` inside `output_dir`
+    force : bool, optional
+        If true, all studies will be converted, even if they were already converted according to the manifest. By default False
+    study_kwargs : Dict, optional
+        Additional keyword arguments passed to :class:`cartoreader_lite.CartoStudy`, by default None
+    save_kwargs : Dict, optional
+        Additional keyword arguments passed to :meth:`cartoreader_lite.CartoStudy.save`, by default None
+    callback : Callable, optional
+        Function called with each record as soon as the study finished, by default None
+
+    Returns
+    -------
+    List[Dict]
+        Record of each study, in the order of `study_paths`, holding
+
+            * input, output: Paths of the study and the converted study
+            * status: "done", "failed" or "skipped" (already converted)
+            * error: Error raised while converting the study, None if converted
+            * nr_maps, nr_points: Number of maps and points of the converted study
+            * bytes_in, bytes_read, bytes_out: Size of the study, of the files read while loading it and of the converted study
+            * load_time, save_time, wall_time: Elapsed time in seconds
+            * timestamp: Time the conversion finished (see :func:`time.time`)
+
+        Failed and skipped studies only hold a part of the entries. If a worker process dies, all studies in flight fail,
+        while the studies not yet started are converted after the worker pool was recreated.
+    """
+    assert max_in_flight > 0, "At least one study needs to be converted at a time"
+    study_paths = [os.path.normpath(os.fspath(study_path)) for study_path in study_paths]
+    outputs = [output_name(study_path, output_dir, file_format) for study_path in study_paths]
+    assert len(set(outputs)) == len(outputs), "Multiple studies would be converted to the same output, since they have the same name"
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_fname = os.path.join(output_dir, "manifest.jsonl") if manifest_fname is None else manifest_fname
+    completed = read_manifest(manifest_fname)
+
+    records = [None] * len(study_paths)
+    pending = []
+    for study_i, (study_path, output) in enumerate(zip(study_paths, outputs)):
+        record = completed.get(study_path)
+        if not force and record is not None and record["status"] == "done" and record["output"] == output and os.path.exists(output):
+            records[study_i] = {**record, "status": "skipped"}
+            if callback is not None:
+                callback(records[study_i])
+        else:
+            pending.append(study_i)
+
+    with ExecutionContext("process", max_workers) as context, open(manifest_fname, "a") as manifest_f:
+        save_kwargs = {"max_workers": context.max_workers, **({} if save_kwargs is None else save_kwargs)}
+        #If a worker dies, the pool breaks and all studies in flight fail. The studies not yet started are then converted in another round,
+        #after all study threads finished and a new pool was started. Each round starts at least one study, so the rounds terminate.
+        while len(pending) > 0:
+            context.shutdown()
+            context.submit(int).result() #Start the workers before the studies run in multiple threads, since forking a multi-threaded process may deadlock
+            pool_broken = threading.Event()
+            with ExecutionContext("thread", max_in_flight) as study_context:
+                #Only max_in_flight studies are running, the others wait in the queue of the thread pool
+                futures = {study_context.submit(_convert_isolated, study_paths[study_i], outputs[study_i], file_format, context, study_kwargs, save_kwargs, pool_broken): study_i
+                           for study_i in pending}
+                for future in as_completed(futures):
+                    record = future.result()
+                    if record is None:
+                        continue
+
+                    records[futures[future]] = record
+                    manifest_f.write(json.dumps(record) + "\n")
+                    manifest_f.flush()
+                    if callback is not None:
+                        callback(record)
+
+            pending = [study_i for study_i in pending if records[study_i] is None]
+
+    return records
+
+def summarize(records : List[Dict], wall_time : float) -> Dict:
+    """Summarizes the records returned by :func:`convert_studies`, i.e. the number of converted, failed and skipped studies, the total bytes and the throughput
+
+    Parameters
+    ----------
+    records : List[Dict]
+        Records of the studies
+    wall_time : float
+        Total elapsed time of the conversion in seconds
+
+    Returns
+    -------
+    Dict
+        The summary
+    """
+    done = [record for record in records if record["status"] == "done"]
+    bytes_in = sum([record["bytes_in"] for record in done])
+    return {"studies": len(records), "done": len(done), "failed": sum([record["status"] == "failed" for record in records]),
+            "skipped": sum([record["status"] == "skipped" for record in records]), "bytes_in": bytes_in, "bytes_out": sum([record["bytes_out"] for record in done]),
+            "wall_time": wall_time, "load_time": sum([record["load_time"] for record in done]), "save_time": sum([record["save_time"] for record in done]),
+            "studies_per_hour": len(done) / wall_time * 3600 if wall_time > 0 else None, "mb_per_s": bytes_in / 2**20 / wall_time if wall_time > 0 else None}
+
+def main(argv : List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="Zip files or directories of studies, directories holding multiple studies or glob patterns")
+    parser.add_argument("-o", "--output", required=True, help="Directory the converted studies are written to")
+    parser.add_argument("--format", default="archive", choices=["archive", "directory", "pickle"], help="Format of the converted studies")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes shared by all studies, by default the number of available CPUs")
+    parser.add_argument("--max-in-flight", type=int, default=2, help="Maximum number of studies converted at the same time")
+    parser.add_argument("--manifest", default=None, help="Manifest of the converted studies, by default manifest.jsonl inside the output directory")
+    parser.add_argument("--force", action="store_true", help="Convert all studies, including the ones already converted according to the manifest")
+    args = parser.parse_args(argv)
+
+    study_paths = find_studies(args.inputs)
+    nr_finished = 0
+    def print_record(record : Dict):
+        nonlocal nr_finished
+        nr_finished += 1
+        details = f"({record['wall_time']:.1f} s)" if record["status"] == "done" else (record["error"] or "")
+        print(f"[{nr_finished}/{len(study_paths)}] {record['status']}: {record['input']} -> {record['output']} {details}", flush=True)
+
+    start = time.perf_counter()
+    records = convert_studies(study_paths, args.output, args.format, args.workers, args.max_in_flight, args.manifest, args.force, callback=print_record)
+    summary = summarize(records, time.perf_counter() - start)
+
+    print(f"Converted {summary['done']}/{summary['studies']} studies ({summary['skipped']} skipped, {summary['failed']} failed) in {summary['wall_time']:.1f} s")
+    if summary["done"] > 0:
+        print(f"Read {summary['bytes_in'] / 2**20:.1f} MB, wrote {summary['bytes_out'] / 2**20:.1f} MB: "
+              f"{summary['studies_per_hour']:.1f} studies/h, {summary['mb_per_s']:.2f} MB/s "
+              f"(loading {summary['load_time']:.1f} s, saving {summary['save_time']:.1f} s summed over all studies)")
+    for record in records:
+        if record["status"] == "failed":
+            print(f"Failed: {record['input']}: {record['error']}")
+
+    return 1 if summary["failed"] > 0 else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
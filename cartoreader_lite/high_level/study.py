@@ -1,19 +1,32 @@
 from __future__ import annotations #recursive type hinting
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor 
 import logging as log
 import pickle
-from typing import Dict, List, Tuple, IO, Union
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Tuple, IO, Union
 
-from cartoreader_lite.low_level.utils import convert_fname_to_handle, simplify_dataframe_dtypes, unify_time_data, xyz_to_pos_vec
+from cartoreader_lite.low_level.utils import column_vectors, convert_fname_to_handle, interp_spline_orders, memory_nbytes, mesh_nbytes, read_converted_point_batch, read_point_data, simplify_dataframe_dtypes, unify_time_data, xyz_to_pos_vec
 from ..low_level.study import CartoLLStudy, CartoLLMap, CartoAuxMesh
+from ..low_level.cache import ParseCache
+from ..low_level.lazy import LazyObject, LazySequence
+from ..low_level.visitags import VisiTagData
+from ..low_level.execution import ExecutionContext, deferred_context, local_context, temporary_context
+from ..low_level.stats import LoadStats, convert_to_stats, load_stage
+from ..low_level.storage import convert_to_storage
+from ..low_level.archive import ArchiveReader, ArchiveWriter, archive_suffix, is_archive
+from ..low_level.compression import BlockGzipReader, BlockGzipWriter, is_block_compressed
+from functools import partial
+from itertools import repeat
 import pandas as pd
 import numpy as np
 import re
 import gzip
+import io
 from os import PathLike
 import os
 import pyvista as pv
-from ..postprocessing.geometry import project_points
+from ..postprocessing.geometry import ProjectionIndex
 
 dtype_simplify_dict = {"InAccurateSeverity": np.int8,
                         "ChannelID": np.int32,
@@ -46,6 +59,15 @@ class AblationSites():
         All data will be concatenated into a single pd.Dataframe with an additional column `file_tag` that marks the file suffix.
         Note that the concatenation will set values, absent from one of the files, to NaN.
         By default, True
+    resample_per_session : bool, optional
+        If true (and `resample_unified_time` is true), each ablation session is resampled separately on a time grid spanning only this session,
+        instead of a single grid spanning the whole procedure. This avoids interpolating across the gaps between sessions and keeps the memory proportional to the ablation time.
+        Sessions are resampled in parallel. Sessions missing in any of the files or too short for the interpolation are skipped.
+        By default False
+    context : ExecutionContext, optional
+        Context used to resample the sessions in parallel, by default a thread pool
+    load_stats : LoadStats, optional
+        Report recording the stages "visitag_files" and "resample", see :class:`cartoreader_lite.low_level.stats.LoadStats`. By default None
     """
 
     session_avg_data : pd.DataFrame #: Contains average data of each ablation session, such as :term:`RFIndex`, average force and position
@@ -54,7 +76,17 @@ class AblationSites():
     session_force_data : List[Tuple[int, pd.DataFrame]] = None #: Force data provided by the low level classes. Only present if `resample_unified_time` was False
 
     def __init__(self, visitag_data : Dict[str, pd.DataFrame], resample_unified_time=True,
-                 position_to_vec=True, parse_file_tag=True) -> None:
+                 position_to_vec=True, parse_file_tag=True, resample_per_session=False, context : ExecutionContext = None, load_stats : LoadStats = None) -> None:
+
+        #Only the files used below are parsed (in parallel), e.g. AllPositionInGrids is skipped
+        if isinstance(visitag_data, VisiTagData):
+            file_names = ["Sites", "RawPositions", "AblationData", "ContactForceData"]
+            keys = [k for k in visitag_data if any([(k == name) if not parse_file_tag else re.match(name, k) for name in file_names])]
+            with load_stage(load_stats, "visitag_files") as stage:
+                if load_stats is not None:
+                    missing_keys = [k for k in keys if not visitag_data.is_loaded(k)]
+                    stage.update(bytes_read=sum([convert_to_storage(visitag_data.storage).stat(visitag_data.fnames[k])[0] for k in missing_keys]), items=len(missing_keys))
+                visitag_data.load(keys)
 
         #If parse_file_tag is True, this function will match a regular expression with the keys and append the matched group to the data
         def visitag_data_w_suffix(name : str) -> pd.DataFrame: 
@@ -62,8 +94,9 @@ class AblationSites():
                 return visitag_data[name]
 
             complete_data = []
-            for k, data in visitag_data.items():
+            for k in visitag_data:
                 if (match := re.match(name + r"_?(.*)", k)):
+                    data = visitag_data[k]
                     data["file_tag"] = match.group(1)
                     complete_data.append(data)
 
@@ -77,9 +110,14 @@ class AblationSites():
         if resample_unified_time:
             #Contact force data uses a different time label, but the timings look the same as the other data
             contact_force_data = visitag_data_w_suffix("ContactForceData").rename(columns={"Time": "TimeStamp"})
-            time_data = unify_time_data([visitag_data_w_suffix("RawPositions"), visitag_data_w_suffix("AblationData"), contact_force_data], time_k="TimeStamp", 
-                                         time_interval=100, kind="quadratic")
-            self.session_time_data = list(simplify_dataframe_dtypes(time_data, dtype_simplify_dict).groupby("Session"))
+            time_dfs = [visitag_data_w_suffix("RawPositions"), visitag_data_w_suffix("AblationData"), contact_force_data]
+            with load_stage(load_stats, "resample") as stage:
+                if resample_per_session:
+                    self.session_time_data = AblationSites._resample_sessions(time_dfs, context)
+                else:
+                    time_data = unify_time_data(time_dfs, time_k="TimeStamp", time_interval=100, kind="quadratic")
+                    self.session_time_data = list(simplify_dataframe_dtypes(time_data, dtype_simplify_dict).groupby("Session"))
+                stage.update(items=len(self.session_time_data))
             
         else:
             self.session_time_data = list(simplify_dataframe_dtypes(visitag_data_w_suffix("RawPositions"), dtype_simplify_dict).groupby("Session"))
@@ -92,16 +130,67 @@ class AblationSites():
             self.session_avg_data = xyz_to_pos_vec(self.session_avg_data)
             self.session_time_data = [(session_id, xyz_to_pos_vec(time_data)) for session_id, time_data in self.session_time_data]
 
+    @staticmethod
+    def _resample_sessions(time_dfs : List[pd.DataFrame], context : ExecutionContext = None) -> List[Tuple[int, pd.DataFrame]]:
+        session_dfs = [dict(list(df.groupby("Session"))) for df in time_dfs]
+        session_ids = sorted(set.intersection(*[set(sessions.keys()) for sessions in session_dfs]))
+        skipped_ids = sorted(set.union(*[set(sessions.keys()) for sessions in session_dfs]) - set(session_ids))
+        if len(skipped_ids) > 0:
+            log.info(f"Skipping the ablation sessions {skipped_ids}, since they are not present in all VisiTag files")
+
+        with temporary_context(context, "thread") as context:
+            session_data = list(context.map(_resample_session, [[sessions[session_id] for sessions in session_dfs] for session_id in session_ids]))
+
+        return [(session_id, data) for session_id, data in zip(session_ids, session_data) if data is not None]
+
+    def _memory_usage(self, deep : bool = False, seen : Dict = None) -> Dict[str, int]:
+        seen = {} if seen is None else seen
+        return {k: memory_nbytes(getattr(self, k), deep, seen) for k in ["session_avg_data", "session_time_data", "session_rf_data", "session_force_data"]}
+
+    def memory_usage(self, deep : bool = False) -> pd.Series:
+        """Returns the memory held by the ablation data in bytes, by its attributes (see :func:`cartoreader_lite.low_level.utils.memory_nbytes`)
+
+        Parameters
+        ----------
+        deep : bool, optional
+            If true, Python objects (e.g. strings and object columns) are counted as well, see :meth:`pandas.DataFrame.memory_usage`.
+            By default False
+
+        Returns
+        -------
+        pd.Series
+            Bytes held by each attribute
+        """
+        return pd.Series(self._memory_usage(deep), dtype=np.int64)
+
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({len(self.session_time_data)} sessions)"
 
+def _resample_session(session_dfs : List[pd.DataFrame], time_interval : int = 100, kind : str = "quadratic") -> pd.DataFrame:
+    """Resamples the VisiTag time series of a single session on a grid spanning the session, see :meth:`AblationSites._resample_sessions`
+    """
+    start, end = max([df["TimeStamp"].min() for df in session_dfs]), min([df["TimeStamp"].max() for df in session_dfs])
+    if start > end or min([len(df) for df in session_dfs]) <= interp_spline_orders.get(kind, 1):
+        log.info(f"Skipping the ablation session {session_dfs[0]['Session'].iloc[0]}, since it is too short to be resampled")
+        return None
+
+    return simplify_dataframe_dtypes(unify_time_data(session_dfs, time_k="TimeStamp", time_interval=time_interval, kind=kind), dtype_simplify_dict)
+
 ecg_gain_re = re.compile(r"\s*Raw ECG to MV \(gain\)\s*\=\s*(-?\d+\.?\d*)\s*")
 ecg_labels = ["I", "II", "III", "aVR", "aVL", "aVF"] + [f"V{i+1}" for i in range(6)]
 ecg_labels_re = [re.compile(l + r"\(\d+\)") for l in ecg_labels]
 egm_label_re = re.compile(r"(.+)\((\d+)\)")
+_shared_columns = {}
+
+def shared_columns(columns : List[str]) -> Tuple[str]:
+    """Returns the column names as a tuple that is shared by all points with the same columns
+    """
+    columns = tuple(columns)
+    return _shared_columns.setdefault(columns, columns)
 
 class CartoPointDetailData():
     """Detailed data associated to a CARTO3 point.
+    The signals are held as NumPy arrays, with column names shared between points, and :attr:`surface_ecg` and :attr:`egm` are created as DataFrame views on access.
 
     Parameters
     ----------
@@ -114,6 +203,10 @@ class CartoPointDetailData():
         By default True
     """
 
+    __slots__ = ["id", "pos", "cath_orientation", "cath_id", "woi", "start_time", "ref_annotation", "map_annotation", "uni_volt", "bip_volt", "connectors",
+                 "ecg_gain", "ecg_metadata", "contact_force_metadata", "contact_force_data",
+                 "_surface_ecg_values", "_surface_ecg_columns", "_egm_values", "_egm_columns", "_signals"]
+
     id : int #: Carto generated ID of the point
     pos : np.ndarray #: Position of the point in 3D
     cath_orientation : np.ndarray #: 3D-Orientation of the catheter while recording the point
@@ -127,31 +220,32 @@ class CartoPointDetailData():
     connectors : List[str] #: List of the recorded connector names
     ecg_gain : float #: Gain of the recorded :term:`ECGs<ECG>`
     ecg_metadata : object #: Additional provided metadata regarding the :term:`ECGs<ECG>` or :term:`EGMs<EGM>`
-    surface_ecg : pd.DataFrame #: Recorded surface :term:`ECG`. Has type np.int16 and needs to be multiplied by :attr:`~CartoPointDetailData.ecg_gain` to get the ECG in Volts
-    egm : pd.DataFrame #: Recorded electrograms at the point through the connectors. Naming and columns differ for each setup
-
-    def __init__(self, main_data : pd.Series, raw_data : Tuple[Dict[str, Dict], Dict[str, Dict]],
-                remove_egm_header_numbers=True) -> None:
 
+    def _read_metadata(self, main_data : pd.Series, metadata : Dict[str, Dict], connectors : List[str]):
         #Read the easy metadata first
-        self.id = main_data["Id"]
+        self.id = int(main_data["Id"])
         self.pos = main_data["Position3D"]
         self.cath_orientation = main_data["CathOrientation"]
-        self.cath_id = main_data["Cath_Id"]
+        self.cath_id = int(main_data["Cath_Id"])
 
-        #Metadata is the first tuple object, actual data in the second tuple
         #WOI
-        self.woi = np.array([float(raw_data[0]["WOI"]["From"]), float(raw_data[0]["WOI"]["To"])])
-        self.start_time = int(raw_data[0]["Annotations"]["StartTime"])
-        self.ref_annotation = int(raw_data[0]["Annotations"]["Reference_Annotation"])
-        self.map_annotation = int(raw_data[0]["Annotations"]["Map_Annotation"])
+        self.woi = np.array([float(metadata["WOI"]["From"]), float(metadata["WOI"]["To"])])
+        self.start_time = int(metadata["Annotations"]["StartTime"])
+        self.ref_annotation = int(metadata["Annotations"]["Reference_Annotation"])
+        self.map_annotation = int(metadata["Annotations"]["Map_Annotation"])
 
         #Voltages
-        self.uni_volt = float(raw_data[0]["Voltages"]["Unipolar"])
-        self.bip_volt = float(raw_data[0]["Voltages"]["Bipolar"])
+        self.uni_volt = float(metadata["Voltages"]["Unipolar"])
+        self.bip_volt = float(metadata["Voltages"]["Bipolar"])
 
         #Connectors
-        self.connectors = list(raw_data[1]["connector_data"].keys())
+        self.connectors = connectors
+
+    def __init__(self, main_data : pd.Series, raw_data : Tuple[Dict[str, Dict], Dict[str, Dict]],
+                remove_egm_header_numbers=True) -> None:
+
+        self._read_metadata(main_data, raw_data[0], list(raw_data[1]["connector_data"].keys()))
+        self._signals = None
 
         #Contact Forces
         if "contact_force_data" in raw_data[1]:
@@ -167,28 +261,355 @@ class CartoPointDetailData():
         #self.ecg_export_version_number = data[1]["ecg"][0][0]""
         ecg_data = raw_data[1]["ecg"][1]
         assert np.iinfo(np.int16).min <= ecg_data.min().min() and np.iinfo(np.int16).max >= ecg_data.max().max(), "ECG can not be simplified to np.in16"
-        ecg_data = ecg_data.astype(np.int16)
+        ecg_values = ecg_data.to_numpy(dtype=np.int16)
 
         #Find the surface ECGs in the data and split the data into surface and other EGMs
         surface_ecg_inds = [[j for j, c in enumerate(ecg_data.columns) if l.match(c) is not None] for l in ecg_labels_re]
         assert all([len(l) == 1 for l in surface_ecg_inds]), "12-lead ECG not present in the point data"
         surface_ecg_inds = [l[0] for l in surface_ecg_inds]
-        self.surface_ecg = ecg_data.iloc[:, surface_ecg_inds]
-        self.egm = ecg_data.drop(ecg_data.columns[surface_ecg_inds], axis=1)
+        egm_inds = [j for j in range(ecg_values.shape[1]) if j not in surface_ecg_inds]
+        self._surface_ecg_values = ecg_values[:, surface_ecg_inds]
+        self._egm_values = ecg_values[:, egm_inds]
 
         #Remove the numbers after electrode description numbering
         if remove_egm_header_numbers:
-            self.surface_ecg.columns = np.array(ecg_labels) 
-            self.egm.columns = np.array([egm_label_re.match(col).group(1) for col in self.egm.columns])
+            self._surface_ecg_columns = shared_columns(ecg_labels)
+            self._egm_columns = shared_columns([egm_label_re.match(ecg_data.columns[j]).group(1) for j in egm_inds])
+        else:
+            self._surface_ecg_columns = shared_columns([ecg_data.columns[j] for j in surface_ecg_inds])
+            self._egm_columns = shared_columns([ecg_data.columns[j] for j in egm_inds])
 
     @property
-    def main_point_pd_row(self):
-        pd_attrs = ["id", "pos", "cath_orientation", "cath_id", "woi", "start_time", "ref_annotation", 
+    def surface_ecg(self) -> pd.DataFrame:
+        """Recorded surface :term:`ECG`. Has type np.int16 and needs to be multiplied by :attr:`~CartoPointDetailData.ecg_gain` to get the ECG in Volts
+        """
+        if self._signals is not None:
+            return self._signals[0].surface_ecg(self._signals[1])
+        return pd.DataFrame(self._surface_ecg_values, columns=self._surface_ecg_columns, copy=False)
+
+    @surface_ecg.setter
+    def surface_ecg(self, surface_ecg : pd.DataFrame):
+        self._unlink_signals()
+        self._surface_ecg_values, self._surface_ecg_columns = surface_ecg.to_numpy(), shared_columns(surface_ecg.columns)
+
+    @property
+    def egm(self) -> pd.DataFrame:
+        """Recorded electrograms at the point through the connectors. Naming and columns differ for each setup
+        """
+        if self._signals is not None:
+            return self._signals[0].egm(self._signals[1])
+        return pd.DataFrame(self._egm_values, columns=self._egm_columns, copy=False)
+
+    @egm.setter
+    def egm(self, egm : pd.DataFrame):
+        self._unlink_signals()
+        self._egm_values, self._egm_columns = egm.to_numpy(), shared_columns(egm.columns)
+
+    def _link_signals(self, signals : SignalStore, point_i : int):
+        #Replace the signals of the point by views into the map-wide store
+        self._signals = (signals, point_i)
+        self._surface_ecg_values = self._surface_ecg_columns = self._egm_values = self._egm_columns = None
+
+    def _unlink_signals(self):
+        #Copy the signals of the point back from the store
+        if self._signals is not None:
+            signals, point_i = self._signals
+            self._signals = None
+            self._surface_ecg_values, self._surface_ecg_columns = signals.surface_ecg(point_i).to_numpy().copy(), shared_columns(signals.surface_ecg(point_i).columns)
+            self._egm_values, self._egm_columns = signals.egm(point_i).to_numpy().copy(), shared_columns(signals.egm(point_i).columns)
+
+    def __getstate__(self) -> dict:
+        state = {}
+        for k in CartoPointDetailData.__slots__:
+            try:
+                state[k] = object.__getattribute__(self, k) #Unset slots do not trigger __getattr__ of subclasses
+            except AttributeError:
+                pass
+
+        state.update(getattr(self, "__dict__", {}))
+        return state
+
+    def __setstate__(self, state : dict):
+        #Also accepts the state of previous versions, holding the signals as DataFrames
+        self._signals = None
+        for k, v in state.items():
+            if k != "_signals":
+                setattr(self, k, v)
+        if state.get("_signals") is not None: #Views will be recreated from the store, which is only pickled once
+            self._link_signals(*state["_signals"])
+
+    def _memory_usage(self, deep : bool = False, seen : Dict = None) -> Dict[str, int]:
+        #Reads the slots directly, so that handles (see CartoPointDetailHandle) are not loaded. Signals linked to a SignalStore are counted with the store
+        seen = {} if seen is None else seen
+        state = {k: v for k, v in CartoPointDetailData.__getstate__(self).items() if k in CartoPointDetailData.__slots__ and k != "_signals"}
+        usage = {"surface_ecg": memory_nbytes(state.pop("_surface_ecg_values", None), deep, seen) + memory_nbytes(state.pop("_surface_ecg_columns", None), deep, seen),
+                 "egm": memory_nbytes(state.pop("_egm_values", None), deep, seen) + memory_nbytes(state.pop("_egm_columns", None), deep, seen),
+                 "contact_force": memory_nbytes(state.pop("contact_force_data", None), deep, seen)}
+        usage["point_metadata"] = (sys.getsizeof(self) if deep else 0) + sum([memory_nbytes(v, deep, seen) for v in state.values()])
+        return usage
+
+    def memory_usage(self, deep : bool = False) -> pd.Series:
+        """Returns the memory held by the point in bytes, split into its "surface_ecg", "egm", "contact_force" and remaining "point_metadata".
+        Signals held by the :class:`SignalStore` of the map are not included, see :meth:`CartoMap.memory_usage`.
+
+        Parameters
+        ----------
+        deep : bool, optional
+            If true, Python objects (e.g. strings, dicts and the point itself) are counted as well, see :func:`cartoreader_lite.low_level.utils.memory_nbytes`.
+            By default False
+
+        Returns
+        -------
+        pd.Series
+            Bytes held by each component
+        """
+        return pd.Series(self._memory_usage(deep), dtype=np.int64)
+
+    #Attributes that are part of the points table of the map
+    _main_attrs = ["id", "pos", "cath_orientation", "cath_id", "woi", "start_time", "ref_annotation", 
                     "map_annotation", "uni_volt", "bip_volt", "connectors",
                     ] #"surface_ecg", "egm"]
 
+    #Vector attributes, stored as one numeric column per component in the points table
+    _vector_columns = {"pos": ["pos_x", "pos_y", "pos_z"], 
+                       "cath_orientation": ["cath_orientation_x", "cath_orientation_y", "cath_orientation_z"],
+                       "woi": ["woi_from", "woi_to"]}
+
+    @property
+    def main_point_pd_row(self):
         #This represents a single row of the returning pandas DataFrame
-        return {**{k: getattr(self, k) for k in pd_attrs}, **{"detail": self}}
+        row = {}
+        for k in CartoPointDetailData._main_attrs:
+            if k in CartoPointDetailData._vector_columns:
+                row.update(zip(CartoPointDetailData._vector_columns[k], getattr(self, k)))
+            else:
+                row[k] = getattr(self, k)
+        return {**row, **{"detail": self}}
+
+    @staticmethod
+    def _points_table(points : List[CartoPointDetailData]) -> pd.DataFrame:
+        #Columnar version of main_point_pd_row. The components of each vector attribute are created from a single array, to be accessible as view (see column_vectors)
+        frames, scalars = [], {}
+        for k in CartoPointDetailData._main_attrs:
+            values = [getattr(p, k) for p in points]
+            if k in CartoPointDetailData._vector_columns:
+                columns = CartoPointDetailData._vector_columns[k]
+                frames += ([pd.DataFrame(scalars)] if len(scalars) > 0 else []) + [pd.DataFrame(np.array(values, dtype=np.float64).reshape([-1, len(columns)]), columns=columns)]
+                scalars = {}
+            else:
+                scalars[k] = values
+        scalars["detail"] = list(points)
+        return pd.concat(frames + [pd.DataFrame(scalars)], axis=1)
+
+    @staticmethod
+    def _attrs_from_table(points : pd.DataFrame) -> Dict[str, list]:
+        #Main attributes of each point from the points table. Tables of previous versions hold the vector attributes in a single object column
+        attrs = {}
+        for k in CartoPointDetailData._main_attrs:
+            columns = CartoPointDetailData._vector_columns.get(k)
+            attrs[k] = list(column_vectors(points, columns).copy()) if columns is not None and columns[0] in points else points[k].tolist() #Native scalars
+        return attrs
+
+class SignalStore():
+    """Contiguous store of the surface :term:`ECGs<ECG>` and :term:`EGMs<EGM>` of all points of a map.
+    Each point occupies one row of :attr:`values`, holding its surface ECG in the first 12 channel slots, followed by its EGMs in the recorded order.
+    Since the recorded EGM channels can differ between points, :attr:`point_channels` maps the slots of each point to the channel names.
+    Points with fewer samples or channels than others are padded with zeros.
+
+    Parameters
+    ----------
+    points : List[CartoPointDetailData]
+        The points whose signals will be stored
+    """
+
+    values : np.ndarray #: Signals of all points as np.int16 with the shape [n_points, n_samples, n_slots]. Needs to be multiplied by the :attr:`~CartoPointDetailData.ecg_gain` of the point to get the signals in Volts
+    channel_names : np.ndarray #: Names of all channels recorded by any of the points
+    channel_index : Dict[str, int] #: Index of each channel name into :attr:`channel_names`
+    point_channels : np.ndarray #: Index into :attr:`channel_names` of the channel held by each slot of each point with shape [n_points, n_slots]. -1 for unused slots.
+    nr_samples : np.ndarray #: Number of recorded samples of each point
+
+    nr_surface_ecg_channels = len(ecg_labels)
+
+    def __init__(self, points : List[CartoPointDetailData]) -> None:
+        assert len(points) > 0, "At least one point is required"
+        self.channel_index = {}
+        point_slots = [[self.channel_index.setdefault(name, len(self.channel_index)) for name in list(p.surface_ecg.columns) + list(p.egm.columns)]
+                            for p in points]
+        self.channel_names = np.array(list(self.channel_index.keys()), dtype=object)
+        self.nr_samples = np.array([p.surface_ecg.shape[0] for p in points])
+
+        nr_ecg = SignalStore.nr_surface_ecg_channels
+        self.values = np.zeros([len(points), self.nr_samples.max(), max(len(slots) for slots in point_slots)], dtype=np.int16)
+        self.point_channels = np.full(self.values.shape[::2], -1, dtype=np.int32)
+        for point_i, (p, slots, nr_samples) in enumerate(zip(points, point_slots, self.nr_samples)):
+            self.values[point_i, :nr_samples, :nr_ecg] = p.surface_ecg.to_numpy()
+            self.values[point_i, :nr_samples, nr_ecg:len(slots)] = p.egm.to_numpy()
+            self.point_channels[point_i, :len(slots)] = slots
+
+    @staticmethod
+    def from_arrays(values : np.ndarray, channel_names : List[str], point_channels : np.ndarray, nr_samples : np.ndarray) -> SignalStore:
+        """Creates a store from its arrays, e.g. when reading a saved study. See the attributes of :class:`SignalStore` for a description of the arguments.
+        """
+        signals = SignalStore.__new__(SignalStore)
+        signals.values, signals.point_channels, signals.nr_samples = values, point_channels, nr_samples
+        signals.channel_names = np.array(list(channel_names), dtype=object)
+        signals.channel_index = {name: channel_i for channel_i, name in enumerate(signals.channel_names)}
+        return signals
+
+    def _view(self, point_i : int, slots : slice) -> pd.DataFrame:
+        columns = self.channel_names[self.point_channels[point_i, slots]]
+        return pd.DataFrame(self.values[point_i, :self.nr_samples[point_i], slots], columns=columns, copy=False)
+
+    def surface_ecg(self, point_i : int) -> pd.DataFrame:
+        """Returns the surface :term:`ECG` of the point as a DataFrame sharing the memory of the store
+        """
+        return self._view(point_i, slice(0, SignalStore.nr_surface_ecg_channels))
+
+    def egm(self, point_i : int) -> pd.DataFrame:
+        """Returns the :term:`EGMs<EGM>` of the point as a DataFrame sharing the memory of the store
+        """
+        nr_slots = np.count_nonzero(self.point_channels[point_i] >= 0)
+        return self._view(point_i, slice(SignalStore.nr_surface_ecg_channels, nr_slots))
+
+    @property
+    def surface_ecgs(self) -> np.ndarray:
+        """Surface :term:`ECGs<ECG>` of all points with the shape [n_points, n_samples, 12], ordered as :data:`ecg_labels`
+        """
+        return self.values[..., :SignalStore.nr_surface_ecg_channels]
+
+    def channel(self, name : str) -> Tuple[np.ndarray, np.ndarray]:
+        """Gathers a single channel of all points
+
+        Parameters
+        ----------
+        name : str
+            Name of the channel, see :attr:`channel_names`
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            The signals of the channel with the shape [n_points, n_samples] and a boolean mask of the points that recorded the channel.
+            Signals of points without the channel are zero.
+        """
+        has_channel = self.point_channels == self.channel_index[name]
+        mask = np.any(has_channel, axis=1)
+        signals = self.values[np.arange(len(self)), :, np.argmax(has_channel, axis=1)]
+        signals[~mask] = 0
+        return signals, mask
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(nr_points={len(self)}, nr_samples={self.values.shape[1]}, nr_channels={len(self.channel_names)})"
+
+class PointDetailCache():
+    """Least recently used cache of the detailed point data, shared by all :class:`CartoPointDetailHandle` of a map.
+    Bounds the number of points whose detailed data (:term:`EGMs<EGM>`, :term:`ECGs<ECG>`, ...) is kept in memory.
+    The cache will be empty after pickling.
+
+    Parameters
+    ----------
+    max_size : int, optional
+        Maximum number of points kept in memory. If None, all loaded points will be kept.
+        By default 256
+    """
+
+    max_size : int #: Maximum number of points kept in memory
+
+    def __init__(self, max_size : int = 256) -> None:
+        assert max_size is None or max_size >= 0, "Cache size must be non-negative"
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, load_f):
+        """Returns the cached entry of the key, or calls `load_f` and caches its result.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        value = load_f() #Load outside of the lock, to allow loading multiple points in parallel
+        with self._lock:
+            self._entries[key] = value
+            while self.max_size is not None and len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getstate__(self) -> dict:
+        return {"max_size": self.max_size}
+
+    def __setstate__(self, state : dict):
+        self.__init__(**state)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({len(self)}/{self.max_size} points)"
+
+class CartoPointDetailHandle(CartoPointDetailData):
+    """Lightweight handle to the detailed data of a CARTO3 point.
+    Only the metadata is read when creating the handle. The detailed data (:term:`EGMs<EGM>`, surface :term:`ECG`, contact force)
+    is read from the study files on first access (e.g. of :attr:`~CartoPointDetailData.egm`) and kept in the :class:`PointDetailCache` of the map.
+    The study files therefore need to remain accessible.
+
+    Parameters
+    ----------
+    main_data : pd.Series
+        Metadata of the point, such as ID and mean position
+    point_metadata : Tuple[Dict[str, Dict], List[str]]
+        Metadata and connector names of the point, see :func:`cartoreader_lite.low_level.utils.read_point_metadata`
+    ll_map : CartoLLMap
+        The low level map the point belongs to
+    detail_cache : PointDetailCache
+        Cache that will hold the detailed data
+    remove_egm_header_numbers : bool, optional
+        See :class:`CartoPointDetailData`. By default True
+    """
+
+    _detail_attrs = ["ecg_gain", "ecg_metadata", "surface_ecg", "egm", "contact_force_metadata", "contact_force_data"]
+
+    def __init__(self, main_data : pd.Series, point_metadata : Tuple[Dict[str, Dict], List[str]], ll_map : CartoLLMap, 
+                 detail_cache : PointDetailCache, remove_egm_header_numbers=True) -> None:
+        self._read_metadata(main_data, *point_metadata)
+        self._source = (ll_map.name, ll_map.path_prefix, ll_map.cache, ll_map.storage)
+        self._detail_cache = detail_cache
+        self._remove_egm_header_numbers = remove_egm_header_numbers
+
+    def _main_data(self) -> Dict:
+        return {"Id": self.id, "Position3D": self.pos, "CathOrientation": self.cath_orientation, "Cath_Id": self.cath_id}
+
+    def _load_detail(self) -> CartoPointDetailData:
+        map_name, path_prefix, cache, storage = self._source
+        return CartoPointDetailData(self._main_data(), read_point_data(map_name, self.id, path_prefix, cache, storage), self._remove_egm_header_numbers)
+
+    def load(self) -> CartoPointDetailData:
+        """Returns the detailed data of the point, reading it if it is not in the cache
+        """
+        return self._detail_cache.get(self, self._load_detail)
+
+    @property
+    def surface_ecg(self) -> pd.DataFrame:
+        return self.load().surface_ecg
+
+    @property
+    def egm(self) -> pd.DataFrame:
+        return self.load().egm
+
+    def __getattr__(self, name : str):
+        #Only called for missing attributes
+        if name in CartoPointDetailHandle._detail_attrs and "_source" in self.__dict__:
+            return getattr(self.load(), name)
+
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
 
 class CartoMap():
 
@@ -200,11 +621,13 @@ class CartoMap():
         The low level study to load and simplify
     """
 
-    points : pd.DataFrame #: Recorded point data associated with this map. The column `detail` returns the associated :class:`CartoPointDetailData` where the ECGs and EGMs can be found.
+    points : pd.DataFrame #: Recorded point data associated with this map. The column `detail` returns the associated :class:`CartoPointDetailData` where the ECGs and EGMs can be found. Vectors such as the position are stored as one numeric column per component (e.g. `pos_x`, `pos_y`, `pos_z`), see :attr:`points_xyz`
     mesh : pv.UnstructuredGrid #: Mesh associated with the map
+    detail_cache : PointDetailCache = None #: Cache of the detailed point data. Only present if the point details were not loaded by the low level map
+    signals : SignalStore = None #: Contiguous store of the :term:`ECGs<ECG>` and :term:`EGMs<EGM>` of all points. The `surface_ecg` and `egm` of each point are views into this store. Not present if the point details are read on demand
 
     def _simplify(self, ll_map : CartoLLMap, discard_invalid_points=True, remove_egm_header_numbers=True,
-                        proj_points=True):
+                        proj_points=True, detail_cache_size=256, contiguous_signals=True, context : ExecutionContext = None, load_stats : LoadStats = None):
         """Function to simplify the data given by the lower level ll_map.
 
         Parameters
@@ -214,26 +637,25 @@ class CartoMap():
         discard_invalid_points : bool, optional
             If true, points with :term:`LAT` outside the :term:`WOI` will be automatically discarded.
             By default True
+        detail_cache_size : int, optional
+            If the low level map was loaded without the point details, the `detail` column will hold :class:`CartoPointDetailHandle` objects
+            and at most this many points will keep their detailed data in memory (see :class:`PointDetailCache`).
+            By default 256
+        contiguous_signals : bool, optional
+            If true, the signals of all points will be gathered in a single :class:`SignalStore` (:attr:`signals`)
+            and the `surface_ecg` and `egm` of each point will be views into it.
+            By default True
+        context : ExecutionContext, optional
+            Execution context used to process the points, see :class:`cartoreader_lite.low_level.execution.ExecutionContext`.
+            By default a process pool that is shut down afterwards
+        load_stats : LoadStats, optional
+            Report recording the stages "point_details" and "projection", see :class:`cartoreader_lite.low_level.stats.LoadStats`.
+            Points converted while reading them are recorded in the stage "points" of the low level map instead. By default None
         """
         self.name = ll_map.name
-
-        #Point data
-        if len(ll_map.points_main_data) > 0:
-            with ProcessPoolExecutor() as pool:
-                self._points_raw = [pool.submit(CartoPointDetailData, main_data, raw_data, remove_egm_header_numbers) for (row_i, main_data), raw_data in zip(ll_map.points_main_data.iterrows(), ll_map.point_raw_data)]
-                self._points_raw = np.array([p_r.result() for p_r in self._points_raw])
-            self.points = pd.DataFrame([p.main_point_pd_row for p in self._points_raw])
-
-            if discard_invalid_points:
-                corrected_woi = np.stack((self.points.woi + self.points.ref_annotation).to_numpy())
-                lat = self.points.map_annotation
-                valid_mask = (lat >= corrected_woi[..., 0]) & (lat <= corrected_woi[..., 1])
-                log.info(f"Discarding {np.sum(~valid_mask)}/{valid_mask.size} invalid points in map {self.name} (LAT outside WOI)")
-                self._points_raw = self._points_raw[valid_mask]
-                self.points = self.points[valid_mask].reset_index(drop=True)
-        else:
-            self.points = self._points_raw = []
-
+        with load_stage(load_stats, "point_details", map=self.name) as stage:
+            self._simplify_points(ll_map, discard_invalid_points, remove_egm_header_numbers, detail_cache_size, contiguous_signals, context)
+            stage.update(items=len(ll_map.points_main_data))
 
         #Mesh data
         self.mesh = ll_map.mesh
@@ -243,24 +665,200 @@ class CartoMap():
 
         #Project points onto the geometry
         if proj_points:
-            if len(self.points) > 0:
-                proj_points, proj_dist = project_points(self.mesh, np.stack(self.points["pos"].to_numpy()))[:2]
-                self.points["proj_pos"] = proj_points.tolist()
-                self.points["proj_dist"] = proj_dist
+            with load_stage(load_stats, "projection", map=self.name) as stage:
+                if len(self.points) > 0:
+                    proj_points, proj_dist = self.projection_index.project(self.points_xyz)[:2]
+                    self.points = pd.concat([self.points, pd.DataFrame(proj_points, columns=CartoMap._proj_pos_columns), pd.DataFrame({"proj_dist": proj_dist})], axis=1)
+
+                elif type(self.points) == pd.DataFrame: #Add empty columns just to be consistent
+                    for k in CartoMap._proj_pos_columns + ["proj_dist"]:
+                        self.points[k] = np.zeros(0)
+                stage.update(items=len(self.points))
+
+    def _simplify_points(self, ll_map : CartoLLMap, discard_invalid_points=True, remove_egm_header_numbers=True, detail_cache_size=256, contiguous_signals=True,
+                         context : ExecutionContext = None):
+        """Creates the :attr:`points` table and detailed points from the low level map, see :meth:`_simplify`
+        """
+        #Point data
+        if len(ll_map.points_main_data) > 0 and getattr(ll_map, "point_raw_data", None) is None:
+            #Detailed point data will be read on demand
+            self.detail_cache = PointDetailCache(detail_cache_size)
+            self._points_raw = np.array([CartoPointDetailHandle(main_data, point_metadata, ll_map, self.detail_cache, remove_egm_header_numbers) 
+                                            for (row_i, main_data), point_metadata in zip(ll_map.points_main_data.iterrows(), ll_map.point_metadata)])
+        elif len(ll_map.points_main_data) > 0:
+            if all([isinstance(p, CartoPointDetailData) for p in ll_map.point_raw_data]):
+                #Points were already converted while reading them (see CartoStudy)
+                self._points_raw = np.array(ll_map.point_raw_data)
+            else:
+                with temporary_context(context) as context:
+                    self._points_raw = [context.submit(CartoPointDetailData, main_data, raw_data, remove_egm_header_numbers) for (row_i, main_data), raw_data in zip(ll_map.points_main_data.iterrows(), ll_map.point_raw_data)]
+                    self._points_raw = np.array([p_r.result() for p_r in self._points_raw])
+        else:
+            self.points = self._points_raw = []
+            return
+
+        self.points = CartoPointDetailData._points_table(self._points_raw)
+        if discard_invalid_points:
+            #WOI and LAT are part of the point metadata, so points read on demand are discarded the same way
+            corrected_woi = column_vectors(self.points, CartoPointDetailData._vector_columns["woi"]) + self.points.ref_annotation.to_numpy()[:, np.newaxis]
+            lat = self.points.map_annotation
+            valid_mask = ((lat >= corrected_woi[..., 0]) & (lat <= corrected_woi[..., 1])).to_numpy()
+            log.info(f"Discarding {np.sum(~valid_mask)}/{valid_mask.size} invalid points in map {self.name} (LAT outside WOI)")
+            self._points_raw = self._points_raw[valid_mask]
+            self.points = self.points[valid_mask].reset_index(drop=True)
+
+        if contiguous_signals and self.detail_cache is None and len(self._points_raw) > 0:
+            self.signals = SignalStore(self._points_raw)
+            for point_i, point in enumerate(self._points_raw):
+                point._link_signals(self.signals, point_i)
+
+    def iter_points(self, batch_size : int = 64, context : ExecutionContext = None, max_pending : int = None) -> Iterator[List[CartoPointDetailData]]:
+        """Iterates over the detailed points of the map (the `detail` column of :attr:`points`) in consecutive batches.
+        If the point details are read on demand (see :attr:`detail_cache`), the batches are read in parallel from the study files 
+        (see :meth:`cartoreader_lite.low_level.study.CartoLLMap.iter_points`), bypassing the cache. Only the yielded batches are then kept in memory,
+        so a complete pass over all :term:`EGMs<EGM>` runs in constant memory. Otherwise, the points held by the map are returned.
 
-            elif type(self.points) == pd.DataFrame: #Add empty columns just to be consistent
-                self.points["proj_pos"] = []
-                self.points["proj_dist"] = []
+        Parameters
+        ----------
+        batch_size : int, optional
+            Number of points per batch, by default 64
+        context : ExecutionContext, optional
+            Execution context used to read the points on demand, by default a process pool that is shut down after the iteration
+        max_pending : int, optional
+            Maximum number of batches read ahead, see :meth:`cartoreader_lite.low_level.execution.ExecutionContext.imap`.
+            By default twice the number of workers
+
+        Yields
+        ------
+        Iterator[List[CartoPointDetailData]]
+            The detailed points of each batch, in the order of :attr:`points`
+        """
+        assert batch_size > 0, "Batches need to hold at least one point"
+        if self.detail_cache is None:
+            for start in range(0, len(self._points_raw), batch_size):
+                yield list(self._points_raw[start:start + batch_size])
+            return
+
+        handles = self._points_raw
+        map_name, path_prefix, cache, storage = handles[0]._source
+        point_converter = partial(CartoPointDetailData, remove_egm_header_numbers=handles[0]._remove_egm_header_numbers)
+        batches = (pd.DataFrame([handle._main_data() for handle in handles[start:start + batch_size]]) for start in range(0, len(handles), batch_size))
+        with temporary_context(context) as context:
+            yield from context.imap(read_converted_point_batch, repeat(point_converter), repeat(map_name), batches, 
+                                    repeat(path_prefix), repeat(cache), repeat(storage), max_pending=max_pending)
+
+    _proj_pos_columns = ["proj_pos_x", "proj_pos_y", "proj_pos_z"]
 
     @property
     def nr_points(self):
         return len(self.points)
 
+    @property
+    def points_xyz(self) -> np.ndarray:
+        """Positions of the points [Nx3] from the columns `pos_x`, `pos_y` and `pos_z` of :attr:`points`.
+        Returned as read-only view without copying, unless the columns were modified, see :func:`cartoreader_lite.low_level.utils.column_vectors`.
+        """
+        if len(self.points) == 0:
+            return np.zeros([0, 3])
+        return column_vectors(self.points, CartoPointDetailData._vector_columns["pos"])
+
+    @property
+    def proj_points_xyz(self) -> np.ndarray:
+        """Positions of the points projected onto the mesh [Nx3], from the columns `proj_pos_x`, `proj_pos_y` and `proj_pos_z` of :attr:`points`, see :attr:`points_xyz`
+        """
+        if len(self.points) == 0:
+            return np.zeros([0, 3])
+        return column_vectors(self.points, CartoMap._proj_pos_columns)
+
+    @property
+    def projection_index(self) -> ProjectionIndex:
+        """Index to project points onto :attr:`mesh`, see :class:`cartoreader_lite.postprocessing.geometry.ProjectionIndex`.
+        Built on first access and rebuilt if the mesh was replaced or modified.
+        """
+        index = self.__dict__.get("_projection_index")
+        if index is None or not index.is_valid_for(self.mesh):
+            index = self._projection_index = ProjectionIndex(self.mesh)
+        return index
+
+    def _memory_usage(self, deep : bool = False, seen : Dict = None) -> Dict[str, int]:
+        seen = {} if seen is None else seen
+        usage = {f"mesh_{k}": v for k, v in mesh_nbytes(self.mesh, deep, seen).items()}
+        table_usage = self.points.memory_usage(index=True, deep=deep) if isinstance(self.points, pd.DataFrame) else pd.Series(dtype=np.int64)
+        usage["points_table"] = int(table_usage.drop("detail", errors="ignore").sum()) #The detailed points are counted below
+
+        signals = self.signals
+        usage["signals"] = 0 if signals is None else memory_nbytes([signals.values, signals.channel_names, signals.point_channels, signals.nr_samples, signals.channel_index], deep, seen)
+        point_usage = [p._memory_usage(deep, seen) for p in self._points_raw]
+        for k in ["surface_ecg", "egm", "contact_force", "point_metadata"]:
+            usage[k] = sum([u[k] for u in point_usage])
+
+        if self.detail_cache is not None:
+            with self.detail_cache._lock:
+                cached_points = list(self.detail_cache._entries.values())
+            usage["detail_cache"] = sum([sum(p._memory_usage(deep, seen).values()) for p in cached_points])
+        index = self.__dict__.get("_projection_index")
+        usage["projection_index"] = 0 if index is None else index.memory_nbytes(seen)
+        return usage
+
+    def memory_usage(self, deep : bool = False) -> pd.Series:
+        """Returns the memory held by the map in bytes, by component (see :func:`cartoreader_lite.low_level.utils.memory_nbytes`):
+
+            * mesh_points, mesh_cells, mesh_data: Points, cells (connectivity, offsets and types) and data arrays of :attr:`mesh`
+            * points_table: :attr:`points`, without the detailed points
+            * signals: :attr:`signals`
+            * surface_ecg, egm, contact_force: Signals and contact force data held by the single points, e.g. if they are not part of :attr:`signals`
+            * point_metadata: Remaining attributes of the detailed points, such as their position and connectors
+            * detail_cache: Detailed points loaded on demand and kept in :attr:`detail_cache` (only if the point details were not loaded)
+            * projection_index: :attr:`projection_index`, if it was built. Arrays shared with the mesh are not counted again
+
+        Memory shared between the components, e.g. views of the signals, is only counted once.
+        Can be used to find the parts worth releasing, downcasting or loading lazily, or to check memory budgets.
+
+        Parameters
+        ----------
+        deep : bool, optional
+            If true, Python objects (e.g. strings, object columns and the point objects) are counted as well, see :meth:`pandas.DataFrame.memory_usage`.
+            By default False
+
+        Returns
+        -------
+        pd.Series
+            Bytes held by each component
+        """
+        return pd.Series(self._memory_usage(deep), dtype=np.int64)
+
     def __init__(self, ll_map : CartoLLMap, *simplify_args, **simplify_kwargs) -> None:
         #self.ll_map = ll_map
         self._simplify(ll_map, *simplify_args, **simplify_kwargs)
         #del self.ll_map
 
+    def __getstate__(self) -> dict:
+        return {k: v for k, v in self.__dict__.items() if k != "_projection_index"} #The index is rebuilt on demand
+
+    def __setstate__(self, state : dict):
+        self.__dict__.update(state)
+        if isinstance(self.points, pd.DataFrame):
+            self.points = CartoMap._convert_legacy_points(self.points)
+
+    @staticmethod
+    def _convert_legacy_points(points : pd.DataFrame) -> pd.DataFrame:
+        #Points tables of previous versions hold the vector attributes (e.g. pos) in a single object column.
+        #Each of these columns is replaced by its numeric components in place, created from a single array as in CartoPointDetailData._points_table
+        vector_columns = {**CartoPointDetailData._vector_columns, "proj_pos": CartoMap._proj_pos_columns}
+        if not any([k in points and columns[0] not in points for k, columns in vector_columns.items()]):
+            return points
+
+        frames, scalars = [], {}
+        for k in points.columns:
+            if k in vector_columns and vector_columns[k][0] not in points:
+                columns = vector_columns[k]
+                values = np.array(points[k].tolist(), dtype=np.float64).reshape([-1, len(columns)])
+                frames += ([pd.DataFrame(scalars, index=points.index)] if len(scalars) > 0 else []) + [pd.DataFrame(values, columns=columns, index=points.index)]
+                scalars = {}
+            else:
+                scalars[k] = points[k]
+        return pd.concat(frames + ([pd.DataFrame(scalars, index=points.index)] if len(scalars) > 0 else []), axis=1)
+
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(name={self.name}, nr_points={self.nr_points}, mesh={self.mesh})"
 
@@ -274,7 +872,7 @@ class CartoStudy():
 
                 * A directory containing the study
                 * A zip file with the study inside
-                * A path to a previously saved study
+                * A path to a previously saved study, either pickled or as archive (see :meth:`save`)
                 * A :class:`cartoreader_lite.low_level.study.CartoLLStudy` instance
         arg2 : str, optional
             The name of the study to load, contained inside the directory or zip file.
@@ -284,16 +882,44 @@ class CartoStudy():
             Optional keyword arguments to be passed to :class:`AblationSites`
         carto_map_kwargs : Dict
             Optional keyword arguments to be passed to :class:`CartoMap`
+        context : Union[ExecutionContext, str], optional
+            A :class:`cartoreader_lite.low_level.execution.ExecutionContext`, or the name of its backend ("serial", "thread" or "process"),
+            used for all parallel work while reading and simplifying the study. Passing the same context to multiple studies will reuse its workers.
+            By default a process pool that is shut down after loading the study. Lazily loaded maps (see `lazy`) then use a new pool for each map, which is shut down after loading the map.
+            Contexts passed as object are used for the lazily loaded maps as well and need to be shut down by the caller.
+            Ablation sessions resampled per session (see :class:`AblationSites`) use threads instead of processes, keeping the number of workers
+        cache : Union[ParseCache, str, PathLike], optional
+            Persistent cache of the parsed CARTO3 files, given as a :class:`cartoreader_lite.low_level.cache.ParseCache` or a path to the cache directory.
+            Re-opening the same study will then only parse new or changed files.
+            By default None
+        lazy : bool, optional
+            If true, only the study XML will be parsed when opening a study directory or zip file.
+            :attr:`maps` will then be a :class:`cartoreader_lite.low_level.lazy.LazySequence` that loads and simplifies each map on first access (by index or name),
+            :attr:`ablation_data` will be loaded on first access of its attributes and the auxiliary meshes on first access of their data.
+            Saving the study will load all remaining data. Also applies to opening study archives (see :class:`StudyArchive`). By default False
+        load_point_details : bool, optional
+            If false, only the metadata of the points will be read when opening a study directory or zip file.
+            The `detail` column of the map points will then hold :class:`CartoPointDetailHandle` objects that read the :term:`EGMs<EGM>` and :term:`ECGs<ECG>` on first access.
+            The number of points kept in memory can be set through the `detail_cache_size` argument of :class:`CartoMap`. By default True
+        mmap : bool, optional
+            If true, the arrays of uncompressed study archives (e.g. mesh points and point signals) are memory mapped instead of being read into memory,
+            see :class:`StudyArchive`. Only applies to opening study archives. By default False
+        load_stats : Union[LoadStats, Callable, bool], optional
+            A :class:`cartoreader_lite.low_level.stats.LoadStats` report, a callback streaming the stages of a new report, or True for a new report.
+            The report will record the time, bytes read and memory of each loading stage (e.g. reading the points, resampling the VisiTag data or projecting the points)
+            and is kept in :attr:`load_stats`. By default None (no measurements)
     """
 
     name : str #: The name of the study
     ablation_data : AblationSites #: Detailed information about the ablation sites and their readings over time
-    maps : List[CartoMap] #: All recorded maps associated with this study
+    maps : List[CartoMap] #: All recorded maps associated with this study. Loaded on first access when opened with lazy=True
     aux_meshes : List[CartoAuxMesh] #: Auxiliary meshes generated by the CARTO system, not associated with any specific map, e.g. CT segmentations from `CARTOSeg`_.
     aux_mesh_reg_mat : np.ndarray #: 4x4 affine registration matrix to map the auxiliary meshes.
+    load_stats : LoadStats = None #: Report of the loading stages, see :class:`cartoreader_lite.low_level.stats.LoadStats`. None if not requested
 
     
-    def _simplify(self, ll_study : CartoLLStudy, ablation_sites_kwargs : Dict, carto_map_kwargs : Dict):
+    def _simplify(self, ll_study : CartoLLStudy, ablation_sites_kwargs : Dict, carto_map_kwargs : Dict, lazy : bool = False, context : ExecutionContext = None,
+                  load_stats : LoadStats = None):
         """Function to simplify the data given by the lower level ll_study.
 
         Parameters
@@ -304,39 +930,118 @@ class CartoStudy():
             Optional keyword arguments to be passed to :class:`AblationSites`
         carto_map_kwargs : Dict
             Optional keyword arguments to be passed to :class:`CartoMap`
+        lazy : bool, optional
+            If true, the ablation data and maps will only be simplified on first access, by default False
+        context : ExecutionContext, optional
+            Execution context used to simplify the maps, by default a process pool.
+            The ablation data is resampled by a thread pool with the same number of workers, see :class:`cartoreader_lite.low_level.execution.local_context`
+        load_stats : LoadStats, optional
+            Report recording the stages of simplifying the ablation data and maps, by default None
         """
-        self.ablation_data = AblationSites(ll_study.visitag_data, **ablation_sites_kwargs)
-        self.maps = [CartoMap(m, **carto_map_kwargs) for m in ll_study.maps]
+        if lazy:
+            self.ablation_data = LazyObject(partial(CartoStudy._simplify_ablation_data, ll_study.visitag_data, ablation_sites_kwargs, deferred_context(context), load_stats))
+            map_names = ll_study.maps.names if isinstance(ll_study.maps, LazySequence) else [m.name for m in ll_study.maps]
+            self.maps = LazySequence([partial(CartoStudy._simplify_map, ll_study.maps, map_i, carto_map_kwargs, deferred_context(context), load_stats) for map_i in range(len(ll_study.maps))], map_names)
+        else:
+            self.ablation_data = CartoStudy._simplify_ablation_data(ll_study.visitag_data, ablation_sites_kwargs, context, load_stats)
+            self.maps = [CartoMap(m, context=context, load_stats=load_stats, **carto_map_kwargs) for m in ll_study.maps]
         self.name = ll_study.name
         self.aux_meshes = ll_study.aux_meshes
         self.aux_mesh_reg_mat = ll_study.aux_mesh_reg_mat
 
-    def __init__(self, arg1, arg2 = None, ablation_sites_kwargs=None, carto_map_kwargs=None) -> None:
+    @staticmethod
+    def _simplify_ablation_data(visitag_data : VisiTagData, ablation_sites_kwargs : Dict, context : Union[ExecutionContext, str] = None, load_stats : LoadStats = None) -> AblationSites:
+        #The sessions are resampled by threads within the worker budget of the study, see local_context
+        with local_context(context) as context:
+            return AblationSites(visitag_data, **{"context": context, "load_stats": load_stats, **ablation_sites_kwargs})
+
+    @staticmethod
+    def _simplify_map(ll_maps : List[CartoLLMap], map_i : int, carto_map_kwargs : Dict, context : Union[ExecutionContext, str] = None, load_stats : LoadStats = None) -> CartoMap:
+        with temporary_context(context) as context:
+            carto_map = CartoMap(ll_maps[map_i], context=context, load_stats=load_stats, **carto_map_kwargs)
+        if isinstance(ll_maps, LazySequence):
+            ll_maps.release(map_i) #Only keep the simplified map in memory
+        return carto_map
+
+    def __init__(self, arg1, arg2 = None, ablation_sites_kwargs=None, carto_map_kwargs=None, cache : Union[ParseCache, str, PathLike] = None,
+                 lazy : bool = False, load_point_details : bool = True, context : Union[ExecutionContext, str] = None, mmap : bool = False,
+                 load_stats : Union[LoadStats, Callable, bool] = None) -> None:
 
         if ablation_sites_kwargs is None:
             ablation_sites_kwargs = {}
         if carto_map_kwargs is None:
             carto_map_kwargs = {}
+        load_stats = convert_to_stats(load_stats)
 
         if issubclass(type(arg1), str) and os.path.isfile(arg1) and arg1.endswith(".pkl.gz") and arg2 is None:
-            loaded_study = CartoStudy.load_pickled_study(arg1)
+            with load_stage(load_stats, "load_pickle", study=arg1) as stage:
+                loaded_study = CartoStudy.load_pickled_study(arg1)
+                stage.update(bytes_read=os.path.getsize(arg1), items=1)
 
             #https://stackoverflow.com/questions/2709800/how-to-pickle-yourself
             self.__dict__.update(loaded_study.__dict__)
+        elif isinstance(arg1, (str, PathLike)) and arg2 is None and is_archive(arg1):
+            with load_stage(load_stats, "load_archive", study=os.fspath(arg1)) as stage:
+                study_archive = StudyArchive(arg1, mmap)
+                self.__dict__.update(study_archive.read_study(lazy).__dict__)
+                stage.update(items=1)
+            if not lazy:
+                study_archive.reader.storage.close()
         elif issubclass(type(arg1), CartoLLStudy) and arg2 is None:
             ll_study = arg1
-            self._simplify(ll_study, ablation_sites_kwargs, carto_map_kwargs)
+            with temporary_context(context) as context:
+                self._simplify(ll_study, ablation_sites_kwargs, carto_map_kwargs, lazy, context, load_stats)
 
         else:
-            ll_study = CartoLLStudy(arg1, arg2)
-            self._simplify(ll_study, ablation_sites_kwargs, carto_map_kwargs)
+            #The detailed points are created by the same workers that read them
+            point_converter = partial(CartoPointDetailData, remove_egm_header_numbers=carto_map_kwargs.get("remove_egm_header_numbers", True))
+            with temporary_context(context) as context:
+                ll_study = CartoLLStudy(arg1, arg2, cache=cache, lazy=lazy, load_point_details=load_point_details, context=context, point_converter=point_converter,
+                                        load_stats=load_stats)
+                self._simplify(ll_study, ablation_sites_kwargs, carto_map_kwargs, lazy, context, load_stats)
+            if not lazy:
+                convert_to_storage(ll_study.storage).close()
+
+        self.load_stats = load_stats
 
     @property
     def nr_maps(self):
         return len(self.maps)
 
-    def save(self, file : Union[IO, PathLike] = None):
-        """Backup the current study into a pickled and compressed file or buffer.
+    def memory_usage(self, deep : bool = False) -> pd.Series:
+        """Returns the memory held by the study in bytes, broken down by the components of each map (see :meth:`CartoMap.memory_usage`),
+        the ablation data (see :meth:`AblationSites.memory_usage`) and the auxiliary meshes (see :meth:`CartoAuxMesh.memory_usage`).
+        Parts that were not loaded yet (see `lazy`) are not loaded and not included. Memory shared between parts is only counted once.
+
+        Parameters
+        ----------
+        deep : bool, optional
+            If true, Python objects (e.g. strings and object columns) are counted as well, see :meth:`pandas.DataFrame.memory_usage`.
+            By default False
+
+        Returns
+        -------
+        pd.Series
+            Bytes held by each component, indexed by the part ("map", "ablation_data" or "aux_mesh"), its name and the component.
+            E.g. `usage.groupby(level=["part", "name"]).sum()` sums the bytes of each map and mesh.
+        """
+        seen, usage = {}, {}
+        for map_i in range(len(self.maps)):
+            if not isinstance(self.maps, LazySequence) or self.maps.is_loaded(map_i):
+                carto_map = self.maps[map_i]
+                usage.update({("map", carto_map.name, k): v for k, v in carto_map._memory_usage(deep, seen).items()})
+
+        if not isinstance(self.ablation_data, LazyObject) or self.ablation_data.is_loaded:
+            ablation_data = self.ablation_data.load() if isinstance(self.ablation_data, LazyObject) else self.ablation_data
+            usage.update({("ablation_data", "", k): v for k, v in ablation_data._memory_usage(deep, seen).items()})
+
+        for aux_mesh in self.aux_meshes:
+            usage.update({("aux_mesh", aux_mesh.name, k): v for k, v in aux_mesh._memory_usage(deep, seen).items()})
+
+        return pd.Series(list(usage.values()), index=pd.MultiIndex.from_tuples(list(usage.keys()), names=["part", "name", "component"]), dtype=np.int64)
+
+    def save(self, file : Union[IO, PathLike] = None, file_format : str = None, signal_chunk_size : int = None, compression : str = None, max_workers : int = None):
+        """Backup the current study into a file or buffer.
 
         Parameters
         ----------
@@ -344,18 +1049,54 @@ class CartoStudy():
             Target to write the study to. Can be on of the following:
             
                 * Name of the file which the study will be written to
-                * A file, or buffer handle to write to
+                * A file, or buffer handle to write to (only for the pickle format)
                 
-            Will default to the study name with the ending `.pkl.gz`
+            Will default to the study name with the ending `.pkl.gz` or `.crlstudy`, depending on the file format
+        file_format : str, optional
+            One of
+
+                * "pickle": Pickled and compressed file. Loading the study will always read the complete file.
+                * "archive": Single file holding separately readable array chunks. Single maps, meshes or signals can be read without the rest of the study, see :class:`StudyArchive`.
+                * "directory": Same as "archive", but each chunk is written to a separate file inside the given directory
+
+            By default "archive" for file names ending with `.crlstudy`, otherwise "pickle"
+        signal_chunk_size : int, optional
+            Number of points whose signals are stored together in a single chunk of an archive.
+            By default all points for uncompressed archives (which can be memory mapped, see :class:`StudyArchive`), otherwise 256
+        compression : str, optional
+            One of
+
+                * "blocks": Compresses independent blocks in parallel (see :mod:`cartoreader_lite.low_level.compression`). The resulting files remain valid gzip files.
+                * "gzip": Single gzip stream (only for the pickle format)
+                * "none": No compression (only for the archive formats)
+
+            By default "blocks" for the pickle format, otherwise "none"
+        max_workers : int, optional
+            Number of threads used for the block compression, by default all available CPUs
         """
+        if file_format is None:
+            file_format = "archive" if isinstance(file, (str, PathLike)) and os.fspath(file).endswith(archive_suffix) else "pickle"
+        assert file_format in ["pickle", "archive", "directory"], f"Unknown file format {file_format}"
+        if compression is None:
+            compression = "blocks" if file_format == "pickle" else "none"
         if file is None:
-            file = self.name + ".pkl.gz"
+            file = self.name + (".pkl.gz" if file_format == "pickle" else archive_suffix)
 
+        if file_format != "pickle":
+            assert isinstance(file, (str, PathLike)), "Archives can only be written to a path"
+            StudyArchive.write(self, file, "zip" if file_format == "archive" else "directory", signal_chunk_size, compression, max_workers)
+            return
+
+        assert compression in ["blocks", "gzip"], f"Unknown compression {compression} for the pickle format"
         assert not issubclass(type(file), str) or file.endswith("pkl.gz"), "Only allowed file type is currently pkl.gz"
         file, is_fname = convert_fname_to_handle(file, "wb")
 
-        with gzip.GzipFile(fileobj=file, mode="wb", compresslevel=2) as g_h:
-            pickle.dump(self, g_h)
+        if compression == "blocks":
+            with ExecutionContext("thread", max_workers) as context, io.BufferedWriter(BlockGzipWriter(file, context=context)) as g_h:
+                pickle.dump(self, g_h)
+        else:
+            with gzip.GzipFile(fileobj=file, mode="wb", compresslevel=2) as g_h:
+                pickle.dump(self, g_h)
             
         if is_fname:
             file.close()
@@ -367,7 +1108,8 @@ class CartoStudy():
         Parameters
         ----------
         file : Union[IO, PathLike]
-            [description]
+            [description]. Block compressed files (see :meth:`CartoStudy.save`) are decompressed in parallel,
+            other gzip files are read as a single stream.
 
         Returns
         -------
@@ -376,8 +1118,12 @@ class CartoStudy():
         """
         assert not issubclass(type(file), str) or file.endswith("pkl.gz"), "Only allowed file type is currently pkl.gz"
         file, is_fname = convert_fname_to_handle(file, "rb")
-        with gzip.GzipFile(fileobj=file, mode="rb") as f:
-            data = pickle.load(f)       
+        if file.seekable() and is_block_compressed(file):
+            with io.BufferedReader(BlockGzipReader(file)) as f:
+                data = pickle.load(f)
+        else:
+            with gzip.GzipFile(fileobj=file, mode="rb") as f:
+                data = pickle.load(f)       
 
         if is_fname:
             file.close()
@@ -387,3 +1133,266 @@ class CartoStudy():
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(name={self.name}, nr_maps={self.nr_maps}, maps={self.maps}, aux_meshes={self.aux_meshes})"
+
+class StudyArchive():
+    """Study saved in the archive format (see :meth:`CartoStudy.save`), consisting of a JSON manifest and separately readable array chunks
+    (see :mod:`cartoreader_lite.low_level.archive`).
+    Opening the archive only reads the manifest. The mesh, points table or signals of single maps are read on request, without reading the rest of the study.
+
+    Parameters
+    ----------
+    path : Union[str, PathLike]
+        Path to the archive file or directory
+    mmap : bool, optional
+        If true, the arrays of uncompressed archives (e.g. the mesh points and the signals of all points) are memory mapped instead of being read.
+        Opening a study then only reads the pages that are actually accessed, and multiple processes opening the same archive share the page cache. By default False
+    """
+
+    name : str #: The name of the study
+    map_names : List[str] #: Names of all maps of the study
+    reader : ArchiveReader #: Reader of the archive chunks
+
+    def __init__(self, path : Union[str, PathLike], mmap : bool = False) -> None:
+        self.reader = ArchiveReader(path, mmap)
+        self._study = self.reader.manifest["study"]
+        self.name = self._study["name"]
+        self.map_names = [map_entry["name"] for map_entry in self._study["maps"]]
+
+    @property
+    def nr_maps(self):
+        return len(self.map_names)
+
+    def _map_entry(self, map_key : Union[int, str]) -> Dict:
+        if isinstance(map_key, str):
+            if map_key not in self.map_names:
+                raise KeyError(f"No map named {map_key}, available are {self.map_names}")
+            map_key = self.map_names.index(map_key)
+
+        return self._study["maps"][map_key]
+
+    def read_mesh(self, map_key : Union[int, str]) -> pv.UnstructuredGrid:
+        """Reads the mesh of a map, given by its index or name
+        """
+        return self.reader.read_mesh(self._map_entry(map_key)["mesh"])
+
+    def read_points(self, map_key : Union[int, str], columns : List[str] = None) -> pd.DataFrame:
+        """Reads the points table of a map (see :attr:`CartoMap.points`) without the `detail` column
+
+        Parameters
+        ----------
+        map_key : Union[int, str]
+            Index or name of the map
+        columns : List[str], optional
+            Columns to read, by default all
+
+        Returns
+        -------
+        pd.DataFrame
+            The points table
+        """
+        points_entry = self._map_entry(map_key)["points"]
+        return pd.DataFrame() if points_entry is None else self.reader.read_frame(points_entry, columns)
+
+    def read_signals(self, map_key : Union[int, str], point_inds : Union[np.ndarray, List[int], slice] = None) -> SignalStore:
+        """Reads the :term:`ECGs<ECG>` and :term:`EGMs<EGM>` of the selected points of a map. Only the chunks holding these points will be read,
+        and only the selected points of uncompressed chunks.
+
+        Parameters
+        ----------
+        map_key : Union[int, str]
+            Index or name of the map
+        point_inds : Union[np.ndarray, List[int], slice], optional
+            Indices (or boolean mask) of the points in the points table, by default all points
+
+        Returns
+        -------
+        SignalStore
+            Store holding the signals of the selected points in the given order
+        """
+        signals_entry = self._map_entry(map_key).get("signals")
+        assert signals_entry is not None, "The map has no point signals"
+        nr_points, chunk_size = signals_entry["shape"][0], signals_entry["chunk_size"]
+        if point_inds is None and len(signals_entry["values"]) == 1:
+            values = self.reader.read_array(signals_entry["values"][0]) #Memory mapped if requested
+        else:
+            point_inds = np.arange(nr_points)[slice(None) if point_inds is None else point_inds]
+            values = np.empty([len(point_inds)] + signals_entry["shape"][1:], dtype=np.int16)
+            chunk_inds = point_inds // chunk_size
+            for chunk_i in np.unique(chunk_inds):
+                chunk_mask = chunk_inds == chunk_i
+                values[chunk_mask] = self.reader.read_array(signals_entry["values"][chunk_i], mmap=True)[point_inds[chunk_mask] - chunk_i * chunk_size]
+
+        point_channels = self.reader.read_array(signals_entry["point_channels"], mmap=False)
+        nr_samples = self.reader.read_array(signals_entry["nr_samples"], mmap=False)
+        if point_inds is not None:
+            point_channels, nr_samples = point_channels[point_inds], nr_samples[point_inds]
+        return SignalStore.from_arrays(values, signals_entry["channel_names"], point_channels, nr_samples)
+
+    def read_map(self, map_key : Union[int, str]) -> CartoMap:
+        """Reads a complete map, given by its index or name
+        """
+        map_entry = self._map_entry(map_key)
+        carto_map = CartoMap.__new__(CartoMap)
+        carto_map.name = map_entry["name"]
+        carto_map.mesh = self.read_mesh(map_key)
+        carto_map.mesh_affine = self.reader.read_array(map_entry["mesh_affine"])
+        if map_entry["points"] is None:
+            carto_map.points = carto_map._points_raw = []
+            return carto_map
+
+        points = self.read_points(map_key)
+        carto_map._points_raw = np.empty(len(points), dtype=object)
+        if "signals" in map_entry:
+            carto_map.signals = signals = self.read_signals(map_key)
+            main_attrs = CartoPointDetailData._attrs_from_table(points)
+            for point_i, detail in enumerate(self.reader.read_object(map_entry["details"])):
+                point = CartoPointDetailData.__new__(CartoPointDetailData)
+                point.__setstate__({**{k: v[point_i] for k, v in main_attrs.items()}, **detail, "_signals": (signals, point_i)})
+                carto_map._points_raw[point_i] = point
+
+        if map_entry["detail_column"] is not None:
+            points.insert(map_entry["detail_column"], "detail", carto_map._points_raw)
+        carto_map.points = CartoMap._convert_legacy_points(points)
+        return carto_map
+
+    def read_ablation_data(self) -> AblationSites:
+        """Reads the ablation data of the study
+        """
+        ablation_entry = self._study["ablation_data"]
+        if "object" in ablation_entry:
+            return self.reader.read_object(ablation_entry["object"])
+
+        ablation_data = AblationSites.__new__(AblationSites)
+        ablation_data.session_avg_data = self.reader.read_frame(ablation_entry["session_avg_data"])
+        for k in ["session_time_data", "session_rf_data", "session_force_data"]:
+            if ablation_entry[k] is not None:
+                frame = self.reader.read_frame(ablation_entry[k]["frame"])
+                session_ids = self.reader.read_array(ablation_entry[k]["session_ids"])
+                offsets = np.cumsum([0] + ablation_entry[k]["lengths"])
+                setattr(ablation_data, k, [(session_id, frame.iloc[start:end]) for session_id, start, end in zip(session_ids, offsets[:-1], offsets[1:])])
+
+        return ablation_data
+
+    def read_aux_mesh(self, mesh_i : int) -> CartoAuxMesh:
+        """Reads the auxiliary mesh with the given index
+        """
+        mesh_entry = self._study["aux_meshes"][mesh_i]
+        aux_mesh = CartoAuxMesh.__new__(CartoAuxMesh)
+        aux_mesh.__dict__.update(self.reader.read_object(mesh_entry["attributes"]))
+        aux_mesh.mesh_data = self.reader.read_mesh(mesh_entry["mesh"])
+        return aux_mesh
+
+    def read_study(self, lazy : bool = False) -> CartoStudy:
+        """Reads the complete study
+
+        Parameters
+        ----------
+        lazy : bool, optional
+            If true, the maps, auxiliary meshes and ablation data will be read on first access, see :class:`cartoreader_lite.low_level.lazy.LazySequence`.
+            By default False
+
+        Returns
+        -------
+        CartoStudy
+            The study
+        """
+        study = CartoStudy.__new__(CartoStudy)
+        study.name = self.name
+        reg_mat_entry = self._study["aux_mesh_reg_mat"]
+        study.aux_mesh_reg_mat = None if reg_mat_entry is None else self.reader.read_array(reg_mat_entry)
+        aux_mesh_names = [mesh_entry["name"] for mesh_entry in self._study["aux_meshes"]]
+        if lazy:
+            study.maps = LazySequence([partial(self.read_map, map_i) for map_i in range(self.nr_maps)], self.map_names)
+            study.aux_meshes = LazySequence([partial(self.read_aux_mesh, mesh_i) for mesh_i in range(len(aux_mesh_names))], aux_mesh_names)
+            study.ablation_data = LazyObject(self.read_ablation_data)
+        else:
+            study.maps = [self.read_map(map_i) for map_i in range(self.nr_maps)]
+            study.aux_meshes = [self.read_aux_mesh(mesh_i) for mesh_i in range(len(aux_mesh_names))]
+            study.ablation_data = self.read_ablation_data()
+
+        return study
+
+    @staticmethod
+    def _write_map(writer : ArchiveWriter, prefix : str, carto_map : CartoMap, signal_chunk_size : int = None) -> Dict:
+        map_entry = {"name": carto_map.name, "mesh": writer.write_mesh(f"{prefix}/mesh", carto_map.mesh),
+                     "mesh_affine": writer.write_array(f"{prefix}/mesh_affine", carto_map.mesh_affine), "points": None}
+        if not isinstance(carto_map.points, pd.DataFrame):
+            return map_entry
+
+        has_detail = "detail" in carto_map.points
+        map_entry["points"] = writer.write_frame(f"{prefix}/points", carto_map.points.drop(columns="detail") if has_detail else carto_map.points)
+        map_entry["detail_column"] = int(carto_map.points.columns.get_loc("detail")) if has_detail else None
+        points_raw = carto_map._points_raw
+        if len(points_raw) > 0:
+            #Signals are stored separately, all other detailed data of the points is pickled
+            detail_attrs = [k for k in CartoPointDetailHandle._detail_attrs if k not in ["surface_ecg", "egm"]]
+            map_entry["details"] = writer.write_object(f"{prefix}/details", [{k: getattr(point, k) for k in detail_attrs if hasattr(point, k)} for point in points_raw])
+
+            signals = carto_map.signals if carto_map.signals is not None else SignalStore(points_raw)
+            if signal_chunk_size is None:
+                signal_chunk_size = max(len(signals), 1) if writer.compression == "none" else 256
+            map_entry["signals"] = {"channel_names": signals.channel_names.tolist(), "shape": list(signals.values.shape), "chunk_size": signal_chunk_size,
+                                    "point_channels": writer.write_array(f"{prefix}/signals/point_channels", signals.point_channels),
+                                    "nr_samples": writer.write_array(f"{prefix}/signals/nr_samples", signals.nr_samples),
+                                    "values": [writer.write_array(f"{prefix}/signals/values/{chunk_i}", signals.values[start:start + signal_chunk_size])
+                                                    for chunk_i, start in enumerate(range(0, len(signals), signal_chunk_size))]}
+
+        return map_entry
+
+    @staticmethod
+    def _write_ablation_data(writer : ArchiveWriter, prefix : str, ablation_data : AblationSites) -> Dict:
+        if isinstance(ablation_data, LazyObject):
+            ablation_data = ablation_data.load()
+        if not isinstance(ablation_data, AblationSites):
+            return {"object": writer.write_object(prefix, ablation_data)}
+
+        ablation_entry = {"session_avg_data": writer.write_frame(f"{prefix}/session_avg_data", ablation_data.session_avg_data)}
+        for k in ["session_time_data", "session_rf_data", "session_force_data"]:
+            sessions = getattr(ablation_data, k)
+            if sessions is None or len(sessions) == 0:
+                ablation_entry[k] = None if sessions is None else {"frame": writer.write_frame(f"{prefix}/{k}", pd.DataFrame()), 
+                                                                    "session_ids": writer.write_array(f"{prefix}/{k}_ids", np.zeros(0)), "lengths": []}
+                continue
+
+            #All sessions are stored in a single frame
+            ablation_entry[k] = {"frame": writer.write_frame(f"{prefix}/{k}", pd.concat([session_data for _, session_data in sessions])),
+                                 "session_ids": writer.write_array(f"{prefix}/{k}_ids", np.array([session_id for session_id, _ in sessions])),
+                                 "lengths": [len(session_data) for _, session_data in sessions]}
+
+        return ablation_entry
+
+    @staticmethod
+    def write(study : CartoStudy, path : Union[str, PathLike], container : str = "zip", signal_chunk_size : int = None, compression : str = "none", max_workers : int = None):
+        """Writes the study as archive. Usually called through :meth:`CartoStudy.save`.
+
+        Parameters
+        ----------
+        study : CartoStudy
+            The study to write
+        path : Union[str, PathLike]
+            Path of the archive file or directory
+        container : str, optional
+            Either "zip" for a single file or "directory", see :class:`cartoreader_lite.low_level.archive.ArchiveWriter`. By default "zip"
+        signal_chunk_size : int, optional
+            Number of points whose signals are stored together in a single chunk, by default all points for uncompressed archives, otherwise 256
+        compression : str, optional
+            Compression of the chunks, either "none" or "blocks", by default "none"
+        max_workers : int, optional
+            Number of threads used for the block compression, by default all available CPUs
+        """
+        assert signal_chunk_size is None or signal_chunk_size > 0, "Chunks need to hold at least one point"
+        with ArchiveWriter(path, container, compression, max_workers) as writer:
+            maps = [StudyArchive._write_map(writer, f"maps/{map_i}", study.maps[map_i], signal_chunk_size) for map_i in range(study.nr_maps)]
+            aux_meshes = []
+            for mesh_i, aux_mesh in enumerate(study.aux_meshes):
+                mesh = aux_mesh.mesh_data #Loads lazy meshes
+                aux_meshes.append({"name": aux_mesh.name, "mesh": writer.write_mesh(f"aux_meshes/{mesh_i}/mesh", mesh),
+                                   "attributes": writer.write_object(f"aux_meshes/{mesh_i}/attributes", 
+                                                                        {k: v for k, v in aux_mesh.__dict__.items() if k not in ["mesh_data", "_cache", "_projection_index"]})})
+
+            writer.close({"study": {"name": study.name, "maps": maps, "aux_meshes": aux_meshes,
+                                    "ablation_data": StudyArchive._write_ablation_data(writer, "ablation_data", study.ablation_data),
+                                    "aux_mesh_reg_mat": None if study.aux_mesh_reg_mat is None else writer.write_array("aux_mesh_reg_mat", study.aux_mesh_reg_mat)}})
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(name={self.name}, maps={self.map_names}, path={self.reader.path})"
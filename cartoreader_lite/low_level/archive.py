@@ -0,0 +1,400 @@
+"""Chunked, columnar container to store studies on disk.
+An archive is either a directory or a single zip file, holding a JSON manifest and typed array chunks in the numpy .npy format.
+Each chunk can be read separately, so that parts of a study (e.g. the mesh of a single map) can be loaded without reading the rest of the archive.
+Objects that can not be represented as typed arrays (e.g. lists of strings) are stored as separate pickled chunks.
+Chunks can optionally be block compressed (see :mod:`cartoreader_lite.low_level.compression`), while the manifest is always stored uncompressed.
+"""
+
+import io
+import json
+import os
+import pickle
+import zipfile
+from typing import IO, Any, Callable, Dict, List, Optional, Union
+from os import PathLike
+import numpy as np
+import pandas as pd
+import pyvista as pv
+from .storage import ZipStorage, local_storage
+from .compression import BlockGzipReader, BlockGzipWriter
+from .execution import ExecutionContext
+
+archive_format = "cartoreader_lite.archive"
+archive_version = 1
+archive_suffix = ".crlstudy"
+manifest_name = "manifest.json"
+
+def is_archive(path : Union[str, PathLike]) -> bool:
+    """Checks if the given path is an archive directory or file, written by :class:`ArchiveWriter`
+    """
+    try:
+        return ArchiveReader(path).manifest.get("format") == archive_format
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return False
+
+class ArchiveWriter:
+    """Writes the chunks of an archive. The manifest is written last by :meth:`close`, so incomplete archives can not be opened.
+
+    Parameters
+    ----------
+    path : Union[str, PathLike]
+        Path of the archive directory or file
+    container : str, optional
+        Either "zip" to write a single uncompressed zip file, or "directory" to write each chunk into a separate file.
+        By default "zip"
+    compression : str, optional
+        Either "none" or "blocks" to compress each chunk in parallel blocks, see :class:`cartoreader_lite.low_level.compression.BlockGzipWriter`.
+        By default "none"
+    max_workers : int, optional
+        Number of threads used for the block compression, by default all available CPUs
+    """
+
+    path : str #: Path of the archive
+    container : str #: Type of the container, "zip" or "directory"
+    compression : str #: Compression of the chunks, "none" or "blocks"
+
+    containers = ["zip", "directory"]
+    compressions = ["none", "blocks"]
+
+    def __init__(self, path : Union[str, PathLike], container : str = "zip", compression : str = "none", max_workers : int = None) -> None:
+        assert container in ArchiveWriter.containers, f"Unknown container {container}, available are {ArchiveWriter.containers}"
+        assert compression in ArchiveWriter.compressions, f"Unknown compression {compression}, available are {ArchiveWriter.compressions}"
+        self.path = os.fspath(path)
+        self.container = container
+        self.compression = compression
+        self._context = ExecutionContext("thread", max_workers) if compression == "blocks" else None
+        if container == "zip":
+            self._zip_file = zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+        else:
+            assert not os.path.exists(os.path.join(self.path, manifest_name)), f"Archive {self.path} already exists"
+            os.makedirs(self.path, exist_ok=True)
+            self._zip_file = None
+
+    def _open(self, chunk : str):
+        if self._zip_file is not None:
+            return self._zip_file.open(chunk, "w", force_zip64=True)
+
+        fname = os.path.join(self.path, *chunk.split("/"))
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        return open(fname, "wb")
+
+    def _write_chunk(self, chunk : str, write_f : Callable[[IO], None]) -> Dict:
+        with self._open(chunk) as f:
+            if self.compression == "blocks":
+                with BlockGzipWriter(f, context=self._context) as block_f:
+                    write_f(block_f)
+            else:
+                write_f(f)
+
+        return {"chunk": chunk} if self.compression == "none" else {"chunk": chunk, "compression": self.compression}
+
+    def write_array(self, name : str, array : np.ndarray) -> Dict:
+        """Writes a typed array chunk. Arrays with object dtype will be pickled instead.
+
+        Parameters
+        ----------
+        name : str
+            Name of the chunk inside the archive, using "/" as separator
+        array : np.ndarray
+            The array to write
+
+        Returns
+        -------
+        Dict
+            The manifest entry of the chunk
+        """
+        array = np.asarray(array)
+        if array.dtype.hasobject:
+            return self.write_object(name, array)
+
+        entry = self._write_chunk(name + ".npy", lambda f: np.lib.format.write_array(f, array, allow_pickle=False))
+        return {**entry, "dtype": array.dtype.str, "shape": list(array.shape)}
+
+    def write_object(self, name : str, obj : Any) -> Dict:
+        """Writes a pickled chunk of an arbitrary object
+        """
+        return self._write_chunk(name + ".pkl", lambda f: pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def write_frame(self, name : str, df : pd.DataFrame) -> Dict:
+        """Writes a DataFrame column by column. Numeric columns and columns holding vectors of equal length (e.g. positions) are stored as typed arrays,
+        all other columns are pickled.
+
+        Parameters
+        ----------
+        name : str
+            Name prefix of the column chunks
+        df : pd.DataFrame
+            The DataFrame to write
+
+        Returns
+        -------
+        Dict
+            The manifest entry of the DataFrame
+        """
+        if not all(isinstance(col_name, str) for col_name in df.columns) or not df.columns.is_unique:
+            return {"frame": self.write_object(name, df)}
+
+        columns = []
+        for col_i, (col_name, col) in enumerate(df.items()):
+            kind, values = encode_column(col)
+            entry = self.write_object(f"{name}/{col_i}", values) if kind == "pickle" else self.write_array(f"{name}/{col_i}", values)
+            columns.append({"name": col_name, "kind": kind, **entry})
+
+        if isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1 and df.index.name is None:
+            index = None
+        else:
+            index = self.write_object(f"{name}/index", df.index)
+
+        return {"columns": columns, "index": index, "nr_rows": len(df)}
+
+    def write_mesh(self, name : str, mesh : Union[pv.UnstructuredGrid, pv.PolyData]) -> Dict:
+        """Writes the points, cells and data arrays of a mesh as separate chunks. Other mesh types will be pickled.
+
+        Parameters
+        ----------
+        name : str
+            Name prefix of the mesh chunks
+        mesh : Union[pv.UnstructuredGrid, pv.PolyData]
+            The mesh to write
+
+        Returns
+        -------
+        Dict
+            The manifest entry of the mesh
+        """
+        if isinstance(mesh, pv.UnstructuredGrid):
+            entry = {"type": "UnstructuredGrid", "cells": self.write_array(f"{name}/cells", mesh.cells), "celltypes": self.write_array(f"{name}/celltypes", mesh.celltypes)}
+        elif isinstance(mesh, pv.PolyData):
+            entry = {"type": "PolyData", **{cell_type: self.write_array(f"{name}/{cell_type}", getattr(mesh, cell_type))
+                                                for cell_type in ["verts", "lines", "faces", "strips"] if getattr(mesh, f"n_{cell_type}") > 0}}
+        else:
+            return {"type": "pickle", **self.write_object(name, mesh)}
+
+        entry["points"] = self.write_array(f"{name}/points", mesh.points)
+        for data_name, data in [("point_data", mesh.point_data), ("cell_data", mesh.cell_data), ("field_data", mesh.field_data)]:
+            entry[data_name] = [{"name": k, **self.write_array(f"{name}/{data_name}/{k_i}", data[k])} for k_i, k in enumerate(data.keys())]
+
+        return entry
+
+    def close(self, manifest : Dict):
+        """Writes the manifest and closes the archive
+
+        Parameters
+        ----------
+        manifest : Dict
+            JSON serializable description of the archive content, referencing the chunk entries
+        """
+        manifest = {"format": archive_format, "version": archive_version, **manifest}
+        with self._open(manifest_name) as f:
+            f.write(json.dumps(manifest).encode())
+
+        if self._zip_file is not None:
+            self._zip_file.close()
+        if self._context is not None:
+            self._context.shutdown()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is not None: #Leave no valid archive behind
+            if self._zip_file is not None:
+                self._zip_file.close()
+            if self._context is not None:
+                self._context.shutdown()
+
+def encode_column(col : pd.Series) -> tuple:
+    """Encodes a DataFrame column for the archive
+
+    Parameters
+    ----------
+    col : pd.Series
+        The column to encode
+
+    Returns
+    -------
+    tuple
+        The kind of the encoding and the encoded values. The kind is one of
+
+            * array: Numeric column, stored as typed array
+            * stacked: Column of numpy vectors with equal shape, stored as a single typed array
+            * stacked_list: Same as stacked, but the vectors are python lists
+            * pickle: Any other column, stored as pickled list
+    """
+    if isinstance(col.dtype, np.dtype) and not col.dtype.hasobject:
+        return "array", col.to_numpy()
+
+    values = col.to_list()
+    if len(values) > 0:
+        for kind, element_type in [("stacked", np.ndarray), ("stacked_list", list)]:
+            if all(type(v) is element_type for v in values):
+                try:
+                    stacked = np.array(values)
+                except ValueError: #Vectors of different lengths
+                    break
+
+                if stacked.ndim > 1 and (np.issubdtype(stacked.dtype, np.number) or stacked.dtype == np.bool_):
+                    return kind, stacked
+
+    return "pickle", values
+
+def decode_column(kind : str, values) -> Union[np.ndarray, list]:
+    """Inverse of :func:`encode_column`
+    """
+    if kind == "stacked":
+        return list(values)
+    elif kind == "stacked_list":
+        return values.tolist()
+
+    return values
+
+class ArchiveReader:
+    """Reads the chunks of an archive written by :class:`ArchiveWriter`.
+    Chunks are only read when requested, so opening an archive only reads its manifest.
+
+    Parameters
+    ----------
+    path : Union[str, PathLike]
+        Path of the archive directory or file
+    mmap : bool, optional
+        If true, uncompressed array chunks are memory mapped instead of being read into memory,
+        so only the pages that are actually accessed will be read from disk. The mapping is copy-on-write, i.e. modifications of the arrays are never written back to the archive.
+        By default False
+    """
+
+    path : str #: Path of the archive
+    manifest : Dict #: The manifest of the archive, describing its content
+    mmap : bool #: Memory map uncompressed array chunks
+
+    def __init__(self, path : Union[str, PathLike], mmap : bool = False) -> None:
+        self.path = os.fspath(path)
+        self.mmap = mmap
+        if os.path.isdir(self.path):
+            self.storage, self._prefix = local_storage, self.path
+        else:
+            self.storage, self._prefix = ZipStorage(self.path), ""
+
+        with self.storage.open(self._chunk_fname(manifest_name), "rb") as f:
+            self.manifest = json.loads(f.read())
+        self._context = ExecutionContext("thread") #Only starts threads when reading compressed chunks
+
+        if self.manifest.get("format") != archive_format:
+            raise ValueError(f"{self.path} is not an archive")
+        if self.manifest.get("version", 0) > archive_version:
+            raise ValueError(f"Archive version {self.manifest['version']} of {self.path} is not supported")
+
+    def _chunk_fname(self, chunk : str) -> str:
+        return os.path.join(self._prefix, *chunk.split("/")) if len(self._prefix) > 0 else chunk
+
+    def _read_chunk(self, entry : Dict, read_f : Callable[[IO], Any]) -> Any:
+        with self.storage.open(self._chunk_fname(entry["chunk"]), "rb") as f:
+            if entry.get("compression", "none") == "blocks":
+                with io.BufferedReader(BlockGzipReader(f, self._context)) as block_f:
+                    return read_f(block_f)
+
+            return read_f(f)
+
+    def _map_array(self, entry : Dict) -> Optional[np.memmap]:
+        if entry.get("compression", "none") != "none" or np.prod(entry["shape"]) == 0:
+            return None
+        location = self.storage.raw_location(self._chunk_fname(entry["chunk"]))
+        if location is None:
+            return None
+
+        fname, offset = location
+        header_readers = {(1, 0): np.lib.format.read_array_header_1_0, (2, 0): np.lib.format.read_array_header_2_0}
+        with open(fname, "rb") as f:
+            f.seek(offset)
+            version = np.lib.format.read_magic(f)
+            if version not in header_readers:
+                return None
+            shape, fortran_order, dtype = header_readers[version](f)
+            header_size = f.tell() - offset
+
+        return np.memmap(fname, dtype=dtype, mode="c", offset=offset + header_size, shape=shape, order="F" if fortran_order else "C")
+
+    def read_array(self, entry : Dict, mmap : bool = None) -> np.ndarray:
+        """Reads an array chunk written by :meth:`ArchiveWriter.write_array`
+
+        Parameters
+        ----------
+        entry : Dict
+            The manifest entry of the array
+        mmap : bool, optional
+            Memory map the chunk if it is stored uncompressed, by default :attr:`mmap`
+
+        Returns
+        -------
+        np.ndarray
+            The array, or a copy-on-write :class:`numpy.memmap` if mapped
+        """
+        if entry["chunk"].endswith(".pkl"):
+            return self.read_object(entry)
+
+        if self.mmap if mmap is None else mmap:
+            array = self._map_array(entry)
+            if array is not None:
+                return array
+
+        return self._read_chunk(entry, lambda f: np.lib.format.read_array(f, allow_pickle=False))
+
+    def read_object(self, entry : Dict) -> Any:
+        """Reads a pickled chunk written by :meth:`ArchiveWriter.write_object`
+        """
+        return self._read_chunk(entry, pickle.load)
+
+    def read_frame(self, entry : Dict, columns : List[str] = None) -> pd.DataFrame:
+        """Reads a DataFrame written by :meth:`ArchiveWriter.write_frame`
+
+        Parameters
+        ----------
+        entry : Dict
+            The manifest entry of the DataFrame
+        columns : List[str], optional
+            Columns to read. Only the chunks of these columns will be read. By default all columns
+
+        Returns
+        -------
+        pd.DataFrame
+            The DataFrame
+        """
+        if "frame" in entry:
+            df = self.read_object(entry["frame"])
+            return df if columns is None else df[columns]
+
+        col_entries = {col["name"]: col for col in entry["columns"]}
+        if columns is None:
+            columns = list(col_entries.keys())
+
+        data = {}
+        for col_name in columns:
+            col = col_entries[col_name]
+            data[col_name] = decode_column(col["kind"], self.read_object(col) if col["kind"] == "pickle" else self.read_array(col))
+
+        index = pd.RangeIndex(entry["nr_rows"]) if entry["index"] is None else self.read_object(entry["index"])
+        return pd.DataFrame(data, index=index, columns=columns)
+
+    def read_mesh(self, entry : Dict) -> Union[pv.UnstructuredGrid, pv.PolyData]:
+        """Reads a mesh written by :meth:`ArchiveWriter.write_mesh`
+        """
+        if entry["type"] == "pickle":
+            return self.read_object(entry)
+
+        points = self.read_array(entry["points"])
+        if entry["type"] == "UnstructuredGrid":
+            mesh = pv.UnstructuredGrid(self.read_array(entry["cells"]), self.read_array(entry["celltypes"]), points)
+        else:
+            mesh = pv.PolyData()
+            mesh.points = points
+            for cell_type in ["verts", "lines", "faces", "strips"]:
+                if cell_type in entry:
+                    setattr(mesh, cell_type, self.read_array(entry[cell_type]))
+
+        for data_name in ["point_data", "cell_data", "field_data"]:
+            for data_entry in entry[data_name]:
+                getattr(mesh, data_name)[data_entry["name"]] = self.read_array(data_entry)
+
+        return mesh
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.path})"
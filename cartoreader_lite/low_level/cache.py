@@ -0,0 +1,323 @@
+"""Persistent on-disk cache for the parsed CARTO3 files.
+Each parsed file is stored in a separate cache entry, so that re-importing a study only parses the files that were added or changed since the last import.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+from typing import Any, Callable, Iterable, List, Tuple, Union
+from os import PathLike
+from .storage import DirectoryStorage, convert_to_storage
+
+cache_magic = b"CRLCACHE"
+cache_version = 2
+cache_entry_suffix = ".cache"
+cache_header_struct = struct.Struct("<8sIQ") #Magic, version, length of the JSON header
+cache_buffer_alignment = 64
+
+def file_fingerprint(fname : str, storage : DirectoryStorage = None) -> List:
+    """Creates the fingerprint of a file used to validate cache entries
+
+    Parameters
+    ----------
+    fname : str
+        The file to fingerprint
+    storage : DirectoryStorage, optional
+        Storage containing the file, by default the local file system
+
+    Returns
+    -------
+    List
+        The list [identifier, size, modification time in ns, content hash, file name]
+    """
+    storage = convert_to_storage(storage)
+    size, mtime_ns = storage.stat(fname)
+    return [storage.identifier(fname), size, mtime_ns, storage.content_hash(fname), fname]
+
+class ParseCache:
+    """Persistent cache of parsed files, stored in a directory.
+
+    Every entry is identified by the parsing function, its arguments and the path of the parsed file.
+    Files can be read either from the local file system, or from a storage (see :mod:`cartoreader_lite.low_level.storage`), e.g. to cache the members of a zip archive.
+    The entry stays valid as long as the size, modification time and content of all files it was parsed from remain unchanged.
+    If only the modification time changes (e.g. after copying the study), the content hash is used to decide if the entry is still valid.
+
+    Entries are stored as pickles with out-of-band buffers, so that numpy arrays (and pandas DataFrames) will be memory-mapped from the cache when loading.
+    When the size of the cache exceeds `max_size`, the least recently used entries will be evicted by :meth:`evict`.
+
+    Parameters
+    ----------
+    cache_dir : Union[str, PathLike]
+        Directory in which the cache entries will be stored. Will be created if it does not exist.
+    max_size : int, optional
+        Size budget of the cache in bytes, by default 10GB
+    """
+
+    cache_dir : str #: Directory of the cache entries
+    max_size : int #: Size budget of the cache in bytes
+
+    def __init__(self, cache_dir : Union[str, PathLike], max_size : int = 10 * 2**30) -> None:
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_fname(self, fname : str, storage : DirectoryStorage, parse_f : Callable, args : Tuple, kwargs : dict) -> str:
+        key = f"{parse_f.__module__}.{parse_f.__qualname__}:{storage.identifier(fname)}:{args!r}:{sorted(kwargs.items())!r}"
+        return os.path.join(self.cache_dir, hashlib.blake2b(key.encode(), digest_size=20).hexdigest() + cache_entry_suffix)
+
+    @staticmethod
+    def _read_header(f) -> dict:
+        magic, version, header_len = cache_header_struct.unpack(f.read(cache_header_struct.size))
+        if magic != cache_magic or version != cache_version:
+            raise ValueError("Not a valid cache entry")
+        return json.loads(f.read(header_len))
+
+    @staticmethod
+    def _is_valid(header : dict, storage : DirectoryStorage) -> bool:
+        for _, size, mtime_ns, content_hash, fname in header["files"]:
+            try:
+                current_size, current_mtime_ns = storage.stat(fname)
+                if current_size != size or (current_mtime_ns != mtime_ns and storage.content_hash(fname) != content_hash):
+                    return False
+            except OSError:
+                return False
+
+        return True
+
+    def get(self, fname : str, parse_f : Callable, *args, storage : DirectoryStorage = None, **kwargs) -> Tuple[bool, Any]:
+        """Looks up the cached result of `parse_f(*args, **kwargs)` for the given file.
+
+        Parameters
+        ----------
+        fname : str
+            The file that was parsed
+        parse_f : Callable
+            The function used for parsing
+        storage : DirectoryStorage, optional
+            Storage containing the file. If given, it is also passed to `parse_f` as keyword argument.
+            By default the local file system
+
+        Returns
+        -------
+        Tuple[bool, Any]
+            A tuple (found, result). If no valid entry was found, the result is None.
+        """
+        if storage is not None:
+            kwargs["storage"] = storage
+        storage = convert_to_storage(storage)
+        entry_fname = self._entry_fname(fname, storage, parse_f, args, kwargs)
+        try:
+            with open(entry_fname, "rb") as f:
+                header = self._read_header(f)
+                if not self._is_valid(header, storage):
+                    return False, None
+
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY) #Copy-on-write, the entry itself will never be modified
+        except (OSError, ValueError):
+            return False, None
+
+        data_view = memoryview(data)
+        payload_start, payload_len = header["payload"]
+        buffers = [data_view[offset:offset+nbytes] for offset, nbytes in header["buffers"]]
+        result = pickle.loads(data_view[payload_start:payload_start+payload_len], buffers=buffers)
+
+        try:
+            os.utime(entry_fname) #Mark as recently used
+        except OSError:
+            pass
+
+        return True, result
+
+    def put(self, fnames : Iterable[str], result : Any, parse_f : Callable, *args, storage : DirectoryStorage = None, **kwargs):
+        """Stores the result of `parse_f(*args, **kwargs)` in the cache.
+
+        Parameters
+        ----------
+        fnames : Iterable[str]
+            All files the result was parsed from. The first file identifies the entry, all files will be used to validate the entry later on.
+        result : Any
+            The result to store
+        parse_f : Callable
+            The function used for parsing
+        storage : DirectoryStorage, optional
+            Storage containing the files. See :meth:`get`.
+        """
+        if storage is not None:
+            kwargs["storage"] = storage
+        storage = convert_to_storage(storage)
+        fnames = list(fnames)
+        buffers = []
+        payload = pickle.dumps(result, protocol=5, buffer_callback=buffers.append)
+        buffers = [buf.raw() for buf in buffers]
+
+        def align(offset):
+            return -(-offset // cache_buffer_alignment) * cache_buffer_alignment
+
+        #Offsets depend on the header length, which again depends on the offsets -> Reserve some space for the header
+        header = {"files": [file_fingerprint(fname, storage) for fname in fnames], "payload": None, "buffers": []}
+        header_len = len(json.dumps(header)) + 64 * (len(buffers) + 1)
+        offset = align(cache_header_struct.size + header_len)
+        header["payload"] = [offset, len(payload)]
+        offset += len(payload)
+        for buf in buffers:
+            offset = align(offset)
+            header["buffers"].append([offset, buf.nbytes])
+            offset += buf.nbytes
+
+        header_bytes = json.dumps(header).encode().ljust(header_len)
+        assert len(header_bytes) == header_len, "Cache header exceeds the reserved space"
+
+        entry_fname = self._entry_fname(fnames[0], storage, parse_f, args, kwargs)
+        try:
+            fd, tmp_fname = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        except OSError: #Cache directory not writable (anymore)
+            return
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(cache_header_struct.pack(cache_magic, cache_version, header_len))
+                f.write(header_bytes)
+                for (offset, _), data in zip([header["payload"]] + header["buffers"], [payload] + buffers):
+                    f.write(b"\0" * (offset - f.tell()))
+                    f.write(data)
+
+            os.replace(tmp_fname, entry_fname) #Atomic, in case multiple processes write the same entry
+        except OSError:
+            if os.path.exists(tmp_fname):
+                os.remove(tmp_fname)
+
+    def cached_call(self, fnames : Iterable[str], parse_f : Callable, *args, storage : DirectoryStorage = None, **kwargs) -> Any:
+        """Returns the cached result of `parse_f(*args, **kwargs)`, or calls the function and stores its result if no valid entry was found.
+
+        Parameters
+        ----------
+        fnames : Iterable[str]
+            All files the result will be parsed from. See :meth:`put`.
+        parse_f : Callable
+            The function used for parsing
+        storage : DirectoryStorage, optional
+            Storage containing the files. If given, it is also passed to `parse_f` as keyword argument.
+            By default the local file system
+
+        Returns
+        -------
+        Any
+            The (cached) result of the function
+        """
+        fnames = list(fnames)
+        found, result = self.get(fnames[0], parse_f, *args, storage=storage, **kwargs)
+        if not found:
+            result = parse_f(*args, **kwargs) if storage is None else parse_f(*args, storage=storage, **kwargs)
+            self.put(fnames, result, parse_f, *args, storage=storage, **kwargs)
+
+        return result
+
+    def _entries(self) -> List[Tuple[str, os.stat_result]]:
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(cache_entry_suffix):
+                try:
+                    entries.append((entry.path, entry.stat()))
+                except OSError: #Removed in the meantime
+                    pass
+
+        return entries
+
+    @property
+    def size(self) -> int:
+        """Current size of all cache entries in bytes
+        """
+        return sum([stat.st_size for _, stat in self._entries()])
+
+    def evict(self, max_size : int = None) -> int:
+        """Removes the least recently used entries until the cache fits into its size budget.
+
+        Parameters
+        ----------
+        max_size : int, optional
+            Size budget to enforce, by default :attr:`max_size`
+
+        Returns
+        -------
+        int
+            Number of removed entries
+        """
+        if max_size is None:
+            max_size = self.max_size
+
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime_ns)
+        total_size = sum([stat.st_size for _, stat in entries])
+        nr_removed = 0
+        for entry_fname, stat in entries:
+            if total_size <= max_size:
+                break
+            try:
+                os.remove(entry_fname)
+                total_size -= stat.st_size
+                nr_removed += 1
+            except OSError: #Still in use (Windows) or removed by another process
+                pass
+
+        return nr_removed
+
+    def invalidate(self, path : Union[str, PathLike] = None) -> int:
+        """Removes entries from the cache.
+
+        Parameters
+        ----------
+        path : Union[str, PathLike], optional
+            If given, only entries parsed from this file, or from files inside this directory will be removed.
+            By default, all entries will be removed.
+
+        Returns
+        -------
+        int
+            Number of removed entries
+        """
+        if path is not None:
+            path = os.path.abspath(path)
+
+        nr_removed = 0
+        for entry_fname, _ in self._entries():
+            if path is not None:
+                try:
+                    with open(entry_fname, "rb") as f:
+                        entry_paths = [entry_file[0] for entry_file in self._read_header(f)["files"]]
+                except (OSError, ValueError):
+                    entry_paths = [path] #Remove unreadable entries as well
+
+                if not any([entry_path == path or entry_path.startswith(os.path.join(path, "")) for entry_path in entry_paths]):
+                    continue
+
+            try:
+                os.remove(entry_fname)
+                nr_removed += 1
+            except OSError:
+                pass
+
+        return nr_removed
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(cache_dir={self.cache_dir}, max_size={self.max_size})"
+
+def convert_to_cache(cache : Union[ParseCache, str, PathLike, None]) -> Union[ParseCache, None]:
+    """Converts the given argument to a :class:`ParseCache`, if it is a path to a cache directory
+
+    Parameters
+    ----------
+    cache : Union[ParseCache, str, PathLike, None]
+        Either a :class:`ParseCache`, a path to the cache directory or None (no caching)
+
+    Returns
+    -------
+    Union[ParseCache, None]
+        The cache object, or None
+    """
+    if cache is None or isinstance(cache, ParseCache):
+        return cache
+
+    return ParseCache(cache)
@@ -0,0 +1,284 @@
+"""Block compressed files that can be compressed and decompressed in parallel.
+The data is split into independent blocks of fixed size, each stored as a separate gzip member (similar to `BGZF`_).
+The files therefore remain valid gzip files that can be read by any gzip reader, e.g. :class:`gzip.GzipFile`.
+Each member holds its compressed and uncompressed size in an extra header field, which allows random access to single blocks without decompressing the rest of the file.
+Since zlib releases the GIL, the blocks are (de-)compressed concurrently in a thread pool.
+
+.. _BGZF: https://samtools.github.io/hts-specs/SAMv1.pdf
+"""
+
+import io
+import struct
+import zlib
+from collections import deque
+from typing import IO, List, Tuple
+from .execution import ExecutionContext
+
+#Gzip member header with a single extra field holding the member size and uncompressed size:
+#ID1, ID2, CM, FLG, MTIME, XFL, OS, XLEN, SI1+SI2, SLEN, member size, data size
+block_header_struct = struct.Struct("<BBBBIBBH2sHII")
+block_trailer_struct = struct.Struct("<II") #CRC32, data size
+block_subfield_id = b"CR"
+gzip_flag_extra = 4
+
+def compress_block(data : bytes, compresslevel : int = 2) -> bytes:
+    """Compresses a single block into a gzip member
+
+    Parameters
+    ----------
+    data : bytes
+        The uncompressed data of the block
+    compresslevel : int, optional
+        zlib compression level, by default 2
+
+    Returns
+    -------
+    bytes
+        The complete gzip member
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+    payload = compressor.compress(data) + compressor.flush()
+    member_size = block_header_struct.size + len(payload) + block_trailer_struct.size
+    header = block_header_struct.pack(0x1f, 0x8b, 8, gzip_flag_extra, 0, 0, 255, 12, block_subfield_id, 8, member_size, len(data))
+    return b"".join([header, payload, block_trailer_struct.pack(zlib.crc32(data), len(data) & 0xffffffff)])
+
+def decompress_block(member : bytes) -> bytes:
+    """Decompresses a single gzip member written by :func:`compress_block`
+    """
+    data = zlib.decompress(memoryview(member)[block_header_struct.size:len(member) - block_trailer_struct.size], -zlib.MAX_WBITS)
+    crc, data_size = block_trailer_struct.unpack_from(member, len(member) - block_trailer_struct.size)
+    if zlib.crc32(data) != crc or len(data) & 0xffffffff != data_size:
+        raise ValueError("Corrupted block")
+
+    return data
+
+class BlockGzipWriter(io.RawIOBase):
+    """Writable file object compressing the written data into independent blocks, see :mod:`cartoreader_lite.low_level.compression`.
+
+    Parameters
+    ----------
+    fileobj : IO
+        Binary file handle to write the compressed data to. Will not be closed by the writer.
+    block_size : int, optional
+        Size of the uncompressed blocks, by default 4MB
+    compresslevel : int, optional
+        zlib compression level, by default 2
+    context : ExecutionContext, optional
+        Context used to compress the blocks. By default a new thread pool using all available CPUs, which will be shut down when closing the writer.
+    """
+
+    def __init__(self, fileobj : IO, block_size : int = 2**22, compresslevel : int = 2, context : ExecutionContext = None) -> None:
+        super().__init__()
+        assert 0 < block_size < 2**32, "Block size needs to be positive and below 4GB"
+        self.fileobj = fileobj
+        self.block_size = block_size
+        self.compresslevel = compresslevel
+        self._owns_context = context is None
+        self.context = ExecutionContext("thread") if context is None else context
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._nr_blocks = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def _submit(self, data : bytes):
+        self._pending.append(self.context.submit(compress_block, data, self.compresslevel))
+        self._nr_blocks += 1
+        while len(self._pending) > 2 * self.context.max_workers: #Bound the memory of blocks in flight
+            self.fileobj.write(self._pending.popleft().result())
+
+    def write(self, data) -> int:
+        self._buffer += data
+        if len(self._buffer) >= self.block_size:
+            view = memoryview(self._buffer)
+            nr_full_blocks = len(self._buffer) // self.block_size
+            for block_i in range(nr_full_blocks):
+                self._submit(bytes(view[block_i * self.block_size:(block_i + 1) * self.block_size]))
+            view.release()
+            del self._buffer[:nr_full_blocks * self.block_size]
+
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            try:
+                if len(self._buffer) > 0 or self._nr_blocks == 0: #Empty files consist of a single empty block
+                    self._submit(bytes(self._buffer))
+                    self._buffer = bytearray()
+                while len(self._pending) > 0:
+                    self.fileobj.write(self._pending.popleft().result())
+            finally:
+                if self._owns_context:
+                    self.context.shutdown()
+                super().close()
+
+class BlockGzipReader(io.RawIOBase):
+    """Readable and seekable file object decompressing files written by :class:`BlockGzipWriter`.
+    Sequential reads decompress the following blocks ahead of time in parallel.
+    Wrap the reader in an :class:`io.BufferedReader` for efficient small reads (e.g. when unpickling).
+
+    Parameters
+    ----------
+    fileobj : IO
+        Seekable binary file handle of the block compressed file. Will not be closed by the reader.
+    context : ExecutionContext, optional
+        Context used to decompress the blocks. By default a new thread pool using all available CPUs, which will be shut down when closing the reader.
+
+    Raises
+    ------
+    ValueError
+        If the file is not block compressed, e.g. a gzip file with a single member
+    """
+
+    def __init__(self, fileobj : IO, context : ExecutionContext = None) -> None:
+        super().__init__()
+        self.fileobj = fileobj
+        self._start = fileobj.tell()
+        self.blocks = read_block_index(fileobj)
+        self._owns_context = context is None
+        self.context = ExecutionContext("thread") if context is None else context
+        self._pos = 0
+        self._block_i = 0
+        self._block_data = b""
+        self._block_start = 0
+        self._prefetched = deque()
+
+    @property
+    def nr_blocks(self) -> int:
+        return len(self.blocks)
+
+    @property
+    def size(self) -> int:
+        """Total uncompressed size of the file
+        """
+        return 0 if len(self.blocks) == 0 else self.blocks[-1][2] + self.blocks[-1][3]
+
+    def _read_member(self, block_i : int) -> bytes:
+        offset, member_size = self.blocks[block_i][:2]
+        self.fileobj.seek(self._start + offset)
+        return self.fileobj.read(member_size)
+
+    def read_block(self, block_i : int) -> bytes:
+        """Reads and decompresses a single block, given by its index
+        """
+        return decompress_block(self._read_member(block_i))
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset : int, whence : int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def _load_block(self, block_i : int):
+        #Continue the prefetched sequence if possible, otherwise restart it at the requested block
+        while len(self._prefetched) > 0 and self._prefetched[0][0] != block_i:
+            self._prefetched.popleft()
+        if len(self._prefetched) == 0:
+            self._prefetched.append((block_i, self.context.submit(decompress_block, self._read_member(block_i))))
+
+        next_block_i = self._prefetched[-1][0] + 1
+        while len(self._prefetched) < 2 * self.context.max_workers and next_block_i < self.nr_blocks:
+            self._prefetched.append((next_block_i, self.context.submit(decompress_block, self._read_member(next_block_i))))
+            next_block_i += 1
+
+        self._block_data = self._prefetched.popleft()[1].result()
+        self._block_i, self._block_start = block_i, self.blocks[block_i][2]
+
+    def readinto(self, buffer) -> int:
+        buffer = memoryview(buffer).cast("B")
+        nr_read = 0
+        while nr_read < len(buffer) and self._pos < self.size:
+            if not (self._block_start <= self._pos < self._block_start + len(self._block_data)):
+                self._load_block(block_index_of(self.blocks, self._pos))
+
+            block_offset = self._pos - self._block_start
+            nr_bytes = min(len(buffer) - nr_read, len(self._block_data) - block_offset)
+            buffer[nr_read:nr_read + nr_bytes] = self._block_data[block_offset:block_offset + nr_bytes]
+            self._pos += nr_bytes
+            nr_read += nr_bytes
+
+        return nr_read
+
+    def close(self):
+        if not self.closed:
+            self._prefetched.clear()
+            if self._owns_context:
+                self.context.shutdown()
+            super().close()
+
+def read_block_index(fileobj : IO) -> List[Tuple[int, int, int, int]]:
+    """Reads the index of all blocks by skipping from one member header to the next, without decompressing any data.
+
+    Parameters
+    ----------
+    fileobj : IO
+        Seekable binary file handle, positioned at the start of the block compressed file
+
+    Returns
+    -------
+    List[Tuple[int, int, int, int]]
+        For each block the offset of the member inside the file (relative to the starting position), the member size,
+        the offset of the block inside the uncompressed data and its uncompressed size
+
+    Raises
+    ------
+    ValueError
+        If the file is not block compressed
+    """
+    start = fileobj.tell()
+    blocks = []
+    offset = data_offset = 0
+    while len(header := fileobj.read(block_header_struct.size)) > 0:
+        if len(header) < block_header_struct.size:
+            raise ValueError("Truncated block header")
+        id1, id2, _, flags, _, _, _, xlen, subfield_id, slen, member_size, data_size = block_header_struct.unpack(header)
+        if (id1, id2) != (0x1f, 0x8b) or flags != gzip_flag_extra or xlen != 12 or subfield_id != block_subfield_id or slen != 8:
+            raise ValueError("Not a block compressed file")
+
+        blocks.append((offset, member_size, data_offset, data_size))
+        offset += member_size
+        data_offset += data_size
+        fileobj.seek(start + offset)
+
+    if len(blocks) == 0:
+        raise ValueError("Empty file")
+
+    return blocks
+
+def block_index_of(blocks : List[Tuple[int, int, int, int]], pos : int) -> int:
+    """Returns the index of the block containing the given uncompressed position
+    """
+    low, high = 0, len(blocks) - 1
+    while low < high:
+        mid = (low + high + 1) // 2
+        if blocks[mid][2] <= pos:
+            low = mid
+        else:
+            high = mid - 1
+
+    return low
+
+def is_block_compressed(fileobj : IO) -> bool:
+    """Checks if the seekable file handle points to a block compressed file. The file position remains unchanged.
+    """
+    start = fileobj.tell()
+    try:
+        header = fileobj.read(block_header_struct.size)
+        if len(header) < block_header_struct.size:
+            return False
+        id1, id2, _, flags, _, _, _, xlen, subfield_id, slen = block_header_struct.unpack(header)[:10]
+        return (id1, id2) == (0x1f, 0x8b) and flags == gzip_flag_extra and xlen == 12 and subfield_id == block_subfield_id and slen == 8
+    finally:
+        fileobj.seek(start)
@@ -0,0 +1,224 @@
+"""Execution contexts controlling the parallelism used while reading CARTO3 studies.
+All parallel tasks of a study (reading meshes, points, VisiTag files, ...) are submitted to the single executor of the context.
+Tasks never start executors themselves, so the number of workers is bounded by the context.
+"""
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Union
+
+def available_cpus() -> int:
+    """Returns the number of CPUs the current process is allowed to use
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError: #Not available on all platforms
+        return os.cpu_count() or 1
+
+class SerialExecutor(Executor):
+    """Executor running all tasks immediately in the calling thread
+    """
+
+    def submit(self, fn : Callable, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as ex:
+            future.set_exception(ex)
+
+        return future
+
+class ExecutionContext:
+    """Context holding the executor used to read the CARTO3 studies.
+    The executor is created on first use and reused for all following tasks, e.g. when passing the same context to multiple studies, until :meth:`shutdown` is called.
+
+    Parameters
+    ----------
+    backend : str, optional
+        One of
+
+            * "serial": All tasks run in the calling thread
+            * "thread": Tasks run in a thread pool
+            * "process": Tasks run in a process pool
+
+        By default "process"
+    max_workers : int, optional
+        Maximum number of workers of the thread or process pool.
+        By default the number of CPUs available to the current process
+    """
+
+    backend : str #: The execution backend
+    max_workers : int #: Maximum number of workers. Always 1 for the serial backend
+
+    backends = {"serial": SerialExecutor, "thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+    def __init__(self, backend : str = "process", max_workers : int = None) -> None:
+        assert backend in ExecutionContext.backends, f"Unknown backend {backend}, available are {list(ExecutionContext.backends.keys())}"
+        assert max_workers is None or max_workers > 0, "At least one worker is required"
+        self.backend = backend
+        self.max_workers = 1 if backend == "serial" else (available_cpus() if max_workers is None else max_workers)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._temporary = False #Set by temporary_context for the contexts it shuts down, see deferred_context
+
+    @property
+    def executor(self) -> Executor:
+        """The executor of the context, created on first access
+        """
+        with self._lock:
+            if self._executor is None:
+                executor_cls = ExecutionContext.backends[self.backend]
+                self._executor = executor_cls() if self.backend == "serial" else executor_cls(max_workers=self.max_workers)
+
+            return self._executor
+
+    def submit(self, fn : Callable, *args, **kwargs) -> Future:
+        """Submits `fn(*args, **kwargs)` to the executor
+        """
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def map(self, fn : Callable, *iterables : Iterable, chunksize : int = 1) -> Iterator:
+        """Maps `fn` over the iterables using the executor, see :meth:`concurrent.futures.Executor.map`
+        """
+        return self.executor.map(fn, *iterables, chunksize=chunksize)
+
+    def imap(self, fn : Callable, *iterables : Iterable, max_pending : int = None) -> Iterator:
+        """Lazily maps `fn` over the iterables using the executor and yields the results in order.
+        In contrast to :meth:`map`, the iterables are only consumed as far as needed and at most `max_pending` tasks are submitted ahead of the consumer,
+        bounding the memory held by finished results that were not yet consumed. Pending tasks are cancelled if the iterator is closed early.
+
+        Parameters
+        ----------
+        fn : Callable
+            Function to call with one item of each iterable
+        *iterables : Iterable
+            Arguments of the calls
+        max_pending : int, optional
+            Maximum number of submitted tasks whose results were not yet yielded, by default twice the number of workers
+
+        Yields
+        ------
+        Iterator
+            The result of each call
+        """
+        max_pending = 2 * self.max_workers if max_pending is None else max_pending
+        assert max_pending > 0, "At least one pending task is required"
+        args_iter = zip(*iterables)
+        pending = deque()
+        try:
+            while True:
+                for args in args_iter:
+                    pending.append(self.submit(fn, *args))
+                    if len(pending) >= max_pending:
+                        break
+                if len(pending) == 0:
+                    return
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self, wait : bool = True):
+        """Shuts down the executor. A new executor will be created if the context is used again.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+    def __enter__(self) -> "ExecutionContext":
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def __getstate__(self) -> dict:
+        return {"backend": self.backend, "max_workers": self.max_workers}
+
+    def __setstate__(self, state : dict):
+        self.__init__(**state)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(backend={self.backend}, max_workers={self.max_workers})"
+
+def convert_to_context(context : Union[ExecutionContext, str, None]) -> ExecutionContext:
+    """Converts the given argument to an :class:`ExecutionContext`
+
+    Parameters
+    ----------
+    context : Union[ExecutionContext, str, None]
+        Either an :class:`ExecutionContext`, the name of a backend or None (process backend)
+
+    Returns
+    -------
+    ExecutionContext
+        The execution context
+    """
+    if isinstance(context, ExecutionContext):
+        return context
+
+    return ExecutionContext() if context is None else ExecutionContext(context)
+
+def deferred_context(context : ExecutionContext) -> Union[ExecutionContext, str]:
+    """Returns the context to use for tasks running after the current with-block of :class:`temporary_context`, e.g. maps loaded lazily on first access.
+    Contexts created by :class:`temporary_context` are shut down when leaving the block, so only their backend is returned:
+    Each deferred task then creates its own temporary context, which is shut down once the task finished. Other contexts are returned unchanged.
+
+    Parameters
+    ----------
+    context : ExecutionContext
+        The context used inside the with-block
+
+    Returns
+    -------
+    Union[ExecutionContext, str]
+        The context or its backend, to be passed to :class:`temporary_context` by the deferred task
+    """
+    return context.backend if context._temporary else context
+
+class temporary_context:
+    """Returns the given execution context when entering the with-block.
+    If no context is given, a new one will be created and shut down when leaving the block.
+    Tasks running after the block need to use :func:`deferred_context` instead.
+
+    Parameters
+    ----------
+    context : Union[ExecutionContext, str, None]
+        See :func:`convert_to_context`
+    default_backend : str, optional
+        Backend of the created context if None is given, by default "process"
+    """
+
+    def __init__(self, context : Union[ExecutionContext, str, None], default_backend : str = "process") -> None:
+        self.owned = not isinstance(context, ExecutionContext)
+        self.context = convert_to_context(default_backend if context is None else context)
+        if self.owned:
+            self.context._temporary = True
+
+    def __enter__(self) -> ExecutionContext:
+        return self.context
+
+    def __exit__(self, *args):
+        if self.owned:
+            self.context.shutdown()
+
+class local_context(temporary_context):
+    """Same as :class:`temporary_context`, but for tasks that need to run inside the current process, e.g. tasks working on large data frames.
+    Process pools are replaced by a thread pool with the same number of workers, so the worker budget of the given context is kept.
+    The thread pool is shut down when leaving the block.
+
+    Parameters
+    ----------
+    context : Union[ExecutionContext, str, None]
+        See :func:`convert_to_context`
+    default_backend : str, optional
+        Backend of the created context if None is given, by default "thread"
+    """
+
+    def __init__(self, context : Union[ExecutionContext, str, None], default_backend : str = "thread") -> None:
+        process_pool = isinstance(context, ExecutionContext) and context.backend == "process"
+        super().__init__(ExecutionContext("thread", context.max_workers) if process_pool else ("thread" if context == "process" else context), default_backend)
+        if process_pool: #Created here, so it is shut down when leaving the block
+            self.owned = self.context._temporary = True
@@ -0,0 +1,144 @@
+"""Proxies to lazily load parts of a CARTO3 study on first access.
+"""
+
+import threading
+from collections.abc import Sequence
+from typing import Any, Callable, Iterable, List, Union
+
+class LazySequence(Sequence):
+    """Sequence whose items are loaded on first access and kept afterwards.
+    Items can be accessed by their index, or by their name if names were given.
+    Pickling the sequence will load all items and store them as a regular list.
+
+    Parameters
+    ----------
+    loaders : Iterable[Callable[[], Any]]
+        One function per item that loads and returns the item
+    names : Iterable[str], optional
+        Names of the items, available without loading them. By default None
+    """
+
+    names : List[str] #: Names of the items, or None
+
+    def __init__(self, loaders : Iterable[Callable[[], Any]], names : Iterable[str] = None) -> None:
+        self._loaders = list(loaders)
+        self._items = [None] * len(self._loaders)
+        self._loaded = [False] * len(self._loaders)
+        self._locks = [threading.Lock() for _ in self._loaders]
+        self.names = None if names is None else list(names)
+        assert self.names is None or len(self.names) == len(self._loaders), "Number of names and loaders mismatch"
+
+    def _index(self, key : Union[int, str]) -> int:
+        if isinstance(key, str):
+            if self.names is None or key not in self.names:
+                raise KeyError(key)
+            return self.names.index(key)
+
+        return range(len(self))[key] #Handles negative indices and raises IndexError
+
+    def __getitem__(self, key : Union[int, str, slice]) -> Any:
+        if isinstance(key, slice):
+            return [self[i] for i in range(len(self))[key]]
+
+        i = self._index(key)
+        with self._locks[i]:
+            if not self._loaded[i]:
+                self._items[i] = self._loaders[i]()
+                self._loaded[i] = True
+
+            return self._items[i]
+
+    def __len__(self) -> int:
+        return len(self._loaders)
+
+    def is_loaded(self, key : Union[int, str]) -> bool:
+        """Returns true if the item was already loaded
+        """
+        return self._loaded[self._index(key)]
+
+    def release(self, key : Union[int, str]):
+        """Releases a loaded item. It will be loaded again on the next access.
+        """
+        i = self._index(key)
+        with self._locks[i]:
+            self._items[i] = None
+            self._loaded[i] = False
+
+    def load_all(self) -> List[Any]:
+        """Loads all items
+
+        Returns
+        -------
+        List[Any]
+            All items of the sequence
+        """
+        return [self[i] for i in range(len(self))]
+
+    def __reduce__(self):
+        return (list, (self.load_all(),))
+
+    def __repr__(self) -> str:
+        names = self.names if self.names is not None else [str(i) for i in range(len(self))]
+        return "[" + ", ".join([repr(item) if loaded else f"<{name} (not loaded)>" for item, loaded, name in zip(self._items, self._loaded, names)]) + "]"
+
+class LazyObject:
+    """Proxy to an object that is loaded on first access of any of its attributes or items.
+    Pickling the proxy will load and pickle the object itself.
+
+    Parameters
+    ----------
+    loader : Callable[[], Any]
+        Function that loads and returns the object
+    """
+
+    def __init__(self, loader : Callable[[], Any]) -> None:
+        self._loader = loader
+        self._obj = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self) -> Any:
+        """Loads the object, if it was not loaded yet
+
+        Returns
+        -------
+        Any
+            The loaded object
+        """
+        with self._lock:
+            if not self._loaded:
+                self._obj = self._loader()
+                self._loaded = True
+
+            return self._obj
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def __getattr__(self, name : str) -> Any:
+        #Only called for attributes not found in the proxy itself
+        if name.startswith("__") or name in ["_loader", "_obj", "_loaded", "_lock"]:
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __len__(self) -> int:
+        return len(self.load())
+
+    def __contains__(self, key) -> bool:
+        return key in self.load()
+
+    def __reduce__(self):
+        return (_identity, (self.load(),))
+
+    def __repr__(self) -> str:
+        return repr(self._obj) if self._loaded else f"<{self.__class__.__name__} (not loaded)>"
+
+def _identity(obj : Any) -> Any:
+    return obj
@@ -1,7 +1,7 @@
 """This file provides routines to read .mesh files from CARTO3
 """
 
-from io import StringIO
+from io import StringIO, BytesIO
 import os
 from typing import Iterable, List, Tuple, Union
 import pandas as pd
@@ -11,6 +11,8 @@ import re
 import pyvista as pv
 import vtk
 import logging as log
+from .cache import ParseCache
+from .storage import DirectoryStorage, convert_to_storage
 
 section_re_expr_str = r"\[(\S+)\]"
 section_re_expr = re.compile(section_re_expr_str)
@@ -20,6 +22,11 @@ attribute_re_expr = re.compile(attribute_re_expr_str)
 
 blank_line_expr = re.compile(r"\s+")
 
+section_bytes_re_expr = re.compile(rb"^\[(\S+)\]", re.MULTILINE)
+
+#Columns that will be converted to integers when decoding the numeric sections directly
+int_column_names = ["Vertex0", "Vertex1", "Vertex2", "GroupID"]
+
 def read_section(lines : Iterable[str]) -> pd.DataFrame:
     """Reads a single section of the .mesh files
 
@@ -67,32 +74,137 @@ def read_tris(data : pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
 
     return tris, normals, group_id
 
+def decode_lines(data : bytes) -> List[str]:
+    """Decodes raw bytes into a list of lines with normalized line endings, same as reading the file in text mode
+
+    Parameters
+    ----------
+    data : bytes
+        The raw content to decode
+
+    Returns
+    -------
+    List[str]
+        All lines contained in the data, including the trailing newline characters
+    """
+    return data.decode(errors="replace").replace("\r\n", "\n").splitlines(keepends=True)
+
+def find_sections(data : bytes) -> List[Tuple[str, int, int]]:
+    """Finds all sections of a .mesh file in a single scan over the raw file content
+
+    Parameters
+    ----------
+    data : bytes
+        The complete content of the .mesh file
+
+    Returns
+    -------
+    List[Tuple[str, int, int]]
+        List of all sections in the order of the file, given as triplet (section name, byte offset of the section body, byte offset of the section end)
+    """
+    #Only lines starting with a bracket are candidates for the section headers
+    line_starts = [0] if data.startswith(b"[") else []
+    line_start = data.find(b"\n[")
+    while line_start != -1:
+        line_starts.append(line_start + 1)
+        line_start = data.find(b"\n[", line_start + 1)
+
+    matches = [match for match in (section_bytes_re_expr.match(data, line_start) for line_start in line_starts) if match is not None]
+
+    section_ends = [match.start() for match in matches[1:]] + [len(data)]
+    return [(match.group(1).decode(errors="replace"), match.end(), section_end) for match, section_end in zip(matches, section_ends)]
 
-def read_mesh_file(fname : str) -> Tuple[Union[pv.UnstructuredGrid, pv.PolyData], dict]:
+def decode_section(body : bytes) -> Tuple[np.ndarray, List[str]]:
+    """Decodes the numeric block of a single section directly into a numpy array, without going through pandas.
+    The rows are expected to have the form `<index> = <value_1> ... <value_n>`, preceded by comment lines, the last of which holds the column names.
+
+    Parameters
+    ----------
+    body : bytes
+        The raw section content, excluding the section header
+
+    Returns
+    -------
+    Tuple[np.ndarray, List[str]]
+        The section data [NxC] without the index column, along with the column names given in the header row
+
+    Raises
+    ------
+    EmptyDataError
+        If the section does not contain any data
+    ValueError
+        If the section does not follow the expected layout. :func:`read_section` can be used in this case instead.
+    """
+    #Skip the comment and blank lines before the data. The last comment line holds the column names.
+    header_line = None
+    data_start = 0
+    while data_start < len(body):
+        line_end = body.find(b"\n", data_start)
+        line_end = len(body) if line_end == -1 else line_end
+        line = body[data_start:line_end].strip()
+        if line.startswith(b";"):
+            header_line = line
+        elif len(line) > 0:
+            break
+        data_start = line_end + 1
+
+    first_line = body[data_start:line_end].split()
+    if len(first_line) == 0:
+        raise EmptyDataError("No data found in the section")
+    if header_line is None:
+        raise ValueError("No header row found")
+    if len(first_line) < 2 or first_line[1] != b"=":
+        raise ValueError("Equality sign expected in the section")
+
+    #Skip the equality sign column
+    values = np.loadtxt(BytesIO(body[data_start:]), comments=";", usecols=[0] + list(range(2, len(first_line))), ndmin=2)
+    if not np.array_equal(values[:, 0], np.arange(values.shape[0])):
+        raise ValueError("Non continuous index sequence in section")
+
+    names = [name.decode(errors="replace") for name in re.split(rb"\s+", header_line) if name not in [b"", b";"]]
+    return values[:, 1:], names
+
+def read_mesh_file(fname : str, engine : str = "numpy", cache : ParseCache = None, storage : DirectoryStorage = None) -> Tuple[Union[pv.UnstructuredGrid, pv.PolyData], dict]:
     """Reads a single mesh file in CARTO3 mesh format and returns it as a pyvista object
 
     Parameters
     ----------
     fname : str
         Filename of the mesh file
+    engine : str, optional
+        The parser used for the numeric sections. Can be one of
+
+            * numpy: Decodes the vertices and triangles directly into numpy arrays (see :func:`decode_section`). 
+              Sections that can not be decoded this way will be parsed using pandas instead.
+            * pandas: Parses all sections using :func:`read_section`
+
+        By default "numpy"
+    cache : ParseCache, optional
+        If given, the mesh will be taken from the cache, if it was previously parsed from the same file.
+        By default None
+    storage : DirectoryStorage, optional
+        Storage to read the file from, e.g. a :class:`cartoreader_lite.low_level.storage.ZipStorage`.
+        By default the local file system
 
     Returns
     -------
     Tuple[Union[pv.UnstructuredGrid, pv.PolyData], dict]
         Returns the constructred mesh from the data, along with the header data as a dictionary
     """
-    with open(fname, "r", errors="replace") as f:
-        lines = f.readlines()
+    assert engine in ["numpy", "pandas"], f"Unknown engine {engine}"
+    if cache is not None:
+        return cache.cached_call([fname], read_mesh_file, fname, engine, storage=storage)
 
-    section_inds = [(i, section_re_expr.match(lines[i])) for i in np.arange(len(lines)) if section_re_expr.match(lines[i]) is not None]
+    with convert_to_storage(storage).open(fname, "rb") as f:
+        data = f.read()
 
-    assert len(section_inds) > 1, "Not enough section headers found in the file"
-    assert section_inds[0][1].group(1) == "GeneralAttributes", "Expected attributes first"
+    sections = find_sections(data)
 
-    section_inds.append((len(lines), None)) #To ease iteration
+    assert len(sections) > 1, "Not enough section headers found in the file"
+    assert sections[0][0] == "GeneralAttributes", "Expected attributes first"
 
     header = {}
-    for line in lines[section_inds[0][0]+1:section_inds[1][0]]:
+    for line in decode_lines(data[sections[0][1]:sections[0][2]])[1:]:
         if not line.startswith(";") and blank_line_expr.match(line) is None:
             match = attribute_re_expr.match(line)
             assert match is not None, f"Could not parse header line '{line:s}'"
@@ -100,15 +212,32 @@ def read_mesh_file(fname : str) -> Tuple[Union[pv.UnstructuredGrid, pv.PolyData]
     
     points = vert_normals = vert_groups = None
     tris = tri_normals = tri_groups = None
-    for i in range(1, len(section_inds) - 1):
-        sec = section_inds[i]
-        next_sec = section_inds[i+1]
-        section_name = sec[1].group(1)
-
-        section_lines = lines[sec[0]:next_sec[0]]
+    for section_name, section_start, section_end in sections[1:]:
+        body = data[section_start:section_end]
 
         try:
-            df, header_names = read_section(section_lines[1:])
+            if engine == "numpy":
+                if section_name not in ["VerticesSection", "TrianglesSection"]: #Other sections are not used (yet)
+                    log.info(f"Skipping {section_name} (not yet implemented)")
+                    continue
+
+                try:
+                    values, header_names = decode_section(body)
+                    if values.shape[1] != len(header_names): #Mismatches are handled by the pandas engine
+                        raise ValueError("Mismatch between number of given column headers and data columns")
+
+                    columns = {name: (values[:, col_i].astype(np.int64) if name in int_column_names else values[:, col_i]) 
+                                    for col_i, name in enumerate(header_names)}
+                    if section_name == "VerticesSection":
+                        points, vert_normals, vert_groups = read_vertices(columns)
+                    else:
+                        tris, tri_normals, tri_groups = read_tris(columns)
+                    continue
+                except (ValueError, KeyError) as err:
+                    log.info(f"Could not directly decode section {section_name} of mesh {fname}, falling back to pandas. Original error: {err}")
+
+            section_lines = decode_lines(body)[1:]
+            df, header_names = read_section(section_lines)
             assert np.all(df[0] == np.arange(len(df))), f"Non continuous index sequence in section {section_name:s}"
             assert np.all(df[1] == "="), f"Equality sign expected in section {section_name:s}"
 
@@ -0,0 +1,216 @@
+"""Instrumentation of the stages of loading a CARTO3 study (parsing the XML, reading the meshes and points, parsing the VisiTag files, resampling, projecting, ...).
+Each stage records its wall time, CPU time, bytes read, number of items and the peak resident memory into a :class:`LoadStats` report.
+Callbacks can be registered to stream the stages, e.g. to report the progress or export the timings as metrics.
+If no report is given, the stages are not measured at all.
+"""
+
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import pandas as pd
+
+try:
+    import resource
+except ImportError: #Not available on Windows
+    resource = None
+
+def peak_rss() -> Optional[int]:
+    """Returns the peak resident set size of the current process in bytes, or None if not available on this platform
+    """
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024 #Reported in kB on Linux
+
+def timed_call(fn : Callable, *args, **kwargs) -> Tuple[Any, float, float]:
+    """Calls `fn(*args, **kwargs)` and returns its result together with the elapsed wall and CPU time in seconds.
+    Used to measure tasks running inside worker processes, see :meth:`LoadStats.add`.
+    """
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+#: Stages containing other stages, which do not read files themselves
+enclosing_stages = ("study", "map")
+
+class StageTimer:
+    """Measures a single stage of a :class:`LoadStats` report while inside the with-block, see :meth:`LoadStats.stage`.
+    The record is added to the report and passed to the callbacks when leaving the block.
+    """
+
+    record : Dict #: The record of the stage, completed when leaving the with-block
+
+    def __init__(self, stats : "LoadStats", name : str, **info) -> None:
+        self.stats = stats
+        self.record = {"stage": name, **info, "start": None, "wall_time": None, "cpu_time": None, "bytes_read": 0, "items": 0, "peak_rss": None, "error": None}
+
+    def update(self, bytes_read : int = 0, items : int = 0):
+        """Adds the given number of bytes read and processed items to the stage
+        """
+        self.record["bytes_read"] += int(bytes_read)
+        self.record["items"] += int(items)
+
+    def __enter__(self) -> "StageTimer":
+        self.record["start"] = time.time()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self.stats._emit("start", self.record)
+        return self
+
+    def __exit__(self, ex_type, ex, traceback):
+        self.record["wall_time"] = time.perf_counter() - self._wall_start
+        self.record["cpu_time"] = time.process_time() - self._cpu_start
+        self.record["peak_rss"] = peak_rss()
+        if ex is not None:
+            self.record["error"] = f"{ex_type.__name__}: {ex}"
+
+        self.stats._add(self.record)
+
+class NullStageTimer:
+    """Stage timer that measures nothing, used if no :class:`LoadStats` report is given
+    """
+
+    def update(self, bytes_read : int = 0, items : int = 0):
+        pass
+
+    def __enter__(self) -> "NullStageTimer":
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+null_stage = NullStageTimer()
+
+class LoadStats:
+    """Report of the stages of loading a study, see :mod:`cartoreader_lite.low_level.stats`.
+    Pass it as `load_stats` to :class:`cartoreader_lite.low_level.study.CartoLLStudy` or :class:`cartoreader_lite.high_level.study.CartoStudy`,
+    which attach it as their attribute `load_stats`. The same report can be shared by multiple studies.
+
+    Each record holds
+
+        * stage: Name of the stage, e.g. "study", "study_xml", "map", "mesh", "points", "aux_mesh", "visitag_dir", "visitag_files", "resample", "point_details" or "projection"
+        * map: Name of the map, for stages of a single map
+        * start: Time stamp of the start of the stage (see :func:`time.time`)
+        * wall_time: Elapsed time in seconds
+        * cpu_time: CPU time of the current process in seconds (all threads). Work done inside worker processes is not included,
+          except for stages measured inside the worker (e.g. "mesh" and "aux_mesh", see :meth:`LoadStats.add`)
+        * bytes_read: Size of the files read during the stage. Files served from a :class:`cartoreader_lite.low_level.cache.ParseCache` are counted with their original size
+        * items: Number of processed items, e.g. points, meshes or files
+        * peak_rss: Peak resident memory of the current process at the end of the stage in bytes, None if not available
+        * error: Error raised during the stage, None if the stage succeeded
+
+    Stages may be nested (e.g. "map" contains "points" and "mesh") and overlap, since files are read in parallel.
+    The bytes read are only recorded by the stage reading the file, so summing them over all stages counts each file once (see :meth:`LoadStats.total_bytes_read`).
+    Stages of lazily loaded maps are recorded on first access.
+
+    Parameters
+    ----------
+    callbacks : List[Callable], optional
+        Functions called as `callback(event, record)` at the start (event "start") and end (event "end") of each stage.
+        The record is only completed at the end. Callbacks are called from the thread running the stage and should return quickly.
+        By default None
+    """
+
+    records : List[Dict] #: Records of all finished stages, in the order they finished
+    callbacks : List[Callable] #: Functions called at the start and end of each stage
+
+    def __init__(self, callbacks : List[Callable] = None) -> None:
+        self.records = []
+        self.callbacks = [] if callbacks is None else list(callbacks)
+        self._lock = threading.Lock()
+
+    def stage(self, name : str, **info) -> StageTimer:
+        """Returns a :class:`StageTimer` measuring the stage while inside its with-block
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage
+        **info
+            Additional entries of the record, e.g. the map name
+
+        Returns
+        -------
+        StageTimer
+            The timer, whose :meth:`StageTimer.update` adds the bytes read and items processed
+        """
+        return StageTimer(self, name, **info)
+
+    def add(self, name : str, wall_time : float, cpu_time : float, bytes_read : int = 0, items : int = 0, **info):
+        """Adds a stage that was measured elsewhere, e.g. inside a worker process using :func:`timed_call`.
+        The CPU time is then the one of the worker. The stage is assumed to have just finished.
+        """
+        record = {"stage": name, **info, "start": time.time() - wall_time, "wall_time": wall_time, "cpu_time": cpu_time,
+                  "bytes_read": int(bytes_read), "items": int(items), "peak_rss": peak_rss(), "error": None}
+        self._emit("start", record)
+        self._add(record)
+
+    def _emit(self, event : str, record : Dict):
+        for callback in self.callbacks:
+            callback(event, record)
+
+    def _add(self, record : Dict):
+        with self._lock:
+            self.records.append(record)
+        self._emit("end", record)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Returns all records as a table, one row per stage
+        """
+        with self._lock:
+            return pd.DataFrame(self.records, columns=None if len(self.records) > 0 else ["stage", "wall_time", "cpu_time", "bytes_read", "items", "peak_rss"])
+
+    def summary(self) -> pd.DataFrame:
+        """Returns the totals per stage name: The number of records, the summed times, bytes read and items and the maximum peak memory
+        """
+        records = self.to_dataframe()
+        return records.groupby("stage", sort=False).agg(count=("stage", "size"), wall_time=("wall_time", "sum"), cpu_time=("cpu_time", "sum"),
+                                                         bytes_read=("bytes_read", "sum"), items=("items", "sum"), peak_rss=("peak_rss", "max"))
+
+    def total_bytes_read(self) -> int:
+        """Returns the total size of the files read, summed over the stages reading files. The enclosing stages (see :data:`enclosing_stages`) are skipped,
+        so each file is only counted once even if an enclosing stage records bytes as well
+        """
+        records = self.to_dataframe()
+        return int(records.loc[~records["stage"].isin(enclosing_stages), "bytes_read"].sum())
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getstate__(self) -> dict:
+        return {"records": self.records} #Callbacks are not pickled
+
+    def __setstate__(self, state : dict):
+        self.__init__()
+        self.records = state["records"]
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({len(self.records)} stages)"
+
+def load_stage(stats : Union[LoadStats, None], name : str, **info) -> Union[StageTimer, NullStageTimer]:
+    """Returns the timer of the given stage, or a timer measuring nothing if `stats` is None, see :meth:`LoadStats.stage`
+    """
+    return null_stage if stats is None else stats.stage(name, **info)
+
+def convert_to_stats(load_stats : Union[LoadStats, Callable, bool, None]) -> Union[LoadStats, None]:
+    """Converts the given argument to a :class:`LoadStats` report
+
+    Parameters
+    ----------
+    load_stats : Union[LoadStats, Callable, bool, None]
+        Either a :class:`LoadStats` report, a callback (see :class:`LoadStats`) streaming the stages of a new report,
+        True for a new report or None/False to disable the measurements
+
+    Returns
+    -------
+    Union[LoadStats, None]
+        The report, or None if disabled
+    """
+    if isinstance(load_stats, LoadStats) or load_stats is None:
+        return load_stats
+    if callable(load_stats):
+        return LoadStats([load_stats])
+
+    return LoadStats() if load_stats else None
@@ -0,0 +1,271 @@
+"""Storage abstractions to read the files of a CARTO3 study, either from a directory or directly from a zip archive.
+"""
+
+import hashlib
+import io
+import os
+import posixpath
+import struct
+import threading
+import zipfile
+from collections import OrderedDict
+from typing import IO, List, Optional, Tuple, Union
+from os import PathLike
+
+def file_hash(fname : Union[str, PathLike], chunk_size : int = 2**22) -> str:
+    """Computes the content hash of a file
+
+    Parameters
+    ----------
+    fname : Union[str, PathLike]
+        The file to hash
+    chunk_size : int, optional
+        Size of the chunks in which the file will be read, by default 4MB
+
+    Returns
+    -------
+    str
+        Hexadecimal digest of the file content
+    """
+    file_hash = hashlib.blake2b(digest_size=20)
+    with open(fname, "rb") as f:
+        while (chunk := f.read(chunk_size)):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+class DirectoryStorage:
+    """Storage reading the study files from the local file system.
+    File names are used as given, i.e. either absolute or relative to the current working directory.
+    """
+
+    def open(self, fname : str, mode : str = "r") -> IO:
+        """Opens a file of the study for reading
+
+        Parameters
+        ----------
+        fname : str
+            Name of the file
+        mode : str, optional
+            Either "r" (text) or "rb" (binary), by default "r"
+
+        Returns
+        -------
+        IO
+            The opened file handle
+        """
+        assert mode in ["r", "rb"], "Storage can only be opened for reading"
+        return open(fname, mode)
+
+    def isfile(self, fname : str) -> bool:
+        return os.path.isfile(fname)
+
+    def list_files(self, dir_name : str) -> List[str]:
+        """Lists all files inside the given directory and its sub-directories
+
+        Parameters
+        ----------
+        dir_name : str
+            The directory to search
+
+        Returns
+        -------
+        List[str]
+            All found files, including the directory prefix
+        """
+        fnames = []
+        for root, dirs, files in os.walk(dir_name):
+            fnames += [os.path.join(root, file) for file in files]
+
+        return fnames
+
+    def list_dir(self, dir_name : str) -> List[str]:
+        """Lists the files directly inside the given directory, without its sub-directories
+
+        Parameters
+        ----------
+        dir_name : str
+            The directory to search
+
+        Returns
+        -------
+        List[str]
+            All found files, including the directory prefix
+        """
+        with os.scandir(dir_name) as entries:
+            return [os.path.join(dir_name, entry.name) for entry in entries if entry.is_file()]
+
+    def stat(self, fname : str) -> Tuple[int, int]:
+        """Returns the size and modification time (in ns) of the file
+        """
+        stat = os.stat(fname)
+        return stat.st_size, stat.st_mtime_ns
+
+    def content_hash(self, fname : str) -> str:
+        return file_hash(fname)
+
+    def identifier(self, fname : str) -> str:
+        """Returns a unique identifier of the file, independent of the current working directory
+        """
+        return os.path.abspath(fname)
+
+    def raw_location(self, fname : str) -> Optional[Tuple[str, int]]:
+        """Returns the location of the uncompressed file content on the local file system, e.g. to memory map the file
+
+        Returns
+        -------
+        Optional[Tuple[str, int]]
+            Path of the file holding the content and the byte offset of the content inside this file.
+            None if the content is not stored uncompressed.
+        """
+        return fname, 0
+
+    def close(self):
+        """Closes the files kept open by the storage. Files are re-opened on the next access
+        """
+        pass
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}()"
+
+max_open_zip_files = 8 #: Maximum number of zip archives kept open by each process, see :class:`ZipStorage`
+
+#Opened zip files of the current process by their path, shared between all ZipStorage objects (and threads). The least recently used archive is closed first.
+_zip_files = OrderedDict()
+_zip_files_lock = threading.Lock()
+
+def _close_zip_files():
+    global _zip_files_lock
+    #Forked processes inherit the archives of the parent, whose file positions would be shared. The lock may have been held by another thread.
+    _zip_files_lock = threading.Lock()
+    for _, zip_file in _zip_files.values():
+        zip_file.close()
+    _zip_files.clear()
+
+if hasattr(os, "register_at_fork"): #Not available on Windows
+    os.register_at_fork(after_in_child=_close_zip_files)
+
+class ZipStorage(DirectoryStorage):
+    """Storage reading the study files directly from a zip archive, without extracting it.
+    Members are decompressed on demand, so only the files that are actually needed will be read.
+    The archive will be re-opened by each process using the storage, which allows the members to be read in parallel.
+    Each process keeps at most :data:`max_open_zip_files` archives open, until they are closed by :meth:`close`.
+
+    Parameters
+    ----------
+    zip_fname : Union[str, PathLike]
+        Path to the zip archive
+    """
+
+    zip_fname : str #: Absolute path to the zip archive
+
+    def __init__(self, zip_fname : Union[str, PathLike]) -> None:
+        self.zip_fname = os.path.abspath(zip_fname)
+
+    def _zip_file(self) -> zipfile.ZipFile:
+        #Needs to hold _zip_files_lock
+        stat = os.stat(self.zip_fname)
+        key = (stat.st_size, stat.st_mtime_ns)
+        entry = _zip_files.get(self.zip_fname)
+        if entry is None or entry[0] != key:
+            if entry is not None: #Changed on disk. Members still being read keep the file open until they are closed.
+                entry[1].close()
+            _zip_files[self.zip_fname] = entry = (key, zipfile.ZipFile(self.zip_fname, "r"))
+
+        _zip_files.move_to_end(self.zip_fname)
+        while len(_zip_files) > max_open_zip_files:
+            _zip_files.popitem(last=False)[1][1].close()
+
+        return entry[1]
+
+    @property
+    def zip_file(self) -> zipfile.ZipFile:
+        """The opened zip archive. Re-opened if the archive changed on disk or was closed.
+        """
+        with _zip_files_lock:
+            return self._zip_file()
+
+    def close(self):
+        """Closes the archive in the current process, e.g. to allow replacing it on Windows. It is re-opened on the next access
+        """
+        with _zip_files_lock:
+            entry = _zip_files.pop(self.zip_fname, None)
+            if entry is not None:
+                entry[1].close()
+
+    @staticmethod
+    def member_name(fname : str) -> str:
+        """Converts the file name to the name of the member inside the archive
+
+        Parameters
+        ----------
+        fname : str
+            File name, relative to the root of the archive
+
+        Returns
+        -------
+        str
+            The name of the member
+        """
+        member = posixpath.normpath(str(fname).replace("\\", "/"))
+        return "" if member == "." else member.lstrip("/")
+
+    def open(self, fname : str, mode : str = "r") -> IO:
+        assert mode in ["r", "rb"], "Storage can only be opened for reading"
+        with _zip_files_lock: #The archive may otherwise be closed by another thread before the member is opened
+            file_h = self._zip_file().open(self.member_name(fname), "r")
+        return file_h if mode == "rb" else io.TextIOWrapper(file_h)
+
+    def isfile(self, fname : str) -> bool:
+        try:
+            return not self.zip_file.getinfo(self.member_name(fname)).is_dir()
+        except KeyError:
+            return False
+
+    def list_files(self, dir_name : str) -> List[str]:
+        prefix = self.member_name(dir_name)
+        prefix = prefix + "/" if len(prefix) > 0 else prefix
+        return [info.filename for info in self.zip_file.infolist() if info.filename.startswith(prefix) and not info.is_dir()]
+
+    def list_dir(self, dir_name : str) -> List[str]:
+        prefix = self.member_name(dir_name)
+        prefix = prefix + "/" if len(prefix) > 0 else prefix
+        return [info.filename for info in self.zip_file.infolist() if info.filename.startswith(prefix) and not info.is_dir() and "/" not in info.filename[len(prefix):]]
+
+    def stat(self, fname : str) -> Tuple[int, int]:
+        try:
+            info = self.zip_file.getinfo(self.member_name(fname))
+        except KeyError:
+            raise FileNotFoundError(fname)
+
+        #Zip archives only store the modification time with a resolution of seconds
+        year, month, day, hour, minute, second = info.date_time
+        return info.file_size, ((((year * 100 + month) * 100 + day) * 100 + hour) * 100 + minute) * 100 + second
+
+    def content_hash(self, fname : str) -> str:
+        return f"{self.zip_file.getinfo(self.member_name(fname)).CRC:08x}"
+
+    def identifier(self, fname : str) -> str:
+        return os.path.join(self.zip_fname, self.member_name(fname))
+
+    def raw_location(self, fname : str) -> Optional[Tuple[str, int]]:
+        info = self.zip_file.getinfo(self.member_name(fname))
+        if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1: #Compressed or encrypted
+            return None
+
+        #The data follows the local file header, whose name and extra field may differ from the central directory
+        with open(self.zip_fname, "rb") as f:
+            f.seek(info.header_offset)
+            header = f.read(zipfile.sizeFileHeader)
+        name_len, extra_len = struct.unpack("<HH", header[26:30])
+        return self.zip_fname, info.header_offset + zipfile.sizeFileHeader + name_len + extra_len
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.zip_fname})"
+
+local_storage = DirectoryStorage()
+
+def convert_to_storage(storage : Union[DirectoryStorage, None]) -> DirectoryStorage:
+    """Returns the given storage, or the storage of the local file system if None is given
+    """
+    return local_storage if storage is None else storage
@@ -1,20 +1,27 @@
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import xml.etree.ElementTree as ET 
 from xml.etree.ElementTree import Element
 import os
 import pandas as pd
 
 from cartoreader_lite.low_level.read_mesh import read_mesh_file
-from cartoreader_lite.low_level.visitags import read_visitag_dir
-from .utils import camel_to_snake_case, read_point_data, xml_elem_to_dict, xml_to_dataframe
+from cartoreader_lite.low_level.visitags import VisiTagData, read_visitag_dir
+from .utils import balance_batches, camel_to_snake_case, memory_nbytes, mesh_nbytes, point_data_sizes, read_converted_point_batch, read_point_data, read_point_data_batch, read_point_metadata, unpack_point_data_batch, xml_elem_to_dict, xml_to_dataframe
+from .cache import ParseCache, convert_to_cache
+from .storage import DirectoryStorage, ZipStorage, convert_to_storage
+from .lazy import LazySequence
+from .execution import ExecutionContext, deferred_context, temporary_context
+from .stats import LoadStats, convert_to_stats, load_stage, timed_call
+from ..postprocessing.geometry import ProjectionIndex
 import numpy as np
 from itertools import repeat
-import tempfile
-import zipfile
+from functools import partial
 import pyvista as pv
-from typing import Dict
+from typing import Callable, Dict, Iterator, List, Tuple, Union
+from os import PathLike
 
-_parallelize_pool = ProcessPoolExecutor
+_parallelize_pool = ProcessPoolExecutor #Deprecated, the parallelism is now controlled by an ExecutionContext
 
 class CartoLLMap:
 
@@ -26,25 +33,163 @@ class CartoLLMap:
         XML element holding the map data
     path_prefix : str
         Prefix of the path to load from
+    cache : ParseCache, optional
+        Cache of previously parsed files, see :class:`cartoreader_lite.low_level.cache.ParseCache`.
+        By default None
+    storage : DirectoryStorage, optional
+        Storage to read the files from, see :mod:`cartoreader_lite.low_level.storage`.
+        By default the local file system
+    load_point_details : bool, optional
+        If false, only the export XML of each point will be read into :attr:`point_metadata` and :attr:`point_raw_data` will be None.
+        The detailed point data can then be read on demand using :func:`cartoreader_lite.low_level.utils.read_point_data`.
+        By default True
+    context : ExecutionContext, optional
+        Execution context used to read the mesh and points in parallel, see :class:`cartoreader_lite.low_level.execution.ExecutionContext`.
+        By default a process pool that is shut down after loading
+    point_converter : Callable, optional
+        Picklable function called with the row of each point in :attr:`points_main_data` and its detailed data, inside the worker that read the point
+        (see :func:`cartoreader_lite.low_level.utils.read_converted_point_batch`). :attr:`point_raw_data` will then hold the converted points.
+        Used by :class:`cartoreader_lite.high_level.study.CartoStudy` to create the detailed points in a single pass. By default None
+    load_stats : LoadStats, optional
+        Report recording the stages "map", "mesh" and "points" of the map, see :class:`cartoreader_lite.low_level.stats.LoadStats`. By default None
     """
 
-    def import_raw_points(self, path_prefix : str):
+    point_raw_data : List #: Metadata and detailed data of each point, see :func:`cartoreader_lite.low_level.utils.read_point_data`, or the converted points if a `point_converter` was given. None if the point details were not loaded
+    point_metadata : List #: Metadata and connector names of each point, see :func:`cartoreader_lite.low_level.utils.read_point_metadata`. Only present if the point details were not loaded
+    path_prefix : str #: Prefix of the path the map was loaded from
+    storage : DirectoryStorage #: Storage the map was loaded from. None for the local file system
+    cache : ParseCache #: Cache used while loading the map
+
+    def import_raw_points(self, path_prefix : str, cache : ParseCache = None, storage : DirectoryStorage = None, batched : bool = True, 
+                          context : ExecutionContext = None, point_converter : Callable = None, load_stats : LoadStats = None):
         """Imports all points and its detailed data of the current map
 
         Parameters
         ----------
         path_prefix : str
             Prefix of the path to load from
+        cache : ParseCache, optional
+            Cache of previously parsed files, by default None
+        storage : DirectoryStorage, optional
+            Storage to read the files from, by default the local file system
+        batched : bool, optional
+            If true, the points will be split into one batch per worker, balanced by the size of their files (see :func:`cartoreader_lite.low_level.utils.balance_batches`).
+            Each worker reads its batch using :func:`cartoreader_lite.low_level.utils.read_point_data_batch` and returns the consolidated data, starting with the largest batch.
+            If false, each point will be read in a separate task.
+            By default True
+        context : ExecutionContext, optional
+            Execution context used for reading, by default a process pool that is shut down afterwards
+        point_converter : Callable, optional
+            If given, each point will be converted by this function right after reading it, inside the same worker (see :class:`CartoLLMap`).
+            By default None
+        load_stats : LoadStats, optional
+            Report recording the stage "points", see :class:`cartoreader_lite.low_level.stats.LoadStats`. By default None
         """
+        with temporary_context(context) as context, load_stage(load_stats, "points", map=self.name) as stage:
+            point_ids = self.points_main_data["Id"].to_numpy()
+            sizes = point_data_sizes(self.name, point_ids, path_prefix, storage) if batched or load_stats is not None else None
+            if sizes is not None:
+                stage.update(bytes_read=sizes.sum(), items=len(point_ids))
+
+            if point_converter is not None:
+                #Single pass: Only the converted points are transferred back from the workers
+                batches = balance_batches(sizes, context.max_workers) if batched else [[point_i] for point_i in range(len(point_ids))]
+                futures = [context.submit(read_converted_point_batch, point_converter, self.name, self.points_main_data.iloc[batch], path_prefix, cache, storage) for batch in batches]
+                self.point_raw_data = [None] * len(point_ids)
+                for batch, future in zip(batches, futures):
+                    for point_i, point in zip(batch, future.result()):
+                        self.point_raw_data[point_i] = point
+            elif batched:
+                batches = balance_batches(sizes, context.max_workers)
+                futures = [context.submit(read_point_data_batch, self.name, point_ids[batch], path_prefix, cache, storage) for batch in batches]
+                self.point_raw_data = [None] * len(point_ids)
+                for batch, future in zip(batches, futures):
+                    for point_i, point_data in zip(batch, unpack_point_data_batch(*future.result())):
+                        self.point_raw_data[point_i] = point_data
+            else:
+                self.point_raw_data = list(context.map(read_point_data, repeat(self.name), 
+                                                            point_ids, repeat(path_prefix), repeat(cache), repeat(storage),
+                                                            chunksize=5))
 
-        #read_f = lambda point_id: read_point_data(self.name, point_id, path_prefix)
-        with _parallelize_pool() as pool:
-            self.point_raw_data = list(pool.map(read_point_data, repeat(self.name), 
-                                                        self.points_main_data["Id"], repeat(path_prefix), 
-                                                        chunksize=5))
-        pass
+    def import_point_metadata(self, path_prefix : str, cache : ParseCache = None, storage : DirectoryStorage = None, context : ExecutionContext = None,
+                              load_stats : LoadStats = None):
+        """Imports only the metadata of all points of the current map, without their detailed data
 
-    def __init__(self, xml_h : Element, path_prefix : str) -> None:
+        Parameters
+        ----------
+        path_prefix : str
+            Prefix of the path to load from
+        cache : ParseCache, optional
+            Cache of previously parsed files, by default None
+        storage : DirectoryStorage, optional
+            Storage to read the files from, by default the local file system
+        context : ExecutionContext, optional
+            Execution context used for reading, by default a process pool that is shut down afterwards
+        load_stats : LoadStats, optional
+            Report recording the stage "points", see :class:`cartoreader_lite.low_level.stats.LoadStats`. By default None
+        """
+        with temporary_context(context) as context, load_stage(load_stats, "points", map=self.name) as stage:
+            stage.update(items=len(self.points_main_data))
+            self.point_metadata = list(context.map(read_point_metadata, repeat(self.name), 
+                                                        self.points_main_data["Id"], repeat(path_prefix), repeat(cache), repeat(storage),
+                                                        chunksize=20))
+        self.point_raw_data = None
+
+    def iter_points(self, batch_size : int = 64, context : ExecutionContext = None, point_converter : Callable = None, max_pending : int = None) -> Iterator[Tuple[pd.DataFrame, List]]:
+        """Reads the detailed data of all points of the map in consecutive batches, independent of :attr:`point_raw_data`.
+        The batches are read in parallel (see :func:`cartoreader_lite.low_level.utils.read_point_data_batch`), but at most `max_pending` batches are read ahead of the consumer.
+        Only the yielded batches are kept in memory, so a complete pass over all points runs in constant memory, even if the map was loaded without its point details.
+        The study files need to remain accessible.
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            Number of points per batch, by default 64
+        context : ExecutionContext, optional
+            Execution context used for reading, by default a process pool that is shut down after the iteration
+        point_converter : Callable, optional
+            If given, each point will be converted by this function right after reading it, inside the same worker (see :class:`CartoLLMap`).
+            By default None
+        max_pending : int, optional
+            Maximum number of batches read ahead, see :meth:`cartoreader_lite.low_level.execution.ExecutionContext.imap`.
+            By default twice the number of workers
+
+        Yields
+        ------
+        Iterator[Tuple[pd.DataFrame, List]]
+            The rows of :attr:`points_main_data` of each batch and the data of each point in the batch (see :func:`cartoreader_lite.low_level.utils.read_point_data`),
+            or the converted points if a `point_converter` was given
+        """
+        assert batch_size > 0, "Batches need to hold at least one point"
+        if "Id" not in self.points_main_data:
+            return
+
+        path_prefix, cache, storage = self.path_prefix, self.cache, self.storage
+        batches = [self.points_main_data.iloc[start:start + batch_size] for start in range(0, len(self.points_main_data), batch_size)]
+        with temporary_context(context) as context:
+            if point_converter is not None:
+                results = context.imap(read_converted_point_batch, repeat(point_converter), repeat(self.name), batches, 
+                                       repeat(path_prefix), repeat(cache), repeat(storage), max_pending=max_pending)
+                yield from zip(batches, results)
+            else:
+                results = context.imap(read_point_data_batch, repeat(self.name), [batch["Id"].to_numpy() for batch in batches], 
+                                       repeat(path_prefix), repeat(cache), repeat(storage), max_pending=max_pending)
+                for batch, result in zip(batches, results):
+                    yield batch, unpack_point_data_batch(*result)
+
+    def __init__(self, xml_h : Element, path_prefix : str, cache : ParseCache = None, storage : DirectoryStorage = None, load_point_details : bool = True,
+                 context : ExecutionContext = None, point_converter : Callable = None, load_stats : LoadStats = None) -> None:
+        with load_stage(load_stats, "map", map=xml_h.attrib.get("Name")) as stage:
+            self._read_map(xml_h, path_prefix, cache, storage, load_point_details, context, point_converter, load_stats)
+            stage.update(items=1)
+
+    def _read_map(self, xml_h : Element, path_prefix : str, cache : ParseCache = None, storage : DirectoryStorage = None, load_point_details : bool = True,
+                  context : ExecutionContext = None, point_converter : Callable = None, load_stats : LoadStats = None):
+        """Reads the map data, mesh and points given by the XML element, see :class:`CartoLLMap`
+        """
+        self.path_prefix = path_prefix
+        self.storage = storage
+        self.cache = cache
 
         for k, v in xml_h.items():
             setattr(self, camel_to_snake_case(k), v)
@@ -66,19 +211,33 @@ class CartoLLMap:
             elif elem.tag == "ColoringRangeTable":
                 self.coloring_range_table = xml_to_dataframe(elem)
 
-        #Import mesh
-        if "FileNames" in xml_h.keys():
-            fname = os.path.join(path_prefix, self.file_names)
-            if os.path.isfile(fname):
-                self.mesh, self.mesh_metadata = read_mesh_file(fname)
-            else:
-                print(f"Warning: File {fname} referenced for map {self.name}, but could not be found")
-                raise FileNotFoundError(fname)
-                #self.mesh = pv.UnstructuredGrid()
-                #self.mesh_metadata = {}
-
-        if "Id" in self.points_main_data: 
-            self.import_raw_points(path_prefix)
+        with temporary_context(context) as context:
+            #Import mesh, while the points are being read
+            mesh_future = None
+            if "FileNames" in xml_h.keys():
+                fname = os.path.join(path_prefix, self.file_names)
+                if convert_to_storage(storage).isfile(fname):
+                    if load_stats is None:
+                        mesh_future = context.submit(read_mesh_file, fname, cache=cache, storage=storage)
+                    else: #Measured inside the worker, since the mesh is read while the points are imported
+                        mesh_future = context.submit(timed_call, read_mesh_file, fname, cache=cache, storage=storage)
+                else:
+                    print(f"Warning: File {fname} referenced for map {self.name}, but could not be found")
+                    raise FileNotFoundError(fname)
+                    #self.mesh = pv.UnstructuredGrid()
+                    #self.mesh_metadata = {}
+
+            if "Id" in self.points_main_data: 
+                if load_point_details:
+                    self.import_raw_points(path_prefix, cache, storage, context=context, point_converter=point_converter, load_stats=load_stats)
+                else:
+                    self.import_point_metadata(path_prefix, cache, storage, context, load_stats)
+
+            if mesh_future is not None and load_stats is None:
+                self.mesh, self.mesh_metadata = mesh_future.result()
+            elif mesh_future is not None:
+                (self.mesh, self.mesh_metadata), wall_time, cpu_time = mesh_future.result()
+                load_stats.add("mesh", wall_time, cpu_time, bytes_read=convert_to_storage(storage).stat(fname)[0], items=1, map=self.name)
 
 class CartoAuxMesh:
     """Class that holds auxiliary meshes of the CARTO system, e.g. generated by `CartoSeg`_.
@@ -91,8 +250,15 @@ class CartoAuxMesh:
         Path prefix pointing to the directory to read from
     load : bool, optional
         If true, the meshes will be read and buffered immediately. 
-        If false, only the names will be loaded and :meth:`load_mesh` will need to be called later.
+        If false, only the names will be loaded and the mesh will be read on first access of :attr:`mesh_data`, :attr:`metadata` or :attr:`affine`,
+        or by calling :meth:`load_mesh`.
         By default True
+    cache : ParseCache, optional
+        Cache of previously parsed files, see :class:`cartoreader_lite.low_level.cache.ParseCache`.
+        By default None
+    storage : DirectoryStorage, optional
+        Storage to read the mesh from, see :mod:`cartoreader_lite.low_level.storage`.
+        By default the local file system
     """
 
     mesh_path : str #: Full path to the mesh file
@@ -100,27 +266,94 @@ class CartoAuxMesh:
     mesh_data : pv.UnstructuredGrid #: The loaded mesh
     metadata : Dict[str, str] #: Metadata associated with the mesh, given by the XML tags
     affine : np.ndarray #: 4x4 affine transformation matrix given by CARTO
+    storage : DirectoryStorage #: Storage the mesh will be read from. None for the local file system
 
 
-    def __init__(self, xml_h : Element, path_prefix : str, load=True) -> None:
+    def __init__(self, xml_h : Element, path_prefix : str, load=True, cache : ParseCache = None, storage : DirectoryStorage = None) -> None:
         for k, v in xml_h.items():
             setattr(self, camel_to_snake_case(k), v)
 
         self.mesh_path = os.path.join(path_prefix, xml_h.attrib["FileName"])
         self.name = os.path.splitext(self.file_name)[0]
+        self.storage = storage
+        self._cache = None if load else cache #Only kept for loading the mesh on first access
 
         if load:
-            self.load_mesh()
+            self.load_mesh(cache)
 
-    def load_mesh(self):
+    def load_mesh(self, cache : ParseCache = None):
         """Loads the mesh with the given name into the memory
+
+        Parameters
+        ----------
+        cache : ParseCache, optional
+            Cache of previously parsed files, by default None
         """
-        self.mesh_data, self.metadata = read_mesh_file(self.mesh_path)
+        self.mesh_data, self.metadata = read_mesh_file(self.mesh_path, cache=cache, storage=self.storage)
         if "Matrix" in self.metadata:
             self.affine = np.fromstring(self.metadata["Matrix"], sep=" ").reshape([4, 4])
+        self._cache = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return "mesh_data" in self.__dict__
+
+    @property
+    def projection_index(self) -> ProjectionIndex:
+        """Index to project points onto :attr:`mesh_data`, see :class:`cartoreader_lite.postprocessing.geometry.ProjectionIndex`.
+        Built on first access and rebuilt if the mesh was replaced or modified.
+        """
+        index = self.__dict__.get("_projection_index")
+        if index is None or not index.is_valid_for(self.mesh_data):
+            index = self._projection_index = ProjectionIndex(self.mesh_data)
+        return index
+
+    def _memory_usage(self, deep : bool = False, seen : Dict = None) -> Dict[str, int]:
+        seen = {} if seen is None else seen
+        if not self.is_loaded:
+            return {"mesh_points": 0, "mesh_cells": 0, "mesh_data": 0, "metadata": 0, "projection_index": 0}
+
+        usage = {f"mesh_{k}": v for k, v in mesh_nbytes(self.mesh_data, deep, seen).items()}
+        usage["metadata"] = memory_nbytes([self.metadata, self.__dict__.get("affine")], deep, seen)
+        index = self.__dict__.get("_projection_index")
+        usage["projection_index"] = 0 if index is None else index.memory_nbytes(seen)
+        return usage
+
+    def memory_usage(self, deep : bool = False) -> pd.Series:
+        """Returns the memory held by the mesh in bytes, split into the points, cells and data arrays of :attr:`mesh_data`, the metadata
+        and the projection index (if it was built). Meshes that were not loaded yet are not loaded and hold no memory.
+        See :func:`cartoreader_lite.low_level.utils.memory_nbytes`.
+
+        Parameters
+        ----------
+        deep : bool, optional
+            If true, Python objects (e.g. the metadata strings) are counted as well. By default False
+
+        Returns
+        -------
+        pd.Series
+            Bytes held by each component
+        """
+        return pd.Series(self._memory_usage(deep), dtype=np.int64)
+
+    def __getattr__(self, name : str):
+        #Only called for missing attributes: Load meshes created with load=False on first access
+        if name in ["mesh_data", "metadata", "affine"] and "mesh_path" in self.__dict__ and not self.is_loaded:
+            self.load_mesh(self.__dict__.get("_cache"))
+            if name in self.__dict__:
+                return self.__dict__[name]
+
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
+
+    def __getstate__(self) -> dict:
+        #Pickled meshes are always loaded, so they do not depend on the original study files anymore
+        if not self.is_loaded:
+            self.load_mesh(self._cache)
+        return {k: v for k, v in self.__dict__.items() if k != "_projection_index"} #The index is rebuilt on demand
 
     def __repr__(self) -> str:
-        return f"{self.__class__.__name__}(name={self.name}, path={self.mesh_path}, mesh={self.mesh_data})"
+        mesh = self.mesh_data if self.is_loaded else "not loaded"
+        return f"{self.__class__.__name__}(name={self.name}, path={self.mesh_path}, mesh={mesh})"
 
 class CartoLLStudy:
     """Low level CARTO study class that reads all information found in the CARTO3 study and saves it.
@@ -135,12 +368,43 @@ class CartoLLStudy:
     arg2 : str, optional
         The name of the study to load, contained inside the directory or zip file.
         Will default to either the zip name or bottom most directory name.
+    cache : Union[ParseCache, str, PathLike], optional
+        A :class:`cartoreader_lite.low_level.cache.ParseCache`, or the directory of such a cache.
+        If given, all parsed files will be stored in the cache and only new or changed files will be parsed when loading the study again.
+        By default None
+    lazy : bool, optional
+        If true, only the study XML will be parsed. :attr:`maps` will be a :class:`cartoreader_lite.low_level.lazy.LazySequence`
+        that imports each map on first access and the auxiliary meshes will be read on first access of their data (see :class:`CartoAuxMesh`).
+        The files of :attr:`visitag_data` are always parsed on first access.
+        Maps that fail to import will raise an error on access, instead of being skipped.
+        By default False
+    load_point_details : bool, optional
+        If false, only the metadata of the points will be read and their detailed data (:term:`ECGs<ECG>`, connectors, contact force) can be read on demand.
+        See :class:`CartoLLMap`. By default True
+    context : Union[ExecutionContext, str], optional
+        A :class:`cartoreader_lite.low_level.execution.ExecutionContext`, or the name of its backend ("serial", "thread" or "process").
+        All files will be read using the executor of this context. Passing the same context to multiple studies will reuse its workers.
+        By default a process pool that is shut down after loading the study. Lazily loaded maps (see `lazy`) then use a new pool for each map, which is shut down after loading the map.
+        Contexts passed as object are used for the lazily loaded maps as well and need to be shut down by the caller
+    point_converter : Callable, optional
+        Function converting the points of all maps while they are read, see :class:`CartoLLMap`. By default None
+    load_stats : Union[LoadStats, Callable, bool], optional
+        A :class:`cartoreader_lite.low_level.stats.LoadStats` report, a callback streaming the stages of a new report, or True for a new report.
+        The report will record the time, bytes read and memory of each loading stage and is kept in :attr:`load_stats`.
+        By default None (no measurements)
     """
 
     aux_mesh_reg_mat : np.ndarray = None
+    maps : Union[List[CartoLLMap], LazySequence] #: The maps of the study
+    aux_meshes : List[CartoAuxMesh] #: Auxiliary meshes of the study
+    visitag_data : VisiTagData #: VisiTag data, parsed on first access, see :func:`cartoreader_lite.low_level.visitags.read_visitag_dir`
+    storage : DirectoryStorage #: Storage the files of the study are read from. None for the local file system
+    load_stats : LoadStats = None #: Report of the loading stages, see :class:`cartoreader_lite.low_level.stats.LoadStats`. None if not requested
 
-    def _parse_meshes(self, xml_h : Element, path_prefix : str):
-        """Parses and loads the axuiliary meshes given in the study
+    def _parse_meshes(self, xml_h : Element, path_prefix : str, cache : ParseCache = None, storage : DirectoryStorage = None, lazy : bool = False,
+                      context : ExecutionContext = None, load_stats : LoadStats = None):
+        """Parses and loads the axuiliary meshes given in the study.
+        The meshes are read asynchronously, :attr:`aux_meshes` will hold the futures of the meshes until they are resolved by :meth:`_read_xml`.
 
         Parameters
         ----------
@@ -148,21 +412,35 @@ class CartoLLStudy:
             The XML element containing the mesh metadata
         path_prefix : str
             Path prefix pointing to the directory to read from
+        cache : ParseCache, optional
+            Cache of previously parsed files, by default None
+        storage : DirectoryStorage, optional
+            Storage to read the files from, by default the local file system
+        lazy : bool, optional
+            If true, the meshes will only be read on first access, by default False
+        context : ExecutionContext, optional
+            Execution context used for reading, by default a process pool that is shut down afterwards
+        load_stats : LoadStats, optional
+            If given, the meshes are read using :func:`cartoreader_lite.low_level.stats.timed_call` and their stage "aux_mesh" is recorded in :meth:`_read_xml`.
+            By default None
         """
         self.aux_meshes = []
         
-        with ProcessPoolExecutor() as pool:
-            for elem in xml_h:
-                if elem.tag == "RegistrationMatrix":
-                    self.aux_mesh_reg_mat = np.fromstring(elem.text, sep=" ").reshape([4, 4]) #Affine matrix
-                elif elem.tag == "Mesh":
-                    self.aux_meshes.append(pool.submit(CartoAuxMesh, elem, path_prefix)) #CartoMesh(elem, path_prefix))
-                elif elem.tag == "RegistrationData":
-                    self.aux_mesh_reg_data = xml_elem_to_dict(elem)
-
-            self.aux_meshes = [m.result() for m in self.aux_meshes]
-
-    def _parse_maps(self, maps : Element, path_prefix : str):
+        for elem in xml_h:
+            if elem.tag == "RegistrationMatrix":
+                self.aux_mesh_reg_mat = np.fromstring(elem.text, sep=" ").reshape([4, 4]) #Affine matrix
+            elif elem.tag == "Mesh":
+                if lazy:
+                    self.aux_meshes.append(CartoAuxMesh(elem, path_prefix, load=False, cache=cache, storage=storage))
+                elif load_stats is None:
+                    self.aux_meshes.append(context.submit(CartoAuxMesh, elem, path_prefix, cache=cache, storage=storage)) #CartoMesh(elem, path_prefix))
+                else:
+                    self.aux_meshes.append(context.submit(timed_call, CartoAuxMesh, elem, path_prefix, cache=cache, storage=storage))
+            elif elem.tag == "RegistrationData":
+                self.aux_mesh_reg_data = xml_elem_to_dict(elem)
+
+    def _parse_maps(self, maps : Element, path_prefix : str, cache : ParseCache = None, storage : DirectoryStorage = None, lazy : bool = False, 
+                    load_point_details : bool = True, context : ExecutionContext = None, point_converter : Callable = None, load_stats : LoadStats = None):
         """Parses and loads the maps given in the study
 
         Parameters
@@ -171,27 +449,48 @@ class CartoLLStudy:
             The XML element containing the map data
         path_prefix : str
             Path prefix pointing to the directory to read from
+        cache : ParseCache, optional
+            Cache of previously parsed files, by default None
+        storage : DirectoryStorage, optional
+            Storage to read the files from, by default the local file system
+        lazy : bool, optional
+            If true, the maps will only be imported on first access, by default False
+        load_point_details : bool, optional
+            If false, only the metadata of the points will be read, by default True
+        context : ExecutionContext, optional
+            Execution context used for reading, by default a process pool that is shut down afterwards
+        point_converter : Callable, optional
+            Function converting the points while they are read, see :class:`CartoLLMap`. By default None
+        load_stats : LoadStats, optional
+            Report recording the loading stages, see :class:`cartoreader_lite.low_level.stats.LoadStats`. By default None
         """
+        map_elems = []
+        for elem in maps:
+            if elem.tag == "Map":
+                map_elems.append(elem)
+            elif elem.tag == "TagsTable":
+                self.tags_table = xml_to_dataframe(elem)
+            elif elem.tag == "ColoringTable":
+                self.coloring_table = xml_to_dataframe(elem)
+
+        if lazy:
+            #Maps loaded on first access use their own temporary context, if the given one is shut down after loading the study
+            self.maps = LazySequence([partial(CartoLLMap, elem, path_prefix, cache, storage, load_point_details, deferred_context(context), point_converter, load_stats) for elem in map_elems], 
+                                        [elem.attrib.get("Name") for elem in map_elems])
+            return
+
+        #Maps are imported one after another, each reading its mesh and points in parallel using the context
         self.maps = []
-        with _parallelize_pool() as pool:
-            for elem in maps:
-                if elem.tag == "Map":
-                    self.maps.append(pool.submit(CartoLLMap, elem, path_prefix)) #self.maps.append(CartoLLMap(elem, path_prefix))
-                elif elem.tag == "TagsTable":
-                    self.tags_table = xml_to_dataframe(elem)
-                elif elem.tag == "ColoringTable":
-                    self.coloring_table = xml_to_dataframe(elem)
-
-            maps = []
-            for res in self.maps:
-                try:
-                    maps.append(res.result())
-                except Exception as ex:
-                    print(f"Importing a map failed. Original error: {type(ex)}, {ex}")
-                    
-            self.maps = maps
-
-    def _read_xml(self, xml_h : ET, path_prefix : str):
+        for elem in map_elems:
+            try:
+                self.maps.append(CartoLLMap(elem, path_prefix, cache, storage, load_point_details, context, point_converter, load_stats))
+            except BrokenProcessPool: #A worker died, all further maps would fail as well
+                raise
+            except Exception as ex:
+                print(f"Importing a map failed. Original error: {type(ex)}, {ex}")
+
+    def _read_xml(self, xml_h : ET, path_prefix : str, cache : ParseCache = None, storage : DirectoryStorage = None, lazy : bool = False,
+                    load_point_details : bool = True, context : ExecutionContext = None, point_converter : Callable = None, load_stats : LoadStats = None):
         """Read the XML data of the study and parses all the data in it
 
         Parameters
@@ -200,21 +499,44 @@ class CartoLLStudy:
             The XML root element of the study
         path_prefix : str
             Path prefix pointing to the directory to read from
+        cache : ParseCache, optional
+            Cache of previously parsed files, by default None
+        storage : DirectoryStorage, optional
+            Storage to read the files from, by default the local file system
+        lazy : bool, optional
+            If true, maps and meshes will only be loaded on first access, by default False
+        load_point_details : bool, optional
+            If false, only the metadata of the points will be read, by default True
+        context : ExecutionContext, optional
+            Execution context used for reading, by default a process pool that is shut down afterwards
+        point_converter : Callable, optional
+            Function converting the points while they are read, see :class:`CartoLLMap`. By default None
+        load_stats : LoadStats, optional
+            Report recording the loading stages, see :class:`cartoreader_lite.low_level.stats.LoadStats`. By default None
         """
         root = xml_h.getroot()
         self.name = root.attrib["name"]
-        futures = []
-        with ThreadPoolExecutor() as pool:
-            for elem in root:
-                if elem.tag == "Maps":
-                    futures.append(pool.submit(self._parse_maps, elem, path_prefix)) #self._parse_maps(elem, path_prefix)
-                elif elem.tag == "Meshes":
-                    futures.append(pool.submit(self._parse_meshes, elem, path_prefix))
+        #Submit the auxiliary meshes first, so they are read while the maps are imported
+        for elem in root:
+            if elem.tag == "Meshes":
+                self._parse_meshes(elem, path_prefix, cache, storage, lazy, context, load_stats)
 
-            [res.result() for res in futures]
+        for elem in root:
+            if elem.tag == "Maps":
+                self._parse_maps(elem, path_prefix, cache, storage, lazy, load_point_details, context, point_converter, load_stats)
 
-    def _from_zip(self, zip_fname : str, study_name : str = None):
-        """Loads the study from a zipped file by extracting it first and then calling :meth:`._from_dir`
+        if lazy or load_stats is None:
+            self.aux_meshes = [m if lazy else m.result() for m in self.aux_meshes]
+        else:
+            self.aux_meshes = [m.result() for m in self.aux_meshes]
+            for aux_mesh_i, (aux_mesh, wall_time, cpu_time) in enumerate(self.aux_meshes):
+                load_stats.add("aux_mesh", wall_time, cpu_time, bytes_read=convert_to_storage(storage).stat(aux_mesh.mesh_path)[0], items=1, mesh=aux_mesh.name)
+                self.aux_meshes[aux_mesh_i] = aux_mesh
+
+    def _from_zip(self, zip_fname : str, study_name : str = None, cache : ParseCache = None, lazy : bool = False, load_point_details : bool = True,
+                    context : ExecutionContext = None, point_converter : Callable = None, load_stats : LoadStats = None):
+        """Loads the study from a zipped file by calling :meth:`._from_dir` on the contents of the archive.
+        The files are directly read from the archive (see :class:`cartoreader_lite.low_level.storage.ZipStorage`), without extracting it.
 
         Parameters
         ----------
@@ -223,14 +545,26 @@ class CartoLLStudy:
         study_name : str, optional
             The name of the XML study inside the zip file. Can also contain sub-folder paths.
             Will default to the name of the zip file.
+        cache : ParseCache, optional
+            Cache of previously parsed files, by default None
+        lazy : bool, optional
+            If true, maps and meshes will only be loaded on first access, by default False
+        load_point_details : bool, optional
+            If false, only the metadata of the points will be read, by default True
+        context : ExecutionContext, optional
+            Execution context used for reading, by default a process pool that is shut down afterwards
+        point_converter : Callable, optional
+            Function converting the points while they are read, see :class:`CartoLLMap`. By default None
+        load_stats : LoadStats, optional
+            Report recording the loading stages, see :class:`cartoreader_lite.low_level.stats.LoadStats`. By default None
         """
-        with tempfile.TemporaryDirectory() as tmp_dir_name:
-            with zipfile.ZipFile(zip_fname, "r") as zip_f:
-                zip_f.extractall(tmp_dir_name)
+        if study_name is None:
+            study_name = os.path.splitext(os.path.basename(zip_fname))[0]
 
-            self._from_dir(tmp_dir_name, study_name)
+        self._from_dir("", study_name, cache, ZipStorage(zip_fname), lazy, load_point_details, context, point_converter, load_stats)
 
-    def _from_dir(self, dir_name : str, study_name : str = None):
+    def _from_dir(self, dir_name : str, study_name : str = None, cache : ParseCache = None, storage : DirectoryStorage = None, lazy : bool = False,
+                    load_point_details : bool = True, context : ExecutionContext = None, point_converter : Callable = None, load_stats : LoadStats = None):
         """Loads the study from a directory file
 
         Parameters
@@ -240,6 +574,20 @@ class CartoLLStudy:
         study_name : str, optional
             The name of the XML study inside the zip file.
             Will default to the name of the bottom-most directory.
+        cache : ParseCache, optional
+            Cache of previously parsed files, by default None
+        storage : DirectoryStorage, optional
+            Storage to read the files from, by default the local file system
+        lazy : bool, optional
+            If true, maps, meshes and VisiTag data will only be loaded on first access, by default False
+        load_point_details : bool, optional
+            If false, only the metadata of the points will be read, by default True
+        context : ExecutionContext, optional
+            Execution context used for reading, by default a process pool that is shut down afterwards
+        point_converter : Callable, optional
+            Function converting the points while they are read, see :class:`CartoLLMap`. By default None
+        load_stats : LoadStats, optional
+            Report recording the loading stages, see :class:`cartoreader_lite.low_level.stats.LoadStats`. By default None
         """
         if study_name is None:
             study_name = os.path.basename(os.path.normpath(dir_name))
@@ -250,20 +598,36 @@ class CartoLLStudy:
         #Move any folder directives from the study name to the dir name
         dir_name = os.path.join(dir_name, os.path.split(study_name)[0])
         study_name = os.path.split(study_name)[1]
+        self.storage = storage
 
         self.aux_meshes = []        
         full_fname = os.path.join(dir_name, study_name)
         # Pass the path of the xml document 
-        study_xml = ET.parse(full_fname) 
-        self._read_xml(study_xml, dir_name)
+        with load_stage(load_stats, "study_xml") as stage, convert_to_storage(storage).open(full_fname, "rb") as study_f:
+            study_xml = ET.parse(study_f) 
+            stage.update(bytes_read=convert_to_storage(storage).stat(full_fname)[0], items=1)
+        self._read_xml(study_xml, dir_name, cache, storage, lazy, load_point_details, context, point_converter, load_stats)
         #study_root = study_xml.getroot()
-        self.visitag_data = read_visitag_dir(os.path.join(dir_name, "VisiTagExport"))
+        with load_stage(load_stats, "visitag_dir") as stage:
+            self.visitag_data = read_visitag_dir(os.path.join(dir_name, "VisiTagExport"), cache, storage) #Files are parsed on first access
+            stage.update(items=len(self.visitag_data))
 
-    def __init__(self, arg1 : str, arg2 : str = None) -> None:
+    def __init__(self, arg1 : str, arg2 : str = None, cache : Union[ParseCache, str, PathLike] = None, lazy : bool = False,
+                 load_point_details : bool = True, context : Union[ExecutionContext, str] = None, point_converter : Callable = None,
+                 load_stats : Union[LoadStats, Callable, bool] = None) -> None:
         assert issubclass(type(arg1), str), "Given arguments not (yet) supported"
-        if os.path.isdir(arg1):
-            self._from_dir(arg1, arg2)
-        elif os.path.isfile(arg1) and arg1.endswith(".zip"): #Possible second argument: study name
-            self._from_zip(arg1, arg2)
-        else:
-            assert False, "Given arguments not (yet) supported, or the study file/folder was not found."
+        cache = convert_to_cache(cache)
+        self.load_stats = load_stats = convert_to_stats(load_stats)
+        with temporary_context(context) as context, load_stage(load_stats, "study", study=arg1) as stage:
+            if os.path.isdir(arg1):
+                self._from_dir(arg1, arg2, cache, lazy=lazy, load_point_details=load_point_details, context=context, point_converter=point_converter, load_stats=load_stats)
+            elif os.path.isfile(arg1) and arg1.endswith(".zip"): #Possible second argument: study name
+                self._from_zip(arg1, arg2, cache, lazy, load_point_details, context, point_converter, load_stats)
+            else:
+                assert False, "Given arguments not (yet) supported, or the study file/folder was not found."
+            stage.update(items=len(self.maps))
+
+        if not lazy: #Files read later on (e.g. the VisiTag files) re-open the zip archive
+            convert_to_storage(self.storage).close()
+        if cache is not None:
+            cache.evict()
@@ -1,21 +1,29 @@
 """Utility functions to more easily read and write the CARTO3 files on a low level.
 """
 
-from typing import Iterable, List, Dict, Tuple, IO, Union
+from typing import Any, Callable, Iterable, List, Dict, Tuple, IO, Union
 import pandas as pd
 import xml.etree.ElementTree as ET 
 from xml.etree.ElementTree import Element
 import os
 from collections import defaultdict
+import heapq
 import re
+import logging as log
+import mmap
+import sys
+from io import StringIO
 from os import PathLike
 import numpy as np
-from scipy.interpolate import interp1d
+import pyvista as pv
+from scipy.interpolate import interp1d, make_interp_spline
 from scipy.spatial import cKDTree
+from .cache import ParseCache
+from .storage import DirectoryStorage, convert_to_storage
 
 multi_whitespace_re = re.compile(r"\s\s+")
 
-def read_connectors(xml_elem : Element, path_prefix : str) -> Dict[str, List[pd.DataFrame]]:
+def read_connectors(xml_elem : Element, path_prefix : str, storage : DirectoryStorage = None) -> Dict[str, List[pd.DataFrame]]:
     """Reads connector data from the main XML element, pointing to multiple files with the attached connector data.
 
     Parameters
@@ -24,6 +32,8 @@ def read_connectors(xml_elem : Element, path_prefix : str) -> Dict[str, List[pd.
         The XML Connector element where the data will be found
     path_prefix : str
         The path prefix where to search for the connector files
+    storage : DirectoryStorage, optional
+        Storage to read the files from, by default the local file system
 
     Returns
     -------
@@ -36,20 +46,233 @@ def read_connectors(xml_elem : Element, path_prefix : str) -> Dict[str, List[pd.
         assert len(connector.attrib.keys()) == 1, f"More than one attribute found for connector: {connector.attrib:s}"
         k, fname = list(connector.items())[0]
         full_fname = os.path.join(path_prefix, fname)
-        with open(full_fname, "r") as f:
+        with convert_to_storage(storage).open(full_fname, "r") as f:
             metadata = (os.path.splitext(fname)[0], f.readline().strip())
             connectors[k].append((metadata, pd.read_csv(f, sep="\s+"))) #skiprows=1))) #Not necessary to skiprows if we don't seek to the beginning
 
     return dict(connectors)
 
-def read_contact_force(fname : str) -> pd.DataFrame:
-    with open(fname, "r") as f:
+def read_contact_force(fname : str, storage : DirectoryStorage = None) -> pd.DataFrame:
+    with convert_to_storage(storage).open(fname, "r") as f:
         metadata = [f.readline().strip() for i in range(7)]
         data = pd.read_csv(f, sep="\s+")
 
     return metadata, data
 
-def read_point_data(map_name : str, point_id : int, path_prefix : str = None) -> Tuple[Dict, Dict]:
+def read_ecg_header(f : IO) -> Tuple[List[str], List[str]]:
+    """Reads the header of an :term:`ECG` export file, leaving the file handle at the start of the numeric body
+
+    Parameters
+    ----------
+    f : IO
+        Handle of the ECG export file, opened in text mode
+
+    Returns
+    -------
+    Tuple[List[str], List[str]]
+        The three metadata lines (export version, gain and mapping channels) and the channel names
+    """
+    ecg_metadata = [f.readline().strip() for i in range(3)]
+    ecg_header = f.readline()
+    ecg_header = [elem for elem in re.split(multi_whitespace_re, ecg_header) if len(elem) > 0] #Two or more whitespaces as delimiters
+    return ecg_metadata, ecg_header
+
+def decode_ecg_bodies(bodies : List[str], nr_channels : List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Decodes the numeric bodies of multiple :term:`ECG` export files at once into a single np.int16 array, without going through pandas.
+    Each body is expected to be a whitespace separated integer matrix with one row per line and the given number of columns.
+
+    Parameters
+    ----------
+    bodies : List[str]
+        The numeric bodies of the files, excluding the header
+    nr_channels : List[int]
+        Number of channels (columns) of each body
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The flattened values of all bodies in the given order, along with the number of samples (rows) of each body
+
+    Raises
+    ------
+    ValueError
+        If the bodies do not follow the expected layout or exceed the np.int16 range. :func:`read_ecg_files` will use pandas in this case instead.
+    """
+    int16_info = np.iinfo(np.int16)
+    nr_samples = np.zeros(len(bodies), dtype=np.int64)
+    values = []
+    for body_i, (body, body_channels) in enumerate(zip(bodies, nr_channels)):
+        body = body.strip()
+        nr_samples[body_i] = body.count("\n") + 1 if len(body) > 0 else 0
+        body_values = np.fromstring(body, dtype=np.int32, sep=" ") #Parses until the first non-numeric entry
+        if body_values.size != nr_samples[body_i] * body_channels:
+            raise ValueError("Number of decoded values does not match the number of lines and channels")
+
+        if body_values.size > 0 and (body_values.min() < int16_info.min or body_values.max() > int16_info.max):
+            raise ValueError("ECG values exceed the range of np.int16")
+
+        values.append(body_values.astype(np.int16))
+
+    return (np.concatenate(values) if len(values) > 0 else np.zeros(0, dtype=np.int16)), nr_samples
+
+def read_ecg_files(fnames : Iterable[str], storage : DirectoryStorage = None, engine : str = "numpy") -> Tuple[List[List[str]], List[List[str]], np.ndarray, np.ndarray]:
+    """Reads multiple :term:`ECG` export files, decoding all numeric data in a single call.
+
+    Parameters
+    ----------
+    fnames : Iterable[str]
+        File names of the ECG export files
+    storage : DirectoryStorage, optional
+        Storage to read the files from, by default the local file system
+    engine : str, optional
+        The parser used for the numeric data. Can be one of
+
+            * numpy: Decodes the data of all files directly into a single np.int16 array (see :func:`decode_ecg_bodies`).
+              If this fails, the files will be parsed separately using pandas instead.
+            * pandas: Parses each file using :func:`pandas.read_csv`
+
+        By default "numpy"
+
+    Returns
+    -------
+    Tuple[List[List[str]], List[List[str]], np.ndarray, np.ndarray]
+        The metadata lines and channel names of each file, the flattened np.int16 values of all files and the number of samples of each file.
+        The values of each file have the shape [nr_samples, nr_channels].
+    """
+    assert engine in ["numpy", "pandas"], f"Unknown engine {engine}"
+    storage = convert_to_storage(storage)
+    ecg_metadata, ecg_headers, bodies = [], [], []
+    for fname in fnames:
+        with storage.open(fname, "r") as ecg_f:
+            metadata, header = read_ecg_header(ecg_f)
+            ecg_metadata.append(metadata)
+            ecg_headers.append(header)
+            bodies.append(ecg_f.read())
+
+    if engine == "numpy":
+        try:
+            values, nr_samples = decode_ecg_bodies(bodies, [len(header) for header in ecg_headers])
+            return ecg_metadata, ecg_headers, values, nr_samples
+        except ValueError as err:
+            log.info(f"Could not directly decode the ECG files, falling back to pandas. Original error: {err}")
+
+    ecg_data = [pd.read_csv(StringIO(body), header=None, sep=r"\s+", names=header, dtype=np.int16) for body, header in zip(bodies, ecg_headers)]
+    values = np.concatenate([data.to_numpy(dtype=np.int16).ravel() for data in ecg_data]) if len(ecg_data) > 0 else np.zeros(0, dtype=np.int16)
+    return ecg_metadata, [list(data.columns) for data in ecg_data], values, np.array([len(data) for data in ecg_data], dtype=np.int64)
+
+def read_ecg_file(fname : str, storage : DirectoryStorage = None, engine : str = "numpy") -> Tuple[List[str], pd.DataFrame]:
+    """Reads a single :term:`ECG` export file, see :func:`read_ecg_files`
+
+    Returns
+    -------
+    Tuple[List[str], pd.DataFrame]
+        The metadata lines of the file and the np.int16 ECG data with one column per channel
+    """
+    (ecg_metadata,), (ecg_header,), values, nr_samples = read_ecg_files([fname], storage, engine)
+    return ecg_metadata, pd.DataFrame(values.reshape([nr_samples[0], -1]), columns=ecg_header, copy=False)
+
+def point_export_fname(map_name : str, point_id : int, path_prefix : str = None) -> str:
+    """Returns the name of the point export XML file for the given map and point ID
+
+    Parameters
+    ----------
+    map_name : str
+        Name of the map
+    point_id : int
+        Point ID
+    path_prefix : str, optional
+        Path prefix used while looking for files. 
+        Will default to the current directory
+
+    Returns
+    -------
+    str
+        Name of the XML file
+    """
+    #e.g. 1-1-ReLA_P1380_Point_Export.xml
+    xml_fname = f"{map_name:s}_P{point_id:d}_Point_Export.xml"
+    if path_prefix is not None:
+        xml_fname = os.path.join(path_prefix, xml_fname)
+
+    return xml_fname
+
+def point_data_fnames(map_name : str, point_id : int, path_prefix : str = None, storage : DirectoryStorage = None) -> List[str]:
+    """Lists all files that are read by :func:`read_point_data` for the given map and point ID
+
+    Parameters
+    ----------
+    map_name : str
+        Name of the map
+    point_id : int
+        Point ID
+    path_prefix : str, optional
+        Path prefix used while looking for files. 
+        Will default to the current directory
+    storage : DirectoryStorage, optional
+        Storage to read the files from, by default the local file system
+
+    Returns
+    -------
+    List[str]
+        The point export XML file, followed by all data files referenced in it
+    """
+    xml_fname = point_export_fname(map_name, point_id, path_prefix)
+    fnames = [xml_fname]
+    with convert_to_storage(storage).open(xml_fname, "rb") as xml_f:
+        xml_root = ET.parse(xml_f).getroot()
+
+    for elem in xml_root:
+        if elem.tag == "Positions":
+            fnames += [os.path.join(path_prefix, fname) for connector in elem for fname in connector.attrib.values()]
+        elif elem.tag in ["ECG", "ContactForce"]:
+            fnames.append(os.path.join(path_prefix, elem.attrib["FileName"]))
+
+    return fnames
+
+def read_point_metadata(map_name : str, point_id : int, path_prefix : str = None, cache : ParseCache = None, storage : DirectoryStorage = None) -> Tuple[Dict, List[str]]:
+    """Reads only the metadata of a point from its export XML file, without reading any of the referenced data files (:term:`ECG`, connectors, contact force).
+    Can be used to later read the data on demand with :func:`read_point_data`.
+
+    Parameters
+    ----------
+    map_name : str
+        Name of the map
+    point_id : int
+        Point ID to read
+    path_prefix : str, optional
+        Path prefix used while looking for files. 
+        Will default to the current directory
+    cache : ParseCache, optional
+        If given, the metadata will be taken from the cache, if it was previously parsed from the same file.
+        By default None
+    storage : DirectoryStorage, optional
+        Storage to read the files from, by default the local file system
+
+    Returns
+    -------
+    Tuple[Dict, List[str]]
+        A tuple containing the dictionary of metadata (same as returned by :func:`read_point_data`) and the names of the recorded connectors
+    """
+    point_id = int(point_id)
+    xml_fname = point_export_fname(map_name, point_id, path_prefix)
+    if cache is not None:
+        return cache.cached_call([xml_fname], read_point_metadata, map_name, point_id, path_prefix, storage=storage)
+
+    with convert_to_storage(storage).open(xml_fname, "rb") as xml_f:
+        xml_root = ET.parse(xml_f).getroot()
+
+    metadata = {}
+    connectors = []
+    for elem in xml_root:
+        if elem.tag == "Positions":
+            connectors = list(dict.fromkeys([list(connector.attrib.keys())[0] for connector in elem])) #Unique names in the order of the connectors
+        elif elem.tag not in ["ECG", "ContactForce"]:
+            metadata[elem.tag] = xml_elem_to_dict(elem)
+
+    return metadata, connectors
+
+def read_point_data(map_name : str, point_id : int, path_prefix : str = None, cache : ParseCache = None, storage : DirectoryStorage = None,
+                    read_ecg : bool = True) -> Tuple[Dict, Dict]:
     """Reads all the available point data for given map and point ID, along with its metadata.
 
     Parameters
@@ -61,45 +284,233 @@ def read_point_data(map_name : str, point_id : int, path_prefix : str = None) ->
     path_prefix : str, optional
         Path prefix used while looking for files. 
         Will default to the current directory
+    cache : ParseCache, optional
+        If given, the point data will be taken from the cache, if it was previously parsed from the same files.
+        By default None
+    storage : DirectoryStorage, optional
+        Storage to read the files from, e.g. a :class:`cartoreader_lite.low_level.storage.ZipStorage`.
+        By default the local file system
+    read_ecg : bool, optional
+        If false, the :term:`ECG` file will not be read and its file name will be returned instead of the ECG data.
+        Used to decode the ECGs of multiple points at once (see :func:`read_point_data_batch`). By default True
 
     Returns
     -------
     Tuple[Dict, Dict]
         A tuple containing both a dictionary of metadata and the actual data
     """
+    point_id = int(point_id)
+    if cache is not None:
+        return cache.cached_call(point_data_fnames(map_name, point_id, path_prefix, storage), read_point_data, map_name, point_id, path_prefix, storage=storage, read_ecg=read_ecg)
 
-    #e.g. 1-1-ReLA_P1380_Point_Export.xml
     #print(f"Reading point {point_id}")
-    xml_fname = f"{map_name:s}_P{point_id:d}_Point_Export.xml"
-    if path_prefix is not None:
-        xml_fname = os.path.join(path_prefix, xml_fname)
+    storage = convert_to_storage(storage)
+    xml_fname = point_export_fname(map_name, point_id, path_prefix)
 
-    point_xml = ET.parse(xml_fname)
+    with storage.open(xml_fname, "rb") as xml_f:
+        point_xml = ET.parse(xml_f)
     xml_root = point_xml.getroot()
     
     metadata = {}
     data = {}
     for elem in xml_root:
         if elem.tag == "Positions":
-            data["connector_data"] = read_connectors(elem, path_prefix)
+            data["connector_data"] = read_connectors(elem, path_prefix, storage)
         elif elem.tag == "ECG":
-            #ecg_metadata = 
             ecg_fname = os.path.join(path_prefix, elem.attrib["FileName"])
-            with open(ecg_fname, "r") as ecg_f:
-                ecg_metadata = [ecg_f.readline().strip() for i in range(3)]
-                ecg_header = ecg_f.readline()
-                ecg_header = [elem for elem in re.split(multi_whitespace_re, ecg_header) if len(elem) > 0] #Two or more whitespaces as delimiters
-                #ecg_f.seek(0)
-                ecg_data = pd.read_csv(ecg_f, #skiprows=4, #Not necessary if we don't seek to the beginning
-                                        header=None, sep="\s+", names=ecg_header, dtype=np.int16)
-            data["ecg"] = (ecg_metadata, ecg_data) 
+            data["ecg"] = read_ecg_file(ecg_fname, storage) if read_ecg else ecg_fname
         elif elem.tag == "ContactForce":
-            data["contact_force_data"] = read_contact_force(os.path.join(path_prefix, elem.attrib["FileName"]))
+            data["contact_force_data"] = read_contact_force(os.path.join(path_prefix, elem.attrib["FileName"]), storage)
         else:
             metadata[elem.tag] = xml_elem_to_dict(elem)
 
     return metadata, data
 
+def point_data_sizes(map_name : str, point_ids : Iterable[int], path_prefix : str = None, storage : DirectoryStorage = None) -> np.ndarray:
+    """Estimates the amount of data of each point by the total size of its files, without parsing any of them.
+    All files directly inside `path_prefix` starting with `<map_name>_P<point_id>_` will be counted. Only these files are accessed.
+
+    Parameters
+    ----------
+    map_name : str
+        Name of the map
+    point_ids : Iterable[int]
+        IDs of the points
+    path_prefix : str, optional
+        Path prefix used while looking for files. 
+        Will default to the current directory
+    storage : DirectoryStorage, optional
+        Storage to read the files from, by default the local file system
+
+    Returns
+    -------
+    np.ndarray
+        Size of the files of each point in bytes
+    """
+    storage = convert_to_storage(storage)
+    point_fname_re = re.compile(re.escape(map_name) + r"_P(\d+)_")
+    sizes = defaultdict(int)
+    for fname in storage.list_dir(path_prefix if path_prefix else "."): #Point files are never inside sub-directories, e.g. of the VisiTag files
+        match = point_fname_re.match(os.path.basename(fname))
+        if match is not None:
+            sizes[int(match.group(1))] += storage.stat(fname)[0]
+
+    return np.array([sizes[int(point_id)] for point_id in point_ids], dtype=np.int64)
+
+def balance_batches(sizes : np.ndarray, nr_batches : int) -> List[np.ndarray]:
+    """Splits the items into batches of similar total size.
+    Items are assigned largest first, each to the batch with the currently smallest total size.
+
+    Parameters
+    ----------
+    sizes : np.ndarray
+        Size of each item
+    nr_batches : int
+        Maximum number of batches to create
+
+    Returns
+    -------
+    List[np.ndarray]
+        Indices of the items in each non-empty batch (in ascending order). The batches are sorted by their total size, largest first.
+    """
+    assert nr_batches > 0, "At least one batch is required"
+    sizes = np.asarray(sizes)
+    batch_heap = [(0, batch_i) for batch_i in range(nr_batches)]
+    batches = [[] for _ in range(nr_batches)]
+    for item_i in np.argsort(-sizes, kind="stable"):
+        batch_size, batch_i = heapq.heappop(batch_heap)
+        batches[batch_i].append(item_i)
+        heapq.heappush(batch_heap, (batch_size + sizes[item_i], batch_i))
+
+    batches = [np.sort(np.array(batch, dtype=np.int64)) for batch in batches if len(batch) > 0]
+    return sorted(batches, key=lambda batch: -sizes[batch].sum())
+
+def read_point_data_batch(map_name : str, point_ids : Iterable[int], path_prefix : str = None, cache : ParseCache = None, storage : DirectoryStorage = None) -> Tuple[List[Tuple[Dict, Dict]], Dict[str, np.ndarray]]:
+    """Reads the data of multiple points (see :func:`read_point_data`) and consolidates all :term:`ECGs<ECG>` into a single buffer.
+    This reduces the overhead of transferring the data between processes. Use :func:`unpack_point_data_batch` to restore the data of the single points.
+
+    Parameters
+    ----------
+    map_name : str
+        Name of the map
+    point_ids : Iterable[int]
+        Point IDs to read
+    path_prefix : str, optional
+        Path prefix used while looking for files. 
+        Will default to the current directory
+    cache : ParseCache, optional
+        If given, the data of each point will be taken from the cache, if it was previously parsed from the same files.
+        By default None
+    storage : DirectoryStorage, optional
+        Storage to read the files from, by default the local file system
+
+    Returns
+    -------
+    Tuple[List[Tuple[Dict, Dict]], Dict[str, np.ndarray]]
+        The data of each point without the :term:`ECG` data, and the consolidated :term:`ECG` data with the keys
+
+            * values: Flattened values of all points
+            * offsets: Start, number of samples and number of channels of each point inside `values`
+            * header_inds: Index of the channel names of each point inside `headers`
+            * headers: Unique lists of channel names
+    """
+    if cache is None:
+        #Decode the ECGs of all points in a single call
+        points_data = [read_point_data(map_name, point_id, path_prefix, storage=storage, read_ecg=False) for point_id in point_ids]
+        ecg_point_inds = [point_i for point_i, (metadata, data) in enumerate(points_data) if "ecg" in data]
+        ecg_metadata, ecg_channels, values, nr_samples = read_ecg_files([points_data[point_i][1]["ecg"] for point_i in ecg_point_inds], storage)
+
+        ecg_offsets = np.zeros([len(points_data), 3], dtype=np.int64)
+        ecg_header_inds = np.full(len(points_data), -1, dtype=np.int64)
+        ecg_headers = {}
+        nr_channels = np.array([len(channels) for channels in ecg_channels], dtype=np.int64)
+        ecg_offsets[ecg_point_inds] = np.stack([np.cumsum(nr_samples * nr_channels) - nr_samples * nr_channels, nr_samples, nr_channels], axis=-1).reshape([-1, 3])
+        for point_i, metadata, channels in zip(ecg_point_inds, ecg_metadata, ecg_channels):
+            ecg_header_inds[point_i] = ecg_headers.setdefault(tuple(channels), len(ecg_headers))
+            points_data[point_i][1]["ecg"] = (metadata, None)
+
+        ecg_batch = {"values": values, "offsets": ecg_offsets, "header_inds": ecg_header_inds, "headers": [list(header) for header in ecg_headers]}
+        return points_data, ecg_batch
+
+    points_data = [read_point_data(map_name, point_id, path_prefix, cache, storage) for point_id in point_ids]
+
+    ecg_values = []
+    ecg_offsets = np.zeros([len(points_data), 3], dtype=np.int64)
+    ecg_header_inds = np.full(len(points_data), -1, dtype=np.int64)
+    ecg_headers = {}
+    offset = 0
+    for point_i, (metadata, data) in enumerate(points_data):
+        if "ecg" not in data:
+            continue
+
+        ecg_metadata, ecg_data = data["ecg"]
+        values = ecg_data.to_numpy(dtype=np.int16)
+        ecg_values.append(values.ravel())
+        ecg_offsets[point_i] = [offset, values.shape[0], values.shape[1]]
+        ecg_header_inds[point_i] = ecg_headers.setdefault(tuple(ecg_data.columns), len(ecg_headers))
+        offset += values.size
+        data["ecg"] = (ecg_metadata, None)
+
+    ecg_batch = {"values": np.concatenate(ecg_values) if len(ecg_values) > 0 else np.zeros(0, dtype=np.int16),
+                 "offsets": ecg_offsets, "header_inds": ecg_header_inds, "headers": [list(header) for header in ecg_headers]}
+    return points_data, ecg_batch
+
+def unpack_point_data_batch(points_data : List[Tuple[Dict, Dict]], ecg_batch : Dict[str, np.ndarray]) -> List[Tuple[Dict, Dict]]:
+    """Restores the data of the single points, as returned by :func:`read_point_data`, from the result of :func:`read_point_data_batch`.
+    The :term:`ECG` DataFrames of the points will be views into the consolidated buffer.
+
+    Parameters
+    ----------
+    points_data : List[Tuple[Dict, Dict]]
+        The data of each point without the :term:`ECG` data
+    ecg_batch : Dict[str, np.ndarray]
+        The consolidated :term:`ECG` data
+
+    Returns
+    -------
+    List[Tuple[Dict, Dict]]
+        The complete data of each point
+    """
+    for (metadata, data), (start, nr_samples, nr_channels), header_i in zip(points_data, ecg_batch["offsets"], ecg_batch["header_inds"]):
+        if header_i < 0:
+            continue
+
+        values = ecg_batch["values"][start:start + nr_samples * nr_channels].reshape([nr_samples, nr_channels])
+        data["ecg"] = (data["ecg"][0], pd.DataFrame(values, columns=ecg_batch["headers"][header_i], copy=False))
+
+    return points_data
+
+def read_converted_point_batch(point_converter : Callable, map_name : str, main_data : pd.DataFrame, path_prefix : str = None, cache : ParseCache = None,
+                               storage : DirectoryStorage = None) -> List:
+    """Reads the data of multiple points (see :func:`read_point_data_batch`) and converts each point right away, inside the same worker.
+    Only the converted points need to be transferred back, instead of the raw data of each point.
+
+    Parameters
+    ----------
+    point_converter : Callable
+        Picklable function called with the row of each point in `main_data` and its data (see :func:`read_point_data`), 
+        e.g. :class:`cartoreader_lite.high_level.study.CartoPointDetailData`
+    map_name : str
+        Name of the map
+    main_data : pd.DataFrame
+        Rows of the points to read from the points table of the map, holding at least the column `Id`
+    path_prefix : str, optional
+        Path prefix used while looking for files. 
+        Will default to the current directory
+    cache : ParseCache, optional
+        If given, the data of each point will be taken from the cache, if it was previously parsed from the same files.
+        By default None
+    storage : DirectoryStorage, optional
+        Storage to read the files from, by default the local file system
+
+    Returns
+    -------
+    List
+        The converted points
+    """
+    points_data = unpack_point_data_batch(*read_point_data_batch(map_name, main_data["Id"].to_numpy(), path_prefix, cache, storage))
+    return [point_converter(row, point_data) for (row_i, row), point_data in zip(main_data.iterrows(), points_data)]
+
 def convert_df_dtypes(df : pd.DataFrame, inplace=True) -> pd.DataFrame:
     if not inplace:
         df = df.copy()
@@ -176,19 +587,113 @@ def interp1d_dtype(x : np.ndarray, y : np.ndarray, *args, **kwargs):
 
     return interp_f 
 
-def interpolate_time_data(dfs : Iterable[pd.DataFrame], time_k, time_steps, **interp_kwargs) -> pd.DataFrame:
-    interp_fs = []
-    for df in dfs:
-        interp_fs.append({})
-        for col_i, col_name in enumerate(df):
-            #series = df.iloc[:, col_i]
+interp_spline_orders = {"quadratic": 2, "cubic": 3}
+
+def resample_time_columns(df : pd.DataFrame, time_k : str, time_steps : np.ndarray, kind : str = "linear") -> Dict[str, np.ndarray]:
+    """Resamples all columns of the DataFrame at the given time steps.
+    The samples bracketing each time step are searched only once for all columns. Numeric columns are interpolated together as a single 2D array,
+    all other columns (e.g. strings) take the value of the nearest sample. Results are equivalent to :func:`interp1d_dtype` applied to each column.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The time series to resample
+    time_k : str
+        Name of the time column
+    time_steps : np.ndarray
+        Time steps to resample at. Need to be inside the time range of the DataFrame.
+    kind : str, optional
+        Interpolation of the numeric columns, see :class:`scipy.interpolate.interp1d`.
+        One of "linear", "slinear", "nearest", "previous", "zero", "next", "quadratic" or "cubic". By default "linear"
 
-            interp_fs[-1][col_name] = interp1d_dtype(df[time_k].to_numpy(), df.iloc[:, col_i].to_numpy(), **interp_kwargs)
-            #if series.dtype == np.object0:
-            #    kdtree = cKDTree(df[time_k].to_numpy()[:, np.newaxis])
-            #    interp_fs[-1][col_name] = lambda x: df.iloc[kdtree.query(x[:, np.newaxis])[1], col_i]
-            #else:
-            #    interp_fs[-1][col_name] = interp1d(df[time_k], df.iloc[:, col_i], **interp_kwargs)
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        The resampled values of all columns except the time column. Integer columns are rounded back to their dtype.
+
+    Raises
+    ------
+    ValueError
+        If a time step is outside the time range of the DataFrame
+    """
+    assert kind in ["linear", "slinear", "nearest", "previous", "zero", "next"] + list(interp_spline_orders.keys()), f"Unknown kind {kind}"
+    x = df[time_k].to_numpy(dtype=np.float64)
+    order = None if np.all(x[1:] >= x[:-1]) else np.argsort(x, kind="stable")
+    x = x if order is None else x[order]
+    t = np.asarray(time_steps, dtype=np.float64)
+    if x.size == 0 or (t.size > 0 and (t.min() < x[0] or t.max() > x[-1])):
+        raise ValueError("A value in time_steps is out of the interpolation range")
+
+    #Bracketing samples of all time steps, shared by all columns
+    lower_i = np.clip(np.searchsorted(x, t, side="right") - 1, 0, max(x.size - 2, 0))
+    upper_i = np.minimum(lower_i + 1, x.size - 1)
+    nearest_i = np.where(t - x[lower_i] <= x[upper_i] - t, lower_i, upper_i) #Ties take the earlier sample
+    if kind in ["previous", "zero"]:
+        index_i = np.where(x[upper_i] <= t, upper_i, lower_i)
+    elif kind == "next":
+        index_i = np.where(x[lower_i] >= t, lower_i, upper_i)
+    else:
+        index_i = nearest_i
+
+    columns = [col_name for col_name in df if col_name != time_k]
+    numeric_columns = [col_name for col_name in columns if df[col_name].dtype.kind in "biuf"]
+    resampled = {}
+    if len(numeric_columns) > 0:
+        values = df[numeric_columns].to_numpy(dtype=np.float64)
+        values = values if order is None else values[order]
+        if kind in ["linear", "slinear"]:
+            dx = x[upper_i] - x[lower_i]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                slope = np.where((dx > 0)[:, np.newaxis], (values[upper_i] - values[lower_i]) / dx[:, np.newaxis], 0.)
+            values_t = slope * (t - x[lower_i])[:, np.newaxis] + values[lower_i]
+        elif kind in interp_spline_orders:
+            #Splines are global, so a single spline is fitted to all columns at once. Columns holding NaNs result in NaNs only (as in interp1d)
+            nan_columns = np.any(np.isnan(values), axis=0)
+            values[:, nan_columns] = 0
+            values_t = make_interp_spline(x, values, k=interp_spline_orders[kind], axis=0, check_finite=False)(t)
+            values_t[:, nan_columns] = np.nan
+        else:
+            values_t = values[index_i]
+
+        for col_i, col_name in enumerate(numeric_columns):
+            dtype = df[col_name].dtype
+            resampled[col_name] = np.round(values_t[:, col_i]).astype(dtype) if np.issubdtype(dtype, np.integer) else values_t[:, col_i]
+
+    for col_name in columns:
+        if col_name not in resampled:
+            col_values = df[col_name].to_numpy()
+            resampled[col_name] = (col_values if order is None else col_values[order])[nearest_i]
+
+    return {col_name: resampled[col_name] for col_name in columns}
+
+def interpolate_time_data(dfs : Iterable[pd.DataFrame], time_k, time_steps, engine : str = "vectorized", **interp_kwargs) -> pd.DataFrame:
+    """Resamples multiple time series at the given time steps and merges them into a single DataFrame
+
+    Parameters
+    ----------
+    dfs : Iterable[pd.DataFrame]
+        The time series
+    time_k : str
+        Name of the time column, present in all time series
+    time_steps : np.ndarray
+        The time steps to resample at
+    engine : str, optional
+        Either "vectorized" to resample all columns of a time series at once (see :func:`resample_time_columns`),
+        or "interp1d" to create a separate :class:`scipy.interpolate.interp1d` for each column (see :func:`interp1d_dtype`). By default "vectorized"
+    interp_kwargs
+        Passed to the interpolation, e.g. `kind`. The vectorized engine only supports `kind`.
+
+    Returns
+    -------
+    pd.DataFrame
+        The merged time series, starting with the time column
+    """
+    assert engine in ["vectorized", "interp1d"], f"Unknown engine {engine}"
+    if engine == "vectorized":
+        resampled = [resample_time_columns(df, time_k, time_steps, **interp_kwargs) for df in dfs]
+    else:
+        resampled = [{col_name: interp1d_dtype(df[time_k].to_numpy(), df.iloc[:, col_i].to_numpy(), **interp_kwargs)(time_steps)
+                        for col_i, col_name in enumerate(df) if col_name != time_k} for df in dfs]
 
     #Build the unique columns
     all_columns = np.concatenate([df.columns for df in dfs])
@@ -196,9 +701,9 @@ def interpolate_time_data(dfs : Iterable[pd.DataFrame], time_k, time_steps, **in
     unique_columns = np.concatenate([[time_k], np.setdiff1d(np.unique(all_columns), [time_k])])
     new_df_dict = {time_k: time_steps}
     for col_i, col_name in enumerate(unique_columns[1:]): #First column is the timing key
-        for df, df_interp in zip(dfs, interp_fs):
-            if col_name in df_interp:
-                interpolated_val = df_interp[col_name](time_steps)
+        for df_resampled in resampled:
+            if col_name in df_resampled:
+                interpolated_val = df_resampled[col_name]
                 if col_name in new_df_dict: #Already present -> Multiple dataframes contain the data
                     assert not np.issubdtype(new_df_dict[col_name].dtype, np.number) or np.allclose(new_df_dict[col_name], interpolated_val, rtol=1e-1), \
                             f"Dataframe values of column {col_name} are not matching"
@@ -234,3 +739,123 @@ def xyz_to_pos_vec(data : pd.DataFrame, pos_label : str = "pos") -> pd.DataFrame
     data = data.drop(labels=xyz_strings[1:], axis=1)
     data["X"] = pos_vec
     return data.rename(columns={"X": pos_label})
+
+def column_vectors(data : pd.DataFrame, columns : List[str]) -> np.ndarray:
+    """Returns the given numeric columns as a single array with one row per row of the DataFrame, e.g. the positions [Nx3] from the columns `pos_x`, `pos_y` and `pos_z`.
+    Columns held by the same block of the DataFrame with equal spacing (e.g. created from a single array) are returned as a read-only view without copying.
+    All other columns are stacked into a new array.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        The DataFrame
+    columns : List[str]
+        Names of the columns, in the order of the returned components
+
+    Returns
+    -------
+    np.ndarray
+        The columns with the shape [len(data), len(columns)]
+    """
+    arrays = [data[k].to_numpy() for k in columns]
+    def root(array : np.ndarray) -> np.ndarray:
+        while isinstance(array.base, np.ndarray):
+            array = array.base
+        return array
+
+    first = arrays[0]
+    addresses = np.array([a.__array_interface__["data"][0] for a in arrays])
+    column_stride = addresses[1] - addresses[0] if len(arrays) > 1 else first.itemsize
+    if (all([a.dtype == first.dtype and a.strides == first.strides and root(a) is root(first) for a in arrays]) and first.dtype != object
+            and column_stride != 0 and np.all(np.diff(addresses) == column_stride)):
+        return np.lib.stride_tricks.as_strided(first, shape=(len(first), len(arrays)), strides=(first.strides[0], column_stride), writeable=False)
+
+    return np.stack(arrays, axis=-1)
+
+def memory_nbytes(obj : Any, deep : bool = False, seen : Dict = None) -> int:
+    """Estimates the memory held by an object in bytes. Arrays, DataFrames, meshes (see :func:`mesh_nbytes`) and the items of dicts, lists and tuples are followed.
+    Arrays sharing the same buffer (e.g. views) are counted once. Memory mapped arrays are not counted, since their pages are backed by the file.
+
+    Parameters
+    ----------
+    obj : Any
+        The object
+    deep : bool, optional
+        If true, the Python objects (e.g. strings, dicts and the elements of object arrays) are counted as well, similar to :meth:`pandas.DataFrame.memory_usage`.
+        Otherwise only the arrays, DataFrames and meshes are counted. By default False
+    seen : Dict, optional
+        Buffers and objects that were already counted and will be skipped. It will be updated with all counted objects, which are referenced until it is released.
+        Pass the same dict to multiple calls to count shared memory only once. By default None
+
+    Returns
+    -------
+    int
+        The estimated memory in bytes
+    """
+    seen = {} if seen is None else seen
+    if obj is None:
+        return 0
+
+    if isinstance(obj, np.ndarray):
+        chain = [obj]
+        while isinstance(chain[-1], np.ndarray) and chain[-1].base is not None:
+            chain.append(chain[-1].base)
+        if any([isinstance(base, (np.memmap, mmap.mmap)) for base in chain]):
+            return 0
+
+        root = [base for base in chain if isinstance(base, np.ndarray)][-1]
+        key = ("buffer", root.__array_interface__["data"][0])
+        nbytes = 0 if key in seen else root.nbytes
+        seen[key] = root
+        if deep and obj.dtype == object:
+            nbytes += sum([memory_nbytes(v, deep, seen) for v in obj.flat])
+        return nbytes
+
+    if ("object", id(obj)) in seen:
+        return 0
+    seen[("object", id(obj))] = obj #Keeps temporary objects alive, so that their id is not reused
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=deep).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=deep))
+    if isinstance(obj, pv.DataSet):
+        return sum(mesh_nbytes(obj, deep, seen).values())
+
+    nbytes = sys.getsizeof(obj) if deep else 0
+    if isinstance(obj, dict):
+        nbytes += sum([memory_nbytes(k, deep, seen) + memory_nbytes(v, deep, seen) for k, v in obj.items()])
+    elif isinstance(obj, (list, tuple)):
+        nbytes += sum([memory_nbytes(v, deep, seen) for v in obj])
+    return nbytes
+
+def mesh_nbytes(mesh : pv.DataSet, deep : bool = False, seen : Dict = None) -> Dict[str, int]:
+    """Estimates the memory held by a mesh, see :func:`memory_nbytes`
+
+    Parameters
+    ----------
+    mesh : pv.DataSet
+        The mesh
+    deep : bool, optional
+        If true, string arrays of the mesh data will be counted with their strings, by default False
+    seen : Dict, optional
+        Buffers already counted, see :func:`memory_nbytes`. By default None
+
+    Returns
+    -------
+    Dict[str, int]
+        Bytes held by the "points", the "cells" (connectivity, offsets and cell types) and the point, cell and field "data" arrays
+    """
+    seen = {} if seen is None else seen
+    data = sum([memory_nbytes(data_set[k], deep, seen) for data_set in [mesh.point_data, mesh.cell_data, mesh.field_data] for k in data_set.keys()])
+    points = memory_nbytes(mesh.points, deep, seen) if mesh.n_points > 0 else 0
+    if isinstance(mesh, pv.UnstructuredGrid):
+        cells = memory_nbytes(mesh.cell_connectivity, deep, seen) + memory_nbytes(mesh.celltypes, deep, seen)
+        offsets = mesh.GetCells().GetOffsetsArray()
+        if offsets.HasStandardMemoryLayout():
+            cells += memory_nbytes(pv.convert_array(offsets), deep, seen)
+        else: #Implicit arrays (e.g. offsets of equally sized cells) are not stored as buffer
+            cells += offsets.GetActualMemorySize() * 1024
+    else: #Estimated from the total size reported by VTK
+        cells = max(mesh.actual_memory_size * 1024 - points - data, 0)
+
+    return {"points": points, "cells": cells, "data": data}
@@ -1,19 +1,23 @@
-from concurrent.futures import ThreadPoolExecutor
-from pandas.errors import ParserError
-from typing import Dict, Iterable, List, Union, IO
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Union, IO
 import pandas as pd
 from os import PathLike
 import os
 import re
+import threading
 
 from cartoreader_lite.low_level.utils import convert_df_dtypes
+from cartoreader_lite.low_level.cache import ParseCache
+from cartoreader_lite.low_level.storage import DirectoryStorage, convert_to_storage
+from cartoreader_lite.low_level.execution import ExecutionContext, temporary_context
 
 visitag_misc_data_re_i = re.compile(r"^\s+(\w+)=\s+(-?\d+)")
 visitag_misc_data_re_f = re.compile(r"^\s+(\w+)=\s+(-?\d+\.\d+)")
 visitag_misc_data_re = re.compile(r"^\s+(\w+)=\s+(\w+)")
+visitag_settings_line_re = re.compile(r"^\s*\w+=")
 
-def parse_misc_visitag_data(file_h : Union[IO, PathLike]):
-    with open(file_h, "r") as f:
+def parse_misc_visitag_data(file_h : Union[IO, PathLike], storage : DirectoryStorage = None):
+    with convert_to_storage(storage).open(file_h, "r") as f:
         lines = f.readlines()
     data = {}
     for line in lines:
@@ -25,28 +29,174 @@ def parse_misc_visitag_data(file_h : Union[IO, PathLike]):
 
     return data
 
-def parse_visitag_file(file_h : Union[IO, PathLike], *args, **kwargs) -> Union[pd.DataFrame, Dict[str,str]]:
-    try:
+def visitag_file_type(fname : str, storage : DirectoryStorage = None, nr_lines : int = 16) -> str:
+    """Detects the type of a VisiTag export file from its first lines, without parsing the file
+
+    Parameters
+    ----------
+    fname : str
+        Name of the file
+    storage : DirectoryStorage, optional
+        Storage containing the file, by default the local file system
+    nr_lines : int, optional
+        Number of lines to inspect, by default 16
+
+    Returns
+    -------
+    str
+        Either "settings" for files holding `key= value` lines (e.g. VisiTagSettings.txt), or "table" for whitespace separated tables
+    """
+    with convert_to_storage(storage).open(fname, "r") as f:
+        for _, line in zip(range(nr_lines), f):
+            if visitag_settings_line_re.match(line):
+                return "settings"
+
+    return "table"
+
+def parse_visitag_file(file_h : Union[IO, PathLike], *args, storage : DirectoryStorage = None, **kwargs) -> Union[pd.DataFrame, Dict[str,str]]:
+    if visitag_file_type(file_h, storage) == "settings":
+        return parse_misc_visitag_data(file_h, storage)
+
+    if storage is None:
         return convert_df_dtypes(pd.read_csv(file_h, *args, **kwargs))
-    except ParserError as err:
-        return parse_misc_visitag_data(file_h)
 
-def parse_visitag_files(file_hs : Iterable[Union[IO, PathLike]]) -> List[pd.DataFrame]:
+    with storage.open(file_h, "r") as f:
+        return convert_df_dtypes(pd.read_csv(f, *args, **kwargs))
+
+def iter_visitag_file(fname : str, chunk_size : int = 2**16, storage : DirectoryStorage = None) -> Iterator[pd.DataFrame]:
+    """Iterates over a VisiTag table in chunks of rows, e.g. to process the large `AllPositionInGrids` files in bounded memory
+
+    Parameters
+    ----------
+    fname : str
+        Name of the file
+    chunk_size : int, optional
+        Number of rows per chunk, by default 65536
+    storage : DirectoryStorage, optional
+        Storage containing the file, by default the local file system
+
+    Yields
+    ------
+    pd.DataFrame
+        The consecutive chunks of the table
+    """
+    assert visitag_file_type(fname, storage) == "table", f"{fname} is not a VisiTag table"
+    with convert_to_storage(storage).open(fname, "r") as f:
+        with pd.read_csv(f, sep=r"\s+", chunksize=chunk_size) as reader:
+            for chunk in reader:
+                yield convert_df_dtypes(chunk)
+
+def parse_visitag_files(file_hs : Iterable[Union[IO, PathLike]], cache : ParseCache = None, storage : DirectoryStorage = None,
+                        context : ExecutionContext = None) -> List[pd.DataFrame]:
     data = []
-    with ThreadPoolExecutor() as pool:
+    with temporary_context(context, "thread") as context: #Threads by default, since file handles can not be passed to other processes
         for file_h in file_hs:
-            data.append(pool.submit(parse_visitag_file, file_h, sep="\s+"))
+            if cache is None:
+                data.append(context.submit(parse_visitag_file, file_h, sep=r"\s+", storage=storage))
+            else:
+                data.append(context.submit(cache.cached_call, [file_h], parse_visitag_file, file_h, sep=r"\s+", storage=storage))
+
+        return [d.result() for d in data]
+
+class VisiTagData(Mapping):
+    """Mapping of the VisiTag export files, by their name without ending, to their parsed content.
+    Files are only parsed on first access of their key and kept afterwards, so unused files (e.g. `AllPositionInGrids`) are never parsed.
+    Pickling the mapping keeps all parsed files, the remaining files stay unparsed.
+
+    Parameters
+    ----------
+    fnames : Dict[str, str]
+        Names of the files, by their key
+    cache : ParseCache, optional
+        Cache to store the parsed files, by default None
+    storage : DirectoryStorage, optional
+        Storage containing the files, by default the local file system
+    context : ExecutionContext, optional
+        Context used by :meth:`load` to parse several files at once, by default a temporary thread pool
+    """
+
+    fnames : Dict[str, str] #: Names of the files, by their key
+
+    def __init__(self, fnames : Dict[str, str], cache : ParseCache = None, storage : DirectoryStorage = None, context : ExecutionContext = None) -> None:
+        self.fnames = dict(fnames)
+        self.cache = cache
+        self.storage = storage
+        self.context = context
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def load(self, keys : Iterable[str] = None) -> Dict[str, Union[pd.DataFrame, Dict]]:
+        """Parses the given files in parallel, if they were not parsed yet
+
+        Parameters
+        ----------
+        keys : Iterable[str], optional
+            Keys of the files to parse, by default all files
+
+        Returns
+        -------
+        Dict[str, Union[pd.DataFrame, Dict]]
+            The parsed files by their key
+        """
+        keys = list(self.fnames.keys()) if keys is None else list(keys)
+        with self._lock:
+            missing_keys = [k for k in keys if k not in self._data]
+            data = [] if len(missing_keys) == 0 else parse_visitag_files([self.fnames[k] for k in missing_keys], self.cache, self.storage, self.context)
+            self._data.update(zip(missing_keys, data))
+            return {k: self._data[k] for k in keys}
+
+    def is_loaded(self, key : str) -> bool:
+        """Returns true if the file was already parsed
+        """
+        return key in self._data
+
+    def iter_chunks(self, key : str, chunk_size : int = 2**16) -> Iterator[pd.DataFrame]:
+        """Iterates over the table of the given key in chunks of rows, without parsing the complete file, see :func:`iter_visitag_file`
+        """
+        return iter_visitag_file(self.fnames[key], chunk_size, self.storage)
+
+    def __getitem__(self, key : str) -> Union[pd.DataFrame, Dict]:
+        if key not in self.fnames:
+            raise KeyError(key)
+        return self.load([key])[key]
+
+    def __contains__(self, key : str) -> bool:
+        return key in self.fnames #Does not parse the file
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.fnames)
+
+    def __len__(self) -> int:
+        return len(self.fnames)
+
+    def __getstate__(self) -> dict:
+        return {k: v for k, v in self.__dict__.items() if k != "_lock"}
+
+    def __setstate__(self, state : dict):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return "{" + ", ".join([f"{k!r}: " + ("<parsed>" if k in self._data else "<not parsed>") for k in self.fnames]) + "}"
 
-    return [d.result() for d in data]
+def read_visitag_dir(dir_path : str, cache : ParseCache = None, storage : DirectoryStorage = None, context : ExecutionContext = None) -> VisiTagData:
+    """Lists the VisiTag export files of the given directory. The files are parsed on first access, see :class:`VisiTagData`.
 
-def read_visitag_dir(dir_path : str) -> Dict[str, pd.DataFrame]:
-    #visitag_data = {}
-    visitag_fnames = []
-    for root, dirs, files in os.walk(dir_path):
-        for file in files:
-            if file.endswith(".txt"):
-                visitag_fnames.append(os.path.join(root, file))
+    Parameters
+    ----------
+    dir_path : str
+        The `VisiTagExport` directory
+    cache : ParseCache, optional
+        Cache to store the parsed files, by default None
+    storage : DirectoryStorage, optional
+        Storage containing the directory, by default the local file system
+    context : ExecutionContext, optional
+        Context used to parse several files at once, by default a temporary thread pool
 
-    data = parse_visitag_files(visitag_fnames)
-    visitag_data = {os.path.splitext(os.path.basename(file))[0]: d for file, d in zip(visitag_fnames, data)}
-    return visitag_data
\ No newline at end of file
+    Returns
+    -------
+    VisiTagData
+        Mapping of the file names without ending to their parsed content
+    """
+    visitag_fnames = [fname for fname in convert_to_storage(storage).list_files(dir_path) if fname.endswith(".txt")]
+    return VisiTagData({os.path.splitext(os.path.basename(file))[0]: file for file in visitag_fnames}, cache, storage, context)
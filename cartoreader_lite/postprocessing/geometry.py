@@ -3,35 +3,131 @@ import numpy as np
 import vtk
 import trimesh
 from trimesh.proximity import ProximityQuery
-from typing import Tuple, Union
+from typing import Dict, Tuple, Union
+from ..low_level.execution import ExecutionContext, temporary_context
+from ..low_level.utils import memory_nbytes
 
-def create_tri_mesh(mesh : pv.UnstructuredGrid) -> trimesh.Trimesh:
+def triangle_arrays(mesh : pv.UnstructuredGrid) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the vertices and triangles of a surface mesh.
+    Meshes consisting only of triangles (e.g. all CARTO3 meshes) are returned without copying, i.e. as views of the arrays of the mesh.
+    All other meshes are triangulated first. Note that consumers may still copy the vertices, e.g. trimesh converts vertices that are not float64 (see :func:`create_tri_mesh`).
+
+    Parameters
+    ----------
+    mesh : pv.UnstructuredGrid
+        The mesh
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The vertices [Nx3] and the vertex indices of the triangles [Mx3]
+    """
+    if mesh.n_cells > 0 and np.all(mesh.celltypes == vtk.VTK_TRIANGLE): #Fast path: The connectivity is already a contiguous list of triangles
+        return mesh.points, mesh.cell_connectivity.reshape([-1, 3])
+
+    mesh = mesh.triangulate()
+    assert vtk.VTK_TRIANGLE in mesh.cells_dict and len(mesh.cells_dict) == 1, "Triangulation of the mesh failed"
+    return mesh.points, mesh.cells_dict[vtk.VTK_TRIANGLE]
+
+def create_tri_mesh(mesh : pv.UnstructuredGrid, process : bool = True) -> trimesh.Trimesh:
     """Creates a Trimesh from an unstructured grid
 
     Parameters
     ----------
     mesh : pv.UnstructuredGrid
-        mesh to convert. Will be automatically triangulated
+        mesh to convert. Will be automatically triangulated.
+        If `process` is false, the faces of triangle meshes share their memory with the trimesh (see :func:`triangle_arrays`).
+        The vertices are only shared if they are float64, trimesh copies all other vertices (e.g. float32 points)
+    process : bool, optional
+        If true, trimesh will merge duplicate vertices, which copies the mesh. By default True
 
     Returns
     -------
     trimesh.Trimesh
         The converted trimesh
     """
-    mesh = mesh.triangulate()
-    assert vtk.VTK_TRIANGLE in mesh.cells_dict and len(mesh.cells_dict) == 1, "Triangulation of the mesh failed"
+    verts, faces = triangle_arrays(mesh)
+    return trimesh.Trimesh(verts, faces, process=process)
 
-    verts = mesh.points
-    faces = mesh.cells_dict[vtk.VTK_TRIANGLE]
-    return trimesh.Trimesh(verts, faces)
+class ProjectionIndex:
+    """Spatial index of a surface mesh to repeatedly project points onto it.
+    The triangulated mesh and its search trees are built once, so that following queries only search the trees.
+    Usually accessed through the cached `projection_index` of :class:`cartoreader_lite.CartoMap` or :class:`cartoreader_lite.CartoAuxMesh`.
 
-def project_points(mesh : Union[trimesh.Trimesh, pv.UnstructuredGrid], points : np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    Parameters
+    ----------
+    mesh : Union[trimesh.Trimesh, pv.UnstructuredGrid]
+        The mesh to project on. Will be converted to a trimesh, if it is not one already (see :func:`create_tri_mesh`)
+    """
+
+    tri_mesh : trimesh.Trimesh #: The triangulated mesh
+
+    def __init__(self, mesh : Union[trimesh.Trimesh, pv.UnstructuredGrid]) -> None:
+        self._source = (mesh, mesh.GetMTime()) if isinstance(mesh, pv.DataSet) else (mesh, None)
+        self.tri_mesh = create_tri_mesh(mesh, process=False) if isinstance(mesh, pv.DataSet) else mesh
+        self._query = ProximityQuery(self.tri_mesh)
+
+        #Build all cached structures up front, so that concurrent queries only read them
+        for attr in ["triangles", "face_normals", "kdtree", "triangles_tree"]:
+            getattr(self.tri_mesh, attr)
+
+    @property
+    def nr_triangles(self) -> int:
+        return len(self.tri_mesh.faces)
+
+    def is_valid_for(self, mesh : Union[trimesh.Trimesh, pv.UnstructuredGrid]) -> bool:
+        """Returns true if the index was built from the given mesh and the mesh was not modified since
+        """
+        source_mesh, mtime = self._source
+        return source_mesh is mesh and (mtime is None or mtime == mesh.GetMTime())
+
+    def project(self, points : np.ndarray, batch_size : int = 2**14, context : Union[ExecutionContext, str] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Projects a set of points onto the mesh, see :func:`project_points`
+
+        Parameters
+        ----------
+        points : np.ndarray
+            Points to project [Nx3]
+        batch_size : int, optional
+            Number of points per query. Batches are queried in parallel. By default 16384
+        context : Union[ExecutionContext, str], optional
+            Context used to query the batches, either serial or threaded. By default a thread pool
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray, np.ndarray]
+            The projected points [Nx3], the projection distance [N] and the triangle index on which the projection ended up [N]
+        """
+        assert batch_size > 0, "Batches need to hold at least one point"
+        points = np.asarray(points, dtype=np.float64).reshape([-1, 3])
+        if len(points) <= batch_size:
+            return self._query.on_surface(points)
+
+        with temporary_context(context, "thread") as context:
+            assert context.backend != "process", "The index can only be queried by threads"
+            results = list(context.map(self._query.on_surface, [points[start:start + batch_size] for start in range(0, len(points), batch_size)]))
+
+        return tuple(np.concatenate(result) for result in zip(*results))
+
+    def memory_nbytes(self, seen : Dict = None) -> int:
+        """Estimates the memory held by the index in bytes: The triangulated mesh, its cached triangles and normals and the search tree of the vertices.
+        Arrays shared with the source mesh are not counted if they are already in `seen` (see :func:`cartoreader_lite.low_level.utils.memory_nbytes`).
+        The native R-tree of the triangles is not included.
+        """
+        tri_mesh = self.tri_mesh
+        return memory_nbytes([tri_mesh.vertices, tri_mesh.faces, tri_mesh.triangles, tri_mesh.face_normals, tri_mesh.kdtree.data, tri_mesh.kdtree.indices], seen=seen)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(nr_triangles={self.nr_triangles})"
+
+def project_points(mesh : Union[trimesh.Trimesh, pv.UnstructuredGrid, ProjectionIndex], points : np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """Projects a set of points onto a triangulated surface mesh
 
     Parameters
     ----------
-    mesh : Union[trimesh.Trimesh, pv.UnstructuredGrid]
-        A mesh to project on. Will be converted to a trimesh, if it is not one already (see :func:`create_tri_mesh`)
+    mesh : Union[trimesh.Trimesh, pv.UnstructuredGrid, ProjectionIndex]
+        A mesh to project on. Will be converted to a trimesh, if it is not one already (see :func:`create_tri_mesh`).
+        Pass a :class:`ProjectionIndex` to reuse the search trees when projecting onto the same mesh multiple times
     points : np.ndarray
         Points to project [Nx3]
 
@@ -44,6 +140,9 @@ def project_points(mesh : Union[trimesh.Trimesh, pv.UnstructuredGrid], points :
             * The projection distance [N]
             * The triangle index on which the projection ended up [N]
     """
+    if isinstance(mesh, ProjectionIndex):
+        return mesh.project(points)
+
     if type(mesh) == pv.UnstructuredGrid:
         mesh = create_tri_mesh(mesh)
 
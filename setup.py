@@ -22,6 +22,9 @@ setup(name="cartoreader-lite",
      author="Thomas Grandits",
      author_email="tomdev@gmx.net",
      license="AGPL", 
+     entry_points = {
+          "console_scripts": ["cartoreader-convert=cartoreader_lite.convert:main"]
+     },
      extras_require = {
           "tests": ["pytest", "pytest-cov"],
           "docs": ["sphinx", "pydata_sphinx_theme"]
@@ -0,0 +1,37 @@
+import os
+import zipfile
+import pytest
+from cartoreader_lite.low_level.storage import DirectoryStorage
+
+mesh_content = """#TriangulatedMeshVersion2.0
+[GeneralAttributes]
+NumVertex                = 3
+NumTriangle              = 1
+
+[VerticesSection]
+;                   X             Y             Z        NormalX   NormalY   NormalZ  GroupID
+
+0 =      0.000000      0.000000      0.000000   0.000000   0.000000   1.000000        0
+1 =      1.000000      0.000000      0.000000   0.000000   0.000000   1.000000        0
+2 =      0.000000      1.000000      0.000000   0.000000   0.000000   1.000000        0
+
+[TrianglesSection]
+;       Vertex0  Vertex1  Vertex2   NormalX   NormalY   NormalZ  GroupID
+
+0 =           0        1        2   0.000000   0.000000   1.000000         0
+"""
+
+@pytest.fixture
+def study_paths(tmp_path):
+    study_dir = tmp_path / "Study"
+    (study_dir / "VisiTagExport").mkdir(parents=True)
+    (study_dir / "Map.mesh").write_text(mesh_content)
+    (study_dir / "VisiTagExport" / "Sites.txt").write_text("Session SiteIndex X\n1 1 0.5\n2 2 1.5\n")
+    (study_dir / "VisiTagExport" / "Settings.txt").write_text("VisiTag Settings\n   MinForce=   3\n   Name=   Some Name Here\n")
+
+    zip_fname = str(tmp_path / "Study.zip")
+    with zipfile.ZipFile(zip_fname, "w", compression=zipfile.ZIP_DEFLATED) as zip_f:
+        for fname in DirectoryStorage().list_files(str(study_dir)):
+            zip_f.write(fname, os.path.relpath(fname, tmp_path))
+
+    return str(study_dir), zip_fname
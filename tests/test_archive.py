@@ -0,0 +1,60 @@
+import zipfile
+import numpy as np
+import pandas as pd
+import pyvista as pv
+import pytest
+from cartoreader_lite.low_level.archive import ArchiveReader, ArchiveWriter, is_archive
+
+@pytest.mark.parametrize("compression", ["none", "blocks"])
+@pytest.mark.parametrize("container", ["zip", "directory"])
+def test_archive_roundtrip(tmp_path, container, compression):
+    path = tmp_path / "test.crlstudy"
+    df = pd.DataFrame({"id": np.arange(3), "pos": [np.ones(3) * i for i in range(3)], "proj_pos": [[0., 1., float(i)] for i in range(3)],
+                       "connectors": [["A"], ["A", "B"], []], "volt": [0.5, np.nan, 1.]})
+    mesh = pv.Sphere(theta_resolution=8, phi_resolution=8).cast_to_unstructured_grid()
+    mesh.point_data["group_id"] = np.arange(mesh.n_points)
+    poly = pv.PolyData(np.random.default_rng(0).random([5, 3]))
+
+    with ArchiveWriter(path, container, compression) as writer:
+        manifest = {"array": writer.write_array("data/array", np.arange(10, dtype=np.int16)), "frame": writer.write_frame("frame", df),
+                    "frame_indexed": writer.write_frame("frame_indexed", df.iloc[1:]), "mesh": writer.write_mesh("mesh", mesh),
+                    "poly": writer.write_mesh("poly", poly), "object": writer.write_object("object", {"a": [1, 2]})}
+        assert not is_archive(path) #Manifest is written last
+        writer.close(manifest)
+
+    assert is_archive(path) and not is_archive(tmp_path)
+    reader = ArchiveReader(path)
+    entries = reader.manifest
+    array = reader.read_array(entries["array"])
+    assert array.dtype == np.int16 and np.all(array == np.arange(10))
+    assert reader.read_object(entries["object"]) == {"a": [1, 2]}
+
+    df_read = reader.read_frame(entries["frame"])
+    assert [col["kind"] for col in entries["frame"]["columns"]] == ["array", "stacked", "stacked_list", "pickle", "array"]
+    assert df_read.columns.tolist() == df.columns.tolist() and df_read["volt"].equals(df["volt"])
+    assert type(df_read["pos"][1]) == np.ndarray and np.all(df_read["pos"][1] == 1)
+    assert df_read["proj_pos"][2] == [0., 1., 2.] and df_read["connectors"][1] == ["A", "B"]
+    assert reader.read_frame(entries["frame_indexed"], ["id"]).index.tolist() == [1, 2]
+
+    mesh_read = reader.read_mesh(entries["mesh"])
+    assert mesh_read.n_cells == mesh.n_cells and np.allclose(mesh_read.points, mesh.points)
+    assert np.all(mesh_read.cells == mesh.cells) and np.all(mesh_read.point_data["group_id"] == mesh.point_data["group_id"])
+    poly_read = reader.read_mesh(entries["poly"])
+    assert isinstance(poly_read, pv.PolyData) and poly_read.n_verts == poly.n_verts
+
+    mapped_reader = ArchiveReader(path, mmap=True)
+    mapped = mapped_reader.read_array(entries["array"])
+    assert isinstance(mapped, np.memmap) == (compression == "none") and np.all(mapped == np.arange(10))
+    mapped[0] = 5 #Copy-on-write
+    assert mapped_reader.read_array(entries["array"])[0] == 0
+    assert np.allclose(mapped_reader.read_mesh(entries["mesh"]).points, mesh.points)
+
+def test_archive_no_overwrite(tmp_path):
+    with ArchiveWriter(tmp_path / "dir", "directory") as writer:
+        writer.close({})
+    with pytest.raises(AssertionError):
+        ArchiveWriter(tmp_path / "dir", "directory")
+
+    with zipfile.ZipFile(tmp_path / "other.zip", "w") as f:
+        f.writestr("manifest.json", '{"format": "other"}')
+    assert not is_archive(tmp_path / "other.zip")
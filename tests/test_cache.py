@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from cartoreader_lite.low_level.cache import ParseCache, convert_to_cache
+from cartoreader_lite.low_level.storage import local_storage
+
+nr_calls = 0
+
+def parse_table(fname):
+    global nr_calls
+    nr_calls += 1
+    return pd.read_csv(fname, sep=r"\s+"), np.loadtxt(fname, skiprows=1)
+
+@pytest.fixture
+def table_fname(tmp_path):
+    fname = tmp_path / "table.txt"
+    fname.write_text("A B C\n" + "\n".join([f"{i} {i*2} {i*3}" for i in range(100)]))
+    return str(fname)
+
+def test_cached_call(tmp_path, table_fname):
+    global nr_calls
+    nr_calls = 0
+    cache = ParseCache(tmp_path / "cache")
+    df, arr = cache.cached_call([table_fname], parse_table, table_fname)
+    assert nr_calls == 1
+
+    df_cached, arr_cached = cache.cached_call([table_fname], parse_table, table_fname)
+    assert nr_calls == 1
+    assert df.equals(df_cached) and np.array_equal(arr, arr_cached)
+    assert not arr_cached.flags.owndata #Memory mapped from the cache
+    arr_cached[0] = -1 #Copy on write
+    assert np.array_equal(cache.cached_call([table_fname], parse_table, table_fname)[1], arr)
+
+    #Only changing the modification time keeps the entry valid
+    stat = os.stat(table_fname)
+    os.utime(table_fname, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    cache.cached_call([table_fname], parse_table, table_fname)
+    assert nr_calls == 1
+
+    #Changing the content invalidates the entry
+    with open(table_fname, "a") as f:
+        f.write("\n100 200 300")
+    df_new, _ = cache.cached_call([table_fname], parse_table, table_fname)
+    assert nr_calls == 2 and len(df_new) == 101
+
+    #Same content, different size
+    with open(table_fname, "r+") as f:
+        f.write("X")
+    cache.cached_call([table_fname], parse_table, table_fname)
+    assert nr_calls == 3
+
+def test_invalidate_and_evict(tmp_path, table_fname):
+    global nr_calls
+    nr_calls = 0
+    cache = convert_to_cache(str(tmp_path / "cache"))
+    assert type(cache) == ParseCache and convert_to_cache(cache) is cache and convert_to_cache(None) is None
+
+    other_dir = tmp_path / "other"
+    other_dir.mkdir()
+    other_fname = str(other_dir / "table.txt")
+    with open(table_fname, "r") as f_in, open(other_fname, "w") as f_out:
+        f_out.write(f_in.read())
+
+    cache.cached_call([table_fname], parse_table, table_fname)
+    cache.cached_call([other_fname], parse_table, other_fname)
+    assert nr_calls == 2 and len(cache._entries()) == 2
+
+    assert cache.invalidate(str(other_dir)) == 1
+    cache.cached_call([table_fname], parse_table, table_fname)
+    cache.cached_call([other_fname], parse_table, other_fname)
+    assert nr_calls == 3
+
+    #Least recently used entry will be evicted first
+    entry_size = cache.size // 2
+    os.utime(cache._entry_fname(table_fname, local_storage, parse_table, (table_fname,), {}), ns=(0, 0))
+    assert cache.evict(entry_size) == 1
+    cache.cached_call([other_fname], parse_table, other_fname)
+    assert nr_calls == 3
+    cache.cached_call([table_fname], parse_table, table_fname)
+    assert nr_calls == 4
+
+    assert cache.invalidate() == 2
+    assert cache.size == 0
@@ -0,0 +1,40 @@
+import gzip
+import io
+import numpy as np
+import pytest
+from cartoreader_lite.low_level.compression import BlockGzipReader, BlockGzipWriter, is_block_compressed
+from cartoreader_lite.low_level.execution import ExecutionContext
+
+@pytest.mark.parametrize("backend", ["serial", "thread"])
+def test_block_roundtrip(backend):
+    data = np.random.default_rng(0).integers(0, 16, size=100000, dtype=np.uint8).tobytes()
+    buffer = io.BytesIO()
+    with ExecutionContext(backend, 2) as context:
+        with BlockGzipWriter(buffer, block_size=4096, context=context) as writer:
+            writer.write(data[:1000])
+            writer.write(data[1000:])
+
+        assert gzip.decompress(buffer.getvalue()) == data #Remains a valid gzip file
+        buffer.seek(0)
+        assert is_block_compressed(buffer) and buffer.tell() == 0
+        with BlockGzipReader(buffer, context) as reader:
+            assert reader.nr_blocks == 25 and reader.size == len(data)
+            assert reader.read_block(3) == data[3 * 4096:4 * 4096]
+            assert reader.read() == data
+            reader.seek(5000)
+            assert reader.read(10000) == data[5000:15000]
+            reader.seek(-10, io.SEEK_END)
+            assert reader.read() == data[-10:]
+
+def test_block_empty_and_gzip():
+    buffer = io.BytesIO()
+    BlockGzipWriter(buffer).close()
+    assert gzip.decompress(buffer.getvalue()) == b""
+    buffer.seek(0)
+    with io.BufferedReader(BlockGzipReader(buffer)) as reader:
+        assert reader.read() == b""
+
+    plain_gzip = io.BytesIO(gzip.compress(b"test"))
+    assert not is_block_compressed(plain_gzip)
+    with pytest.raises(ValueError):
+        BlockGzipReader(plain_gzip)
@@ -0,0 +1,94 @@
+import json
+import multiprocessing
+import os
+import zipfile
+import pytest
+from conftest import mesh_content
+from cartoreader_lite import CartoStudy
+from cartoreader_lite.low_level.archive import archive_suffix
+from cartoreader_lite.low_level.cache import ParseCache
+from cartoreader_lite.convert import convert_studies, find_studies, find_study_xml, main, output_name, read_manifest, summarize
+
+study_xml = '<Study name="{name}"><Maps Count="1"><Map Index="0" Name="1-Map" FileNames="missing.mesh"><CartoPoints Count="0"/></Map></Maps></Study>'
+
+@pytest.fixture
+def export_dir(tmp_path):
+    """Directory holding two broken studies (a directory and a zip file) and an unrelated file
+    """
+    export_dir = tmp_path / "exports"
+    (export_dir / "Study_A").mkdir(parents=True)
+    (export_dir / "Study_A" / "Study A.xml").write_text(study_xml.format(name="Study A"))
+    (export_dir / "Study_A" / "1-Map_P1_Point_Export.xml").write_text('<Point ID="1"/>')
+    (export_dir / "notes.txt").write_text("Not a study")
+    with zipfile.ZipFile(export_dir / "Study_B.zip", "w") as zip_f:
+        zip_f.writestr("Export_B/Study B.xml", study_xml.format(name="Study B"))
+        zip_f.writestr("Export_B/VisiTagExport/Sites.xml", "<Sites/>")
+    return export_dir
+
+def test_find_studies(export_dir, tmp_path):
+    study_a, study_b = str(export_dir / "Study_A"), str(export_dir / "Study_B.zip")
+    assert find_studies([export_dir]) == [study_a, study_b]
+    assert find_studies([study_a, str(export_dir / "*.zip"), study_a]) == [study_a, study_b]
+    assert find_study_xml(study_a) == "Study A.xml" and find_study_xml(study_b) == "Export_B/Study B.xml"
+    (tmp_path / "empty").mkdir()
+    with pytest.raises(FileNotFoundError):
+        find_study_xml(tmp_path / "empty")
+
+    assert output_name(study_b, "out") == os.path.join("out", "Study_B.crlstudy")
+    assert output_name(study_a + os.sep, "out", "pickle") == os.path.join("out", "Study_A.pkl.gz")
+
+def test_convert_failures(export_dir, tmp_path):
+    output_dir = tmp_path / "converted"
+    finished = []
+    records = convert_studies(find_studies([export_dir]), output_dir, max_workers=1, callback=finished.append)
+    assert len(records) == len(finished) == 2
+    assert all([record["status"] == "failed" and record["error"] is not None for record in records])
+    assert sorted(os.listdir(output_dir)) == ["manifest.jsonl"] #No partial outputs left
+
+    #Failed studies are retried
+    convert_studies(find_studies([export_dir]), output_dir, max_workers=1)
+    manifest = read_manifest(output_dir / "manifest.jsonl")
+    with open(output_dir / "manifest.jsonl") as manifest_f:
+        assert len(manifest_f.readlines()) == 4 and len(manifest) == 2
+
+    summary = summarize(records, 1.)
+    assert summary["studies"] == summary["failed"] == 2 and summary["done"] == 0
+    assert main([str(export_dir), "-o", str(output_dir), "--workers", "1"]) == 1
+
+class KillingCache(ParseCache):
+    """Cache killing the worker process reading the mesh of `BadStudy`
+    """
+    def cached_call(self, fnames, parse_f, *args, storage=None, **kwargs):
+        if "BadStudy" in fnames[0] and multiprocessing.parent_process() is not None:
+            os._exit(1)
+        return super().cached_call(fnames, parse_f, *args, storage=storage, **kwargs)
+
+def test_convert_broken_pool(tmp_path):
+    for study_name in ["BadStudy", "GoodStudy"]:
+        (tmp_path / study_name / "VisiTagExport").mkdir(parents=True)
+        for visitag_name in ["Sites", "RawPositions", "AblationData", "ContactForceData"]:
+            (tmp_path / study_name / "VisiTagExport" / f"{visitag_name}.txt").write_text("Session TimeStamp X Y Z\n1 0 0.5 0.5 0.5\n")
+        (tmp_path / study_name / "Map.mesh").write_text(mesh_content.replace("NumTriangle              = 1\n", "NumTriangle              = 1\nMatrix                   = 1 0 0 0 0 1 0 0 0 0 1 0 0 0 0 1\n"))
+        (tmp_path / study_name / "Study.xml").write_text('<Study name="Study"><Maps Count="1"><Map Index="0" Name="1-Map" FileNames="Map.mesh"><CartoPoints Count="0"/></Map></Maps></Study>')
+
+    #The dead worker fails the study reading it, the next study is converted by a new pool
+    output_dir = tmp_path / "converted"
+    records = convert_studies([tmp_path / "BadStudy", tmp_path / "GoodStudy"], output_dir, max_workers=1, max_in_flight=1,
+                              study_kwargs={"cache": KillingCache(tmp_path / "cache"), "ablation_sites_kwargs": {"resample_unified_time": False}})
+    assert [record["status"] for record in records] == ["failed", "done"]
+    assert records[0]["error"].startswith("BrokenProcessPool") and records[1]["nr_maps"] == 1
+    assert sorted(os.listdir(output_dir)) == ["GoodStudy" + archive_suffix, "manifest.jsonl"]
+
+def test_openep_convert(tmp_path):
+    study_dir = "openep-testingdata/Carto/Export_Study-1-11_25_2021-15-01-32"
+    output_dir = tmp_path / "converted"
+    records = convert_studies([study_dir], output_dir, max_in_flight=1)
+    assert records[0]["status"] == "done" and records[0]["nr_maps"] == 3 and records[0]["bytes_out"] > 0
+    study = CartoStudy(records[0]["output"])
+    assert study.nr_maps == 3
+
+    records = convert_studies([study_dir], output_dir)
+    assert records[0]["status"] == "skipped"
+    assert summarize(records, 1.)["skipped"] == 1
+    with open(output_dir / "manifest.jsonl") as manifest_f:
+        assert json.loads(manifest_f.readline())["status"] == "done"
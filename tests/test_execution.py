@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+import pickle
+import threading
+import pytest
+from cartoreader_lite import CartoStudy
+from cartoreader_lite.low_level.execution import ExecutionContext, SerialExecutor, convert_to_context, deferred_context, local_context, temporary_context
+from cartoreader_lite.low_level.study import CartoLLStudy
+from cartoreader_lite.low_level.visitags import read_visitag_dir
+from conftest import mesh_content
+
+def test_serial_executor():
+    executor = SerialExecutor()
+    assert executor.submit(threading.get_ident).result() == threading.get_ident()
+    assert list(executor.map(abs, [-1, 2])) == [1, 2]
+    with pytest.raises(ZeroDivisionError):
+        executor.submit(divmod, 1, 0).result()
+
+def test_execution_context():
+    context = ExecutionContext("thread", 2)
+    assert context.max_workers == 2 and ExecutionContext("serial", 4).max_workers == 1
+    executor = context.executor
+    assert context.executor is executor #Reused until shut down
+    assert list(context.map(abs, [-1, -2, 3])) == [1, 2, 3]
+    context.shutdown()
+    assert context.submit(abs, -1).result() == 1 and context.executor is not executor
+
+    context = pickle.loads(pickle.dumps(context))
+    assert context.backend == "thread" and context.max_workers == 2
+
+    with pytest.raises(AssertionError):
+        ExecutionContext("gpu")
+
+def test_convert_to_context():
+    context = ExecutionContext("serial")
+    assert convert_to_context(context) is context
+    assert convert_to_context("thread").backend == "thread"
+    assert convert_to_context(None).backend == "process"
+
+    with temporary_context(context) as context_used:
+        assert context_used is context and not temporary_context(context).owned
+    with temporary_context(None, "thread") as context_used:
+        assert context_used.backend == "thread"
+    assert deferred_context(context_used) == "thread" and deferred_context(context) is context
+
+def test_local_context():
+    with ExecutionContext("process", 2) as context:
+        with local_context(context) as thread_context:
+            assert thread_context.backend == "thread" and thread_context.max_workers == 2
+            thread_context.submit(int).result()
+        assert thread_context._executor is None and context._executor is None #Shut down, no processes started
+
+    with ExecutionContext("serial") as context:
+        with local_context(context) as serial_context:
+            assert serial_context is context
+    with local_context("process") as thread_context, local_context(None) as default_context:
+        assert thread_context.backend == default_context.backend == "thread"
+
+def test_imap():
+    submitted = []
+    def args():
+        for i in range(10):
+            submitted.append(i)
+            yield -i
+
+    with ExecutionContext("thread", 2) as context:
+        results = context.imap(abs, args(), max_pending=3)
+        assert next(results) == 0 and len(submitted) == 3 #Bounded read-ahead
+        assert list(results) == list(range(1, 10))
+        assert list(context.imap(divmod, [7, 8], [2, 3])) == [(3, 1), (2, 2)]
+        assert list(context.imap(abs, [])) == []
+
+        with pytest.raises(ZeroDivisionError):
+            list(context.imap(divmod, [1, 1], [1, 0]))
+
+@pytest.mark.parametrize("backend", ["serial", "thread", "process"])
+def test_visitag_backends(study_paths, backend):
+    study_dir = study_paths[0]
+    with ExecutionContext(backend, 2) as context:
+        visitag_data = read_visitag_dir(os.path.join(study_dir, "VisiTagExport"), context=context)
+    assert visitag_data["Sites"].shape == (2, 3) and visitag_data["Settings"]["MinForce"] == 3
+
+def test_lazy_map_context(study_paths):
+    study_dir = study_paths[0]
+    #Single map without points
+    with open(os.path.join(study_dir, "Map.mesh"), "w") as mesh_f:
+        mesh_f.write(mesh_content.replace("NumTriangle              = 1\n", "NumTriangle              = 1\nMatrix                   = 1 0 0 0 0 1 0 0 0 0 1 0 0 0 0 1\n"))
+    with open(os.path.join(study_dir, "Study.xml"), "w") as xml_f:
+        xml_f.write('<Study name="Study"><Maps Count="1"><Map Index="0" Name="1-Map" FileNames="Map.mesh"><CartoPoints Count="0"/></Map></Maps></Study>')
+
+    #The pools of maps loaded on first access are shut down afterwards
+    study = CartoStudy(study_dir, lazy=True, context="process")
+    assert study.maps[0].mesh.n_points == 3 and len(multiprocessing.active_children()) == 0
+    ll_study = CartoLLStudy(study_dir, lazy=True)
+    assert ll_study.maps[0].mesh.n_points == 3 and len(multiprocessing.active_children()) == 0
+
+    with ExecutionContext("thread", 2) as context: #Contexts given by the caller are reused
+        ll_study = CartoLLStudy(study_dir, lazy=True, context=context)
+        ll_study.maps[0]
+        assert context._executor is not None
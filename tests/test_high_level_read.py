@@ -1,10 +1,15 @@
 import pytest
-from cartoreader_lite import CartoStudy
+from cartoreader_lite import CartoStudy, CartoMap, SignalStore, StudyArchive, AblationSites
+from cartoreader_lite.high_level.study import ecg_labels, CartoPointDetailData
+from cartoreader_lite.low_level.utils import column_vectors
+from types import SimpleNamespace
 from cartoreader_lite.low_level.study import _parallelize_pool, CartoLLStudy
+from cartoreader_lite.low_level.execution import ExecutionContext
 from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 import pandas as pd
 import pickle
+import numpy as np
 
 """
 def prepare_lib():
@@ -85,11 +90,293 @@ class TestHighLevelCartoReader():
         ecgs = study.maps[2].points.detail[0].surface_ecg
         assert all(["(" not in col for col in egms.columns])
         assert all(["(" not in col for col in ecgs.columns])
-        assert "proj_pos" in points #Check for the projection of the points
+        assert "proj_pos_x" in points #Check for the projection of the points
         assert "proj_dist" in points 
 
         ll_study = pickle.loads(ll_study_bak)
         study = CartoStudy(ll_study, carto_map_kwargs={"discard_invalid_points": False, "proj_points": False})
         points = study.maps[2].points
-        assert "proj_pos" not in points #Check that the projection was not performed
+        assert "proj_pos_x" not in points #Check that the projection was not performed
         assert "proj_dist" not in points 
+
+    def test_openep_lazy(self):
+        study_dir = "openep-testingdata/Carto/Export_Study-1-11_25_2021-15-01-32"
+        study_name = "Study 1 11_25_2021 15-01-32.xml"
+        carto_map_kwargs = {"discard_invalid_points": False}
+        study = CartoStudy(study_dir, study_name, carto_map_kwargs=carto_map_kwargs)
+        lazy_study = CartoStudy(study_dir, study_name, carto_map_kwargs=carto_map_kwargs, lazy=True)
+
+        assert lazy_study.nr_maps == study.nr_maps and not lazy_study.maps.is_loaded(0)
+        assert lazy_study.maps.names == [m.name for m in study.maps]
+        lazy_map = lazy_study.maps[study.maps[2].name]
+        assert lazy_study.maps.is_loaded(2) and not lazy_study.maps.is_loaded(0)
+        assert lazy_map.nr_points == study.maps[2].nr_points
+        assert len(lazy_study.ablation_data.session_time_data) == len(study.ablation_data.session_time_data)
+
+        #Saving loads the remaining data
+        with BytesIO() as bytes:
+            lazy_study.save(bytes)
+            bytes.seek(0)
+            study_restored = CartoStudy.load_pickled_study(bytes)
+
+        compare_studies(study, study_restored)
+
+    def test_openep_point_details_on_demand(self):
+        study_dir = "openep-testingdata/Carto/Export_Study-1-11_25_2021-15-01-32"
+        study_name = "Study 1 11_25_2021 15-01-32.xml"
+        #Invalid points are discarded in both modes
+        study = CartoStudy(study_dir, study_name)
+        study_on_demand = CartoStudy(study_dir, study_name, load_point_details=False)
+        for m1, m2 in zip(study.maps, study_on_demand.maps):
+            assert m1.nr_points == m2.nr_points and m1.points.drop(columns="detail").equals(m2.points.drop(columns="detail"))
+            assert all([detail.id == point_id for detail, point_id in zip(m2.points.detail, m2.points.id)])
+
+        study = CartoStudy(study_dir, study_name, carto_map_kwargs={"discard_invalid_points": False})
+        study_on_demand = CartoStudy(study_dir, study_name, load_point_details=False, carto_map_kwargs={"discard_invalid_points": False, "detail_cache_size": 2})
+
+        points, points_on_demand = study.maps[2].points, study_on_demand.maps[2].points
+        assert len(points) == len(points_on_demand) and np.all(points.map_annotation == points_on_demand.map_annotation)
+        assert len(study_on_demand.maps[2].detail_cache) == 0
+        for detail, detail_on_demand in zip(points.detail[:3], points_on_demand.detail[:3]):
+            assert np.all(detail.egm == detail_on_demand.egm)
+            assert np.all(detail.surface_ecg == detail_on_demand.surface_ecg)
+        assert len(study_on_demand.maps[2].detail_cache) == 2
+
+    def test_openep_iter_points(self):
+        study_dir = "openep-testingdata/Carto/Export_Study-1-11_25_2021-15-01-32"
+        study_name = "Study 1 11_25_2021 15-01-32.xml"
+        study = CartoStudy(study_dir, study_name, carto_map_kwargs={"discard_invalid_points": False})
+        study_on_demand = CartoStudy(study_dir, study_name, load_point_details=False, carto_map_kwargs={"discard_invalid_points": False})
+
+        carto_map, map_on_demand = study.maps[2], study_on_demand.maps[2]
+        details = [detail for batch in carto_map.iter_points(batch_size=7) for detail in batch]
+        assert len(details) == carto_map.nr_points and all([d1 is d2 for d1, d2 in zip(details, carto_map.points.detail)])
+
+        batches = list(map_on_demand.iter_points(batch_size=7, context="thread", max_pending=2))
+        assert all([len(batch) == 7 for batch in batches[:-1]]) and sum([len(batch) for batch in batches]) == carto_map.nr_points
+        assert len(map_on_demand.detail_cache) == 0 #Streamed points are not cached
+        for d1, d2 in zip(carto_map.points.detail, [detail for batch in batches for detail in batch]):
+            assert d1.id == d2.id and d1.egm.equals(d2.egm) and d1.surface_ecg.equals(d2.surface_ecg)
+
+        ll_map = CartoLLStudy(study_dir, study_name, load_point_details=False).maps[2]
+        main_data, points_data = next(ll_map.iter_points(batch_size=5, context="serial"))
+        assert len(main_data) == len(points_data) == 5 and "ecg" in points_data[0][1]
+
+    def test_openep_fused_point_import(self):
+        study_dir = "openep-testingdata/Carto/Export_Study-1-11_25_2021-15-01-32"
+        study_name = "Study 1 11_25_2021 15-01-32.xml"
+        study = CartoStudy(study_dir, study_name, carto_map_kwargs={"discard_invalid_points": False}) #Points are converted while reading
+        study_two_pass = CartoStudy(CartoLLStudy(study_dir, study_name), carto_map_kwargs={"discard_invalid_points": False})
+        ll_study = CartoLLStudy(study_dir, study_name, point_converter=CartoPointDetailData)
+        assert all([isinstance(p, CartoPointDetailData) for p in ll_study.maps[2].point_raw_data])
+
+        for m1, m2 in zip(study.maps, study_two_pass.maps):
+            assert np.all(m1.points.id == m2.points.id) and np.allclose(m1.points.proj_dist, m2.points.proj_dist)
+            for d1, d2 in zip(m1.points.detail, m2.points.detail):
+                assert d1.egm.equals(d2.egm) and d1.surface_ecg.equals(d2.surface_ecg) and d1.ecg_gain == d2.ecg_gain
+
+    def test_openep_load_stats(self):
+        study_dir = "openep-testingdata/Carto/Export_Study-1-11_25_2021-15-01-32"
+        study_name = "Study 1 11_25_2021 15-01-32.xml"
+        events = []
+        study = CartoStudy(study_dir, study_name, load_stats=lambda event, record: events.append(event))
+        summary = study.load_stats.summary()
+        assert {"study_xml", "map", "mesh", "points", "visitag_files", "resample", "point_details", "projection"}.issubset(summary.index)
+        assert summary.loc["map", "count"] == study.nr_maps and summary.loc["points", "bytes_read"] > 0
+        assert events.count("start") == events.count("end") == len(study.load_stats)
+        assert CartoStudy(study_dir, study_name).load_stats is None
+
+    def test_openep_memory_usage(self):
+        study_dir = "openep-testingdata/Carto/Export_Study-1-11_25_2021-15-01-32"
+        study_name = "Study 1 11_25_2021 15-01-32.xml"
+        study = CartoStudy(study_dir, study_name)
+        usage = study.memory_usage()
+        assert set(usage.index.get_level_values("part")) == {"map", "ablation_data", "aux_mesh"}
+        map_usage = study.maps[2].memory_usage()
+        assert usage.sort_index().loc["map", study.maps[2].name].equals(map_usage.sort_index())
+        assert map_usage["signals"] == study.maps[2].signals.values.nbytes + study.maps[2].signals.point_channels.nbytes + study.maps[2].signals.nr_samples.nbytes + study.maps[2].signals.channel_names.nbytes
+        assert map_usage["mesh_points"] == study.maps[2].mesh.points.nbytes and map_usage["surface_ecg"] == 0
+        assert study.memory_usage(deep=True).sum() > usage.sum()
+
+        lazy_study = CartoStudy(study_dir, study_name, lazy=True)
+        assert "map" not in lazy_study.memory_usage().index.get_level_values("part") #Maps are not loaded
+        lazy_study.maps[2]
+        assert set(lazy_study.memory_usage()["map"].index.get_level_values("name")) == {study.maps[2].name}
+
+    def test_openep_signal_store(self):
+        study_dir = "openep-testingdata/Carto/Export_Study-1-11_25_2021-15-01-32"
+        study_name = "Study 1 11_25_2021 15-01-32.xml"
+        study = CartoStudy(study_dir, study_name, carto_map_kwargs={"discard_invalid_points": False})
+        carto_map = study.maps[2]
+        signals = carto_map.signals
+        assert signals.values.dtype == np.int16 and len(signals) == carto_map.nr_points
+        for point_i, detail in enumerate(carto_map.points.detail[:3]):
+            assert np.shares_memory(detail.egm.to_numpy(), signals.values)
+            assert np.all(detail.surface_ecg.to_numpy() == signals.surface_ecgs[point_i])
+
+        study_restored = pickle.loads(pickle.dumps(study))
+        detail = study_restored.maps[2].points.detail[0]
+        assert np.shares_memory(detail.egm.to_numpy(), study_restored.maps[2].signals.values)
+        assert detail.egm.equals(carto_map.points.detail[0].egm)
+
+        study = CartoStudy(study_dir, study_name, carto_map_kwargs={"discard_invalid_points": False, "contiguous_signals": False})
+        assert study.maps[2].signals is None
+
+    @pytest.mark.parametrize("file_format", ["archive", "directory"])
+    def test_openep_archive(self, tmp_path, file_format):
+        study_dir = "openep-testingdata/Carto/Export_Study-1-11_25_2021-15-01-32"
+        study_name = "Study 1 11_25_2021 15-01-32.xml"
+        study = CartoStudy(study_dir, study_name, carto_map_kwargs={"discard_invalid_points": False})
+        archive_path = str(tmp_path / "study.crlstudy")
+        study.save(archive_path, file_format=file_format, signal_chunk_size=16)
+
+        archive = StudyArchive(archive_path)
+        assert archive.map_names == [m.name for m in study.maps]
+        carto_map = study.maps[2]
+        assert archive.read_mesh(2).n_cells == carto_map.mesh.n_cells
+        points = archive.read_points(carto_map.name, ["id", "pos_x", "pos_y", "pos_z"])
+        assert points.columns.tolist() == ["id", "pos_x", "pos_y", "pos_z"] and np.all(points.id == carto_map.points.id)
+        assert np.all(points[["pos_x", "pos_y", "pos_z"]].to_numpy() == carto_map.points_xyz)
+        signals = archive.read_signals(2, [20, 3])
+        assert signals.egm(0).equals(carto_map.points.detail[20].egm) and signals.surface_ecg(1).equals(carto_map.points.detail[3].surface_ecg)
+
+        for lazy in [False, True]:
+            study_restored = CartoStudy(archive_path, lazy=lazy)
+            compare_studies(study, study_restored)
+            detail = study_restored.maps[2].points.detail[5]
+            assert detail.egm.equals(carto_map.points.detail[5].egm) and detail.ecg_gain == carto_map.points.detail[5].ecg_gain
+            assert study_restored.maps[2].points.drop(columns="detail").equals(carto_map.points.drop(columns="detail"))
+
+        study.save(archive_path + ".mapped", file_format=file_format)
+        study_mapped = CartoStudy(archive_path + ".mapped", mmap=True)
+        compare_studies(study, study_mapped)
+        assert isinstance(study_mapped.maps[2].signals.values, np.memmap)
+
+def test_signal_store_varying_channels():
+    rng = np.random.default_rng(0)
+    def point(egm_names, nr_samples):
+        return SimpleNamespace(surface_ecg=pd.DataFrame(rng.integers(-100, 100, size=[nr_samples, 12], dtype=np.int16), columns=ecg_labels),
+                               egm=pd.DataFrame(rng.integers(-100, 100, size=[nr_samples, len(egm_names)], dtype=np.int16), columns=egm_names))
+
+    points = [point(["A", "B"], 10), point(["B", "C", "D"], 8), point([], 10)]
+    signals = SignalStore(points)
+    assert signals.values.shape == (3, 10, 15) and list(signals.channel_names) == ecg_labels + ["A", "B", "C", "D"]
+    assert list(signals.nr_samples) == [10, 8, 10]
+    for point_i, p in enumerate(points):
+        assert signals.egm(point_i).equals(p.egm) and signals.surface_ecg(point_i).equals(p.surface_ecg)
+
+    b_signals, b_mask = signals.channel("B")
+    assert list(b_mask) == [True, True, False]
+    assert np.all(b_signals[0] == points[0].egm["B"]) and np.all(b_signals[1, :8] == points[1].egm["B"])
+    assert np.all(b_signals[1, 8:] == 0) and np.all(b_signals[2] == 0)
+
+def test_ablation_sites_per_session():
+    rng = np.random.default_rng(0)
+    def session_log(sessions, interval, columns):
+        time_stamps = np.concatenate([np.arange(start, end, interval) for start, end in sessions.values()])
+        session_ids = np.concatenate([np.full(len(range(start, end, interval)), session_id) for session_id, (start, end) in sessions.items()])
+        return pd.DataFrame({"Session": session_ids, "TimeStamp": time_stamps, **{k: rng.random(len(time_stamps)) for k in columns}})
+
+    sessions = {1: (0, 10000), 2: (60000, 65000)} #Long gap between the sessions
+    visitag_data = {"Sites": pd.DataFrame({"Session": [1, 2], "X": [0., 1.], "Y": [0., 1.], "Z": [0., 1.]}),
+                    "RawPositions": session_log({**sessions, 3: (70000, 71000)}, 33, ["X", "Y", "Z"]),
+                    "AblationData": session_log(sessions, 100, ["Impedance"]),
+                    "ContactForceData": session_log(sessions, 50, ["Force"]).rename(columns={"TimeStamp": "Time"})}
+
+    ablation_sites = AblationSites(visitag_data, resample_per_session=True, context="serial")
+    assert [session_id for session_id, _ in ablation_sites.session_time_data] == [1, 2] #Session 3 is missing in the ablation data
+    for session_id, time_data in ablation_sites.session_time_data:
+        start, end = sessions[session_id]
+        assert time_data.TimeStamp.min() >= start and time_data.TimeStamp.max() < end and np.all(time_data.Session == session_id)
+        assert np.all(np.diff(time_data.TimeStamp) <= 100) and "pos" in time_data and "Impedance" in time_data
+
+    ablation_sites_threaded = AblationSites(visitag_data, resample_per_session=True, context="thread")
+    for (_, time_data), (_, time_data_threaded) in zip(ablation_sites.session_time_data, ablation_sites_threaded.session_time_data):
+        assert time_data.drop(columns="pos").equals(time_data_threaded.drop(columns="pos"))
+
+    #Studies resample the sessions using their context, process pools are replaced by threads
+    ll_study = CartoLLStudy.__new__(CartoLLStudy)
+    ll_study.__dict__.update(name="Study", maps=[], aux_meshes=[], visitag_data=visitag_data)
+    for backend in ["thread", "process"]:
+        with ExecutionContext(backend, 2) as context:
+            for lazy in [False, True]:
+                study = CartoStudy(ll_study, ablation_sites_kwargs={"resample_per_session": True}, lazy=lazy, context=context)
+                assert len(study.ablation_data.session_time_data) == 2
+            assert (context._executor is not None) == (backend == "thread")
+
+    usage = ablation_sites.memory_usage()
+    assert usage["session_time_data"] == sum([time_data.memory_usage(index=True).sum() for _, time_data in ablation_sites.session_time_data])
+    assert usage["session_rf_data"] == 0 and ablation_sites.memory_usage(deep=True)["session_time_data"] > usage["session_time_data"]
+
+def synthetic_point(point_id : int, rng : np.random.Generator) -> CartoPointDetailData:
+    columns = [f"{l}({110 + i})" for i, l in enumerate(ecg_labels)] + ["20A_1(22)", "20A_2(23)"]
+    ecg_data = pd.DataFrame(rng.integers(-100, 100, size=[50, len(columns)]), columns=columns)
+    metadata = {"WOI": {"From": "-100", "To": "100"}, "Annotations": {"StartTime": "0", "Reference_Annotation": "10", "Map_Annotation": "20"},
+                "Voltages": {"Unipolar": "1.5", "Bipolar": "0.5"}}
+    main_data = pd.Series({"Id": point_id, "Position3D": rng.normal(size=3), "CathOrientation": np.ones(3), "Cath_Id": 3})
+    return CartoPointDetailData(main_data, (metadata, {"connector_data": {"C": None}, "ecg": (("v", "Raw ECG to MV (gain) = 0.003", ""), ecg_data)}))
+
+def test_point_detail_data_compact():
+    rng = np.random.default_rng(0)
+    points = [synthetic_point(1, rng), synthetic_point(2, rng)]
+    assert not hasattr(points[0], "__dict__")
+    assert list(points[0].egm.columns) == ["20A_1", "20A_2"] and points[0].surface_ecg.dtypes.eq(np.int16).all()
+    assert points[0]._egm_columns is points[1]._egm_columns #Column names are shared between the points
+
+    restored = pickle.loads(pickle.dumps(points))
+    assert all([p.egm.equals(r.egm) and p.surface_ecg.equals(r.surface_ecg) and p.id == r.id for p, r in zip(points, restored)])
+
+    #Signals linked to a store and copied back on modification
+    egm = points[1].egm.copy()
+    signals = SignalStore(points)
+    points[1]._link_signals(signals, 1)
+    assert np.shares_memory(points[1].egm.to_numpy(), signals.values) and points[1].egm.equals(egm)
+    points[1].surface_ecg = points[1].surface_ecg * 2
+    assert points[1]._signals is None and points[1].egm.equals(egm)
+
+    #Linked signals are held by the store
+    usage, egm_values = points[0].memory_usage(), points[0]._egm_values
+    assert usage["egm"] == egm_values.nbytes and usage["surface_ecg"] == points[0]._surface_ecg_values.nbytes and usage["contact_force"] == 0
+    points[0]._link_signals(signals, 0)
+    assert points[0].memory_usage()["egm"] == 0 and points[0].memory_usage(deep=True)["point_metadata"] > usage["point_metadata"]
+    points[0]._unlink_signals()
+
+    #State of previous versions holding DataFrames
+    point_state = {k: getattr(points[0], k) for k in CartoPointDetailData._main_attrs + ["ecg_gain", "ecg_metadata", "surface_ecg", "egm"]}
+    old_point = CartoPointDetailData.__new__(CartoPointDetailData)
+    old_point.__setstate__(point_state)
+    assert old_point.egm.equals(points[0].egm) and old_point.ecg_gain == points[0].ecg_gain
+
+def test_points_table():
+    rng = np.random.default_rng(0)
+    points = [synthetic_point(point_id, rng) for point_id in range(5)]
+    table = CartoPointDetailData._points_table(points)
+    assert all([table[k].dtype == np.float64 for k in ["pos_x", "pos_y", "pos_z", "woi_from", "woi_to"]])
+    assert np.all(table.detail.to_numpy() == np.array(points, dtype=object))
+
+    points_xyz = column_vectors(table, ["pos_x", "pos_y", "pos_z"])
+    assert np.shares_memory(points_xyz, table["pos_x"].to_numpy()) and np.all(points_xyz == np.stack([p.pos for p in points]))
+    restored = pickle.loads(pickle.dumps(table[table.id > 1].reset_index(drop=True)))
+    assert np.shares_memory(column_vectors(restored, ["pos_x", "pos_y", "pos_z"]), restored["pos_x"].to_numpy())
+
+    attrs = CartoPointDetailData._attrs_from_table(table)
+    assert all([np.all(pos == p.pos) and point_id == p.id for pos, point_id, p in zip(attrs["pos"], attrs["id"], points)])
+
+def test_legacy_points_table():
+    rng = np.random.default_rng(0)
+    points = [synthetic_point(point_id, rng) for point_id in range(4)]
+    #Layout of previous versions, holding each vector in a single object column
+    legacy_table = pd.DataFrame([{**{k: getattr(p, k) for k in CartoPointDetailData._main_attrs}, "detail": p} for p in points])
+    legacy_table["proj_pos"] = [p.pos.tolist() for p in points]
+    legacy_table["proj_dist"] = np.zeros(len(points))
+    carto_map = CartoMap.__new__(CartoMap)
+    carto_map.__dict__.update(name="1-Map", points=legacy_table, _points_raw=np.array(points))
+
+    restored = pickle.loads(pickle.dumps(carto_map))
+    table = CartoPointDetailData._points_table(points)
+    assert list(restored.points.columns) == list(table.columns) + CartoMap._proj_pos_columns + ["proj_dist"]
+    assert restored.points[table.columns].drop(columns="detail").equals(table.drop(columns="detail"))
+    assert np.all(restored.points_xyz == restored.proj_points_xyz) and np.shares_memory(restored.points_xyz, restored.points["pos_x"].to_numpy())
+
+    restored = pickle.loads(pickle.dumps(restored)) #Current layout is kept as is
+    assert np.all(restored.points_xyz == np.stack([p.pos for p in points]))
@@ -0,0 +1,70 @@
+import pickle
+import xml.etree.ElementTree as ET
+import pytest
+from cartoreader_lite.low_level.lazy import LazyObject, LazySequence
+from cartoreader_lite.low_level.study import CartoAuxMesh
+from cartoreader_lite.high_level.study import PointDetailCache
+from conftest import mesh_content
+
+def test_lazy_sequence():
+    nr_calls = [0, 0, 0]
+    def load(i):
+        nr_calls[i] += 1
+        return i * 10
+
+    seq = LazySequence([lambda i=i: load(i) for i in range(3)], ["a", "b", "c"])
+    assert len(seq) == 3 and seq.names == ["a", "b", "c"]
+    assert nr_calls == [0, 0, 0] and "not loaded" in repr(seq)
+
+    assert seq["b"] == 10 and seq[1] == 10 and seq[-2] == 10
+    assert nr_calls == [0, 1, 0] and seq.is_loaded(1) and not seq.is_loaded("a")
+    assert seq[1:] == [10, 20] and nr_calls == [0, 1, 1]
+
+    seq.release("b")
+    assert not seq.is_loaded(1)
+    assert list(seq) == [0, 10, 20] and nr_calls == [1, 2, 1]
+
+    with pytest.raises(KeyError):
+        seq["d"]
+    with pytest.raises(IndexError):
+        seq[3]
+
+def test_lazy_pickling():
+    seq = pickle.loads(pickle.dumps(LazySequence([dict, list])))
+    assert seq == [{}, []]
+
+    obj = LazyObject(dict)
+    assert not obj.is_loaded and "not loaded" in repr(obj)
+    assert len(obj) == 0 and "a" not in obj and obj.is_loaded
+    obj.update(a=1)
+    assert obj["a"] == 1 and list(obj) == ["a"]
+    assert pickle.loads(pickle.dumps(obj)) == {"a": 1}
+
+def test_lazy_aux_mesh(tmp_path):
+    (tmp_path / "Aux.mesh").write_text(mesh_content)
+    mesh = CartoAuxMesh(ET.fromstring('<Mesh FileName="Aux.mesh"/>'), str(tmp_path), load=False)
+    assert not mesh.is_loaded and "not loaded" in repr(mesh)
+    assert mesh.mesh_data.n_cells == 1 and mesh.is_loaded
+    assert mesh.metadata["NumVertex"] == "3"
+    assert not hasattr(mesh, "affine") #No matrix in the metadata
+
+    mesh = CartoAuxMesh(ET.fromstring('<Mesh FileName="Aux.mesh"/>'), str(tmp_path), load=False)
+    mesh = pickle.loads(pickle.dumps(mesh))
+    assert mesh.is_loaded and mesh.mesh_data.n_points == 3
+
+def test_point_detail_cache():
+    nr_calls = []
+    def load(i):
+        nr_calls.append(i)
+        return i
+
+    cache = PointDetailCache(2)
+    assert [cache.get(i, lambda i=i: load(i)) for i in [0, 1, 0, 2, 0, 1]] == [0, 1, 0, 2, 0, 1]
+    assert nr_calls == [0, 1, 2, 1] and len(cache) == 2 #1 was evicted by 2, since 0 was used more recently
+
+    cache = pickle.loads(pickle.dumps(cache))
+    assert len(cache) == 0 and cache.max_size == 2
+
+    cache = PointDetailCache(0)
+    cache.get(0, lambda: load(0))
+    assert len(cache) == 0
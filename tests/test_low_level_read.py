@@ -1,4 +1,6 @@
 from cartoreader_lite.low_level.study import CartoLLStudy, _parallelize_pool
+from cartoreader_lite.low_level.cache import ParseCache
+from cartoreader_lite.low_level.execution import ExecutionContext
 from concurrent.futures import ThreadPoolExecutor
 import pyvista as pv
 import numpy as np
@@ -32,6 +34,25 @@ class TestLowLevelCartoReader():
         study = CartoLLStudy(study_dir, study_name)
         low_level_sanity_check(study)
 
+    def test_from_dir_cached(self, tmp_path):
+        study_dir = "openep-testingdata/Carto/Export_Study-1-11_25_2021-15-01-32"
+        study_name = "Study 1 11_25_2021 15-01-32.xml"
+        cache = ParseCache(tmp_path / "cache")
+        study = CartoLLStudy(study_dir, study_name, cache=cache)
+        assert cache.size > 0
+        study_cached = CartoLLStudy(study_dir, study_name, cache=cache)
+        low_level_sanity_check(study_cached)
+        assert np.allclose(study.maps[2].mesh.points, study_cached.maps[2].mesh.points)
+        assert study.maps[2].point_raw_data[0][1]["ecg"][1].equals(study_cached.maps[2].point_raw_data[0][1]["ecg"][1])
+
+    @pytest.mark.parametrize("backend", ["serial", "thread"])
+    def test_from_dir_context(self, backend):
+        study_dir = "openep-testingdata/Carto/Export_Study-1-11_25_2021-15-01-32"
+        study_name = "Study 1 11_25_2021 15-01-32.xml"
+        with ExecutionContext(backend, max_workers=2) as context: #Shared by both studies
+            low_level_sanity_check(CartoLLStudy(study_dir, study_name, context=context))
+            low_level_sanity_check(CartoLLStudy(study_dir, study_name, context=context))
+
     def test_from_zip(self):
         study_dir = "openep-testingdata.zip"
         study_name = "Carto/Export_Study-1-11_25_2021-15-01-32/Study 1 11_25_2021 15-01-32.xml"
@@ -1,7 +1,7 @@
 import numpy as np
 import pyvista as pv
 import vtk
-from cartoreader_lite.postprocessing.geometry import project_points, create_tri_mesh
+from cartoreader_lite.postprocessing.geometry import project_points, create_tri_mesh, triangle_arrays, ProjectionIndex
 import trimesh
 
 class TestPostprocessing():
@@ -14,6 +14,28 @@ class TestPostprocessing():
         assert len(tri_mesh.vertices) == 3
         assert len(tri_mesh.faces) == 1
 
+        #Duplicate vertices are merged by default
+        mesh = pv.UnstructuredGrid({vtk.VTK_TRIANGLE: np.array([[0, 1, 2], [3, 1, 2]])}, np.array([[0, 0, 0], [1.0, 0., 0.], [0, 1, 0], [0, 0, 0]]))
+        assert len(create_tri_mesh(mesh).vertices) == 3 and len(create_tri_mesh(mesh, process=False).vertices) == 4
+
+    def test_triangle_arrays(self):
+        mesh = pv.Sphere(theta_resolution=8, phi_resolution=8).cast_to_unstructured_grid()
+        mesh.points = mesh.points.astype(np.float64)
+        verts, faces = triangle_arrays(mesh)
+        assert faces.shape == (mesh.n_cells, 3)
+        assert np.shares_memory(verts, mesh.points) and np.shares_memory(faces, mesh.cell_connectivity)
+        tri_mesh = create_tri_mesh(mesh, process=False)
+        assert np.shares_memory(tri_mesh.faces, mesh.cell_connectivity) and np.shares_memory(tri_mesh.vertices, mesh.points)
+        mesh_float32 = mesh.copy()
+        mesh_float32.points = mesh.points.astype(np.float32)
+        assert not np.shares_memory(create_tri_mesh(mesh_float32, process=False).vertices, mesh_float32.points)
+        assert np.array_equal(tri_mesh.faces, mesh.triangulate().cells_dict[vtk.VTK_TRIANGLE])
+
+        #Meshes with other cells are triangulated
+        quad_mesh = pv.UnstructuredGrid({vtk.VTK_QUAD: np.array([[0, 1, 2, 3]])}, np.array([[0, 0, 0], [1.0, 0, 0], [1, 1, 0], [0, 1, 0]]))
+        verts, faces = triangle_arrays(quad_mesh)
+        assert faces.shape == (2, 3) and not np.shares_memory(faces, quad_mesh.cell_connectivity)
+
     def test_projection(self):
         mesh = pv.UnstructuredGrid({vtk.VTK_TRIANGLE: np.array([[0, 1, 2]])}, 
                                 np.array([[0, 0, 0], [1.0, 0., 0.], [0, 1, 0]]))
@@ -29,4 +51,18 @@ class TestPostprocessing():
         assert np.isclose(proj_dist, 1)
         assert np.all(tri_i == 0)
 
+    def test_projection_index(self):
+        mesh = pv.Sphere(theta_resolution=16, phi_resolution=16).cast_to_unstructured_grid()
+        points = np.random.default_rng(0).normal(size=[1000, 3])
+        points = 0.5 * points / np.linalg.norm(points, axis=-1, keepdims=True) * 1.1
+        index = ProjectionIndex(mesh)
+        assert index.is_valid_for(mesh) and index.nr_triangles == mesh.n_cells
+
+        expected = project_points(mesh, points)
+        for context in ["serial", "thread"]:
+            result = index.project(points, batch_size=128, context=context)
+            assert all([np.array_equal(r, e) for r, e in zip(result, expected)])
+        assert all([np.array_equal(r, e) for r, e in zip(project_points(index, points), expected)])
 
+        mesh.points[0] += 0.1 #Modifications invalidate the index
+        assert not index.is_valid_for(mesh) and not index.is_valid_for(mesh.copy())
@@ -0,0 +1,97 @@
+import numpy as np
+import pyvista as pv
+import pytest
+from cartoreader_lite.low_level.read_mesh import read_mesh_file, find_sections, decode_section
+
+mesh_header = """#TriangulatedMeshVersion2.0
+[GeneralAttributes]
+MeshID                   = 1
+MeshName                 = 
+NumVertex                = 4
+NumTriangle              = 2
+Matrix                   = 1 0 0 0 0 1 0 0 0 0 1 0 0 0 0 1
+
+[VerticesSection]
+;                   X             Y             Z        NormalX   NormalY   NormalZ  GroupID
+
+0 =      0.000000      0.000000      0.000000   0.000000   0.000000   1.000000        0
+1 =      1.000000      0.000000      0.000000   0.000000   0.000000   1.000000        0
+2 =      0.000000      1.000000      0.000000   0.000000   0.000000   1.000000        1
+3 =      1.000000      1.000000      0.500000   0.000000   0.000000   1.000000        1
+
+[TrianglesSection]
+;       Vertex0  Vertex1  Vertex2   NormalX   NormalY   NormalZ  GroupID
+
+0 =           0        1        2   0.000000   0.000000   1.000000  -1000000
+"""
+
+mesh_footer = """
+[VerticesAttributesSection]
+; Attributes
+;    EML  SEML
+
+0 = 0 0
+1 = 0 0
+2 = 0 0
+3 = 0 0
+"""
+
+@pytest.fixture
+def mesh_fname(tmp_path):
+    fname = tmp_path / "test.mesh"
+    fname.write_text(mesh_header + "1 =           1        3        2   0.000000   0.000000   1.000000         0\n" + mesh_footer)
+    return str(fname)
+
+def compare_meshes(mesh1, mesh2):
+    assert type(mesh1) == type(mesh2)
+    assert np.allclose(mesh1.points, mesh2.points)
+    assert np.all(mesh1.cells == mesh2.cells)
+    for data1, data2 in [(mesh1.point_data, mesh2.point_data), (mesh1.cell_data, mesh2.cell_data)]:
+        assert set(data1.keys()) == set(data2.keys())
+        for k in data1.keys():
+            assert data1[k].dtype == data2[k].dtype
+            assert np.allclose(data1[k], data2[k])
+
+def test_find_sections():
+    data = mesh_header.encode()
+    sections = find_sections(data)
+    assert [s[0] for s in sections] == ["GeneralAttributes", "VerticesSection", "TrianglesSection"]
+    assert sections[-1][2] == len(data)
+    assert all([data[start:end].count(b"[") == 0 for _, start, end in sections])
+
+def test_decode_section():
+    sections = find_sections(mesh_header.encode())
+    values, names = decode_section(mesh_header.encode()[sections[1][1]:sections[1][2]])
+    assert names == ["X", "Y", "Z", "NormalX", "NormalY", "NormalZ", "GroupID"]
+    assert values.shape == (4, 7)
+    assert np.allclose(values[3, :3], [1., 1., 0.5])
+
+    with pytest.raises(ValueError):
+        decode_section(b"\n; A B\n0 =   1 2\n2 =   3 4\n") #Non continuous index
+
+def test_read_mesh_engines(mesh_fname):
+    mesh, header = read_mesh_file(mesh_fname)
+    assert type(mesh) == pv.UnstructuredGrid
+    assert mesh.n_points == int(header["NumVertex"]) and mesh.n_cells == int(header["NumTriangle"])
+    assert header["MeshName"] == ""
+    assert np.all(mesh.cell_data["group_id"] == [-1000000, 0])
+    assert np.issubdtype(mesh.cells.dtype, np.integer)
+
+    mesh_pd, header_pd = read_mesh_file(mesh_fname, engine="pandas")
+    assert header == header_pd
+    compare_meshes(mesh, mesh_pd)
+
+def test_read_mesh_fallback(tmp_path):
+    #More data columns than headers can not be decoded directly, but will be parsed by pandas instead
+    fname = tmp_path / "fallback.mesh"
+    fname.write_text(mesh_header.replace("-1000000", "-1000000  5") + "1 =           1        3        2   0.000000   0.000000   1.000000         0  5\n" + mesh_footer)
+    mesh, _ = read_mesh_file(str(fname))
+    mesh_pd, _ = read_mesh_file(str(fname), engine="pandas")
+    compare_meshes(mesh, mesh_pd)
+    assert mesh.n_cells == 2
+
+    #Only vertices
+    fname = tmp_path / "points.mesh"
+    fname.write_text(mesh_header.split("[TrianglesSection]")[0] + "[TrianglesSection]\n;       Vertex0  Vertex1  Vertex2   NormalX   NormalY   NormalZ  GroupID\n\n")
+    mesh, _ = read_mesh_file(str(fname))
+    assert type(mesh) == pv.PolyData and mesh.n_points == 4
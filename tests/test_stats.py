@@ -0,0 +1,47 @@
+import pickle
+import pytest
+from cartoreader_lite.low_level.stats import LoadStats, convert_to_stats, load_stage, null_stage, timed_call
+
+def test_load_stats():
+    events = []
+    stats = LoadStats([lambda event, record: events.append((event, record["stage"]))])
+    with stats.stage("points", map="1-Map") as stage:
+        stage.update(bytes_read=100, items=2)
+        stage.update(bytes_read=50, items=1)
+    with pytest.raises(ValueError):
+        with stats.stage("mesh"):
+            raise ValueError("Broken mesh")
+
+    result, wall_time, cpu_time = timed_call(sum, [1, 2])
+    assert result == 3 and wall_time >= 0 and cpu_time >= 0
+    stats.add("mesh", wall_time, cpu_time, bytes_read=10, items=1)
+
+    assert events == [("start", "points"), ("end", "points"), ("start", "mesh"), ("end", "mesh"), ("start", "mesh"), ("end", "mesh")]
+    points_record, failed_record, mesh_record = stats.records
+    assert points_record["map"] == "1-Map" and points_record["bytes_read"] == 150 and points_record["items"] == 3
+    assert points_record["wall_time"] >= 0 and points_record["error"] is None
+    assert failed_record["error"] == "ValueError: Broken mesh"
+
+    summary = stats.summary()
+    assert list(summary.index) == ["points", "mesh"]
+    assert summary.loc["mesh", "count"] == 2 and summary.loc["mesh", "bytes_read"] == 10
+
+    with stats.stage("study"):
+        with stats.stage("map", map="1-Map") as stage:
+            stage.update(bytes_read=1000) #Enclosing stages are not counted
+    assert stats.total_bytes_read() == 160 and LoadStats().total_bytes_read() == 0
+
+    stats_restored = pickle.loads(pickle.dumps(stats)) #Callbacks are dropped
+    assert len(stats_restored) == 5 and stats_restored.callbacks == []
+    assert len(LoadStats().summary()) == 0
+
+def test_convert_to_stats():
+    stats = LoadStats()
+    assert convert_to_stats(stats) is stats
+    assert convert_to_stats(None) is None and convert_to_stats(False) is None
+    assert isinstance(convert_to_stats(True), LoadStats)
+    assert len(convert_to_stats(print).callbacks) == 1
+
+    assert load_stage(None, "points") is null_stage
+    with load_stage(None, "points") as stage:
+        stage.update(bytes_read=1)
@@ -0,0 +1,115 @@
+import os
+import pickle
+import zipfile
+import numpy as np
+import pandas as pd
+import pytest
+import cartoreader_lite.low_level.storage as storage_module
+from cartoreader_lite.low_level.storage import DirectoryStorage, ZipStorage
+from cartoreader_lite.low_level.study import CartoLLStudy
+from cartoreader_lite.low_level.visitags import read_visitag_dir, visitag_file_type
+from cartoreader_lite.low_level.read_mesh import read_mesh_file
+from cartoreader_lite.low_level.cache import ParseCache
+from conftest import mesh_content
+
+def test_zip_storage(study_paths):
+    study_dir, zip_fname = study_paths
+    storage = ZipStorage(zip_fname)
+    assert sorted(storage.list_files("Study/VisiTagExport")) == ["Study/VisiTagExport/Settings.txt", "Study/VisiTagExport/Sites.txt"]
+    assert len(storage.list_files("")) == 3
+    assert storage.list_dir("Study") == ["Study/Map.mesh"] and storage.list_dir("") == []
+    assert DirectoryStorage().list_dir(study_dir) == [os.path.join(study_dir, "Map.mesh")]
+    assert storage.isfile(os.path.join("Study", "Map.mesh")) and not storage.isfile("Study") and not storage.isfile("N/A")
+    with storage.open("Study/./Map.mesh", "r") as f:
+        assert f.read() == mesh_content
+    with storage.open("Study/Map.mesh", "rb") as f:
+        assert f.read() == mesh_content.encode()
+    assert storage.stat("Study/Map.mesh")[0] == len(mesh_content)
+    with pytest.raises(FileNotFoundError):
+        storage.stat("Study/N/A")
+
+    #Storage will be re-opened after pickling
+    storage_restored = pickle.loads(pickle.dumps(storage))
+    assert storage_restored.zip_fname == storage.zip_fname and storage_restored.isfile("Study/Map.mesh")
+
+def test_zip_storage_close(study_paths, tmp_path, monkeypatch):
+    study_dir, zip_fname = study_paths
+    monkeypatch.setattr(storage_module, "max_open_zip_files", 1)
+    storage = ZipStorage(zip_fname)
+    zip_file = storage.zip_file
+    with storage.open("Study/Map.mesh", "rb") as f:
+        #Closing the archive keeps its members readable
+        storage.close()
+        assert zip_file.fp is None and f.read() == mesh_content.encode()
+    assert storage.zip_file is not zip_file and storage.isfile("Study/Map.mesh") #Re-opened
+
+    #The least recently used archive is closed
+    other_fname = str(tmp_path / "Other.zip")
+    with zipfile.ZipFile(other_fname, "w") as zip_f:
+        zip_f.writestr("a.txt", "first")
+    zip_file = storage.zip_file
+    assert ZipStorage(other_fname).isfile("a.txt") and zip_file.fp is None
+
+    #Archives changed on disk are closed as well
+    zip_file = ZipStorage(other_fname).zip_file
+    with zipfile.ZipFile(other_fname, "a") as zip_f:
+        zip_f.writestr("b.txt", "second")
+    assert ZipStorage(other_fname).isfile("b.txt") and zip_file.fp is None
+
+    #Studies close the archive after loading it
+    with open(os.path.join(study_dir, "Study.xml"), "w") as xml_f:
+        xml_f.write('<Study name="Study"><Maps Count="0"/></Study>')
+    with zipfile.ZipFile(zip_fname, "a") as zip_f:
+        zip_f.write(os.path.join(study_dir, "Study.xml"), "Study/Study.xml")
+    ll_study = CartoLLStudy(zip_fname, "Study/Study", context="serial")
+    assert ll_study.storage.zip_fname == storage.zip_fname and len(storage_module._zip_files) == 0
+
+def test_raw_location(study_paths, tmp_path):
+    study_dir, zip_fname = study_paths
+    assert ZipStorage(zip_fname).raw_location("Study/Map.mesh") is None #Deflated
+    stored_fname = str(tmp_path / "Stored.zip")
+    with zipfile.ZipFile(stored_fname, "w", compression=zipfile.ZIP_STORED) as zip_f:
+        zip_f.writestr("a.txt", "first")
+        zip_f.writestr("b.txt", "second")
+
+    fname, offset = ZipStorage(stored_fname).raw_location("b.txt")
+    with open(fname, "rb") as f:
+        f.seek(offset)
+        assert f.read(6) == b"second"
+    assert DirectoryStorage().raw_location(os.path.join(study_dir, "Map.mesh")) == (os.path.join(study_dir, "Map.mesh"), 0)
+
+def test_zip_readers(study_paths, tmp_path):
+    study_dir, zip_fname = study_paths
+    storage = ZipStorage(zip_fname)
+
+    visitag_data = read_visitag_dir(os.path.join(study_dir, "VisiTagExport"))
+    visitag_data_zip = read_visitag_dir("Study/VisiTagExport", storage=storage)
+    assert visitag_data["Sites"].equals(visitag_data_zip["Sites"])
+    assert visitag_data["Settings"] == visitag_data_zip["Settings"] == {"MinForce": 3, "Name": "Some"}
+
+    mesh, header = read_mesh_file(os.path.join(study_dir, "Map.mesh"))
+    cache = ParseCache(tmp_path / "cache")
+    for _ in range(2):
+        mesh_zip, header_zip = read_mesh_file("Study/Map.mesh", storage=storage, cache=cache)
+        assert header == header_zip
+        assert np.allclose(mesh.points, mesh_zip.points) and np.all(mesh.cells == mesh_zip.cells)
+
+    assert cache.invalidate(zip_fname) == 1
+
+def test_visitag_lazy(study_paths):
+    study_dir, zip_fname = study_paths
+    storage = ZipStorage(zip_fname)
+    assert visitag_file_type("Study/VisiTagExport/Settings.txt", storage) == "settings"
+    assert visitag_file_type("Study/VisiTagExport/Sites.txt", storage) == "table"
+
+    visitag_data = read_visitag_dir("Study/VisiTagExport", storage=storage)
+    assert sorted(visitag_data.keys()) == ["Settings", "Sites"] and "Sites" in visitag_data
+    assert not visitag_data.is_loaded("Sites") and not visitag_data.is_loaded("Settings")
+    chunks = list(visitag_data.iter_chunks("Sites", chunk_size=1))
+    assert len(chunks) == 2 and not visitag_data.is_loaded("Sites")
+    assert pd.concat(chunks).equals(visitag_data["Sites"]) and visitag_data.is_loaded("Sites")
+
+    #Parsed files are kept, the remaining files stay lazy
+    visitag_data_restored = pickle.loads(pickle.dumps(visitag_data))
+    assert visitag_data_restored.is_loaded("Sites") and not visitag_data_restored.is_loaded("Settings")
+    assert visitag_data_restored["Settings"]["MinForce"] == 3
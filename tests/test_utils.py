@@ -1,6 +1,9 @@
-from cartoreader_lite.low_level.utils import snake_to_camel_case, simplify_dataframe_dtypes, convert_df_dtypes
+import os
+from cartoreader_lite.low_level.utils import snake_to_camel_case, simplify_dataframe_dtypes, convert_df_dtypes, balance_batches, point_data_sizes, read_point_data, read_point_data_batch, unpack_point_data_batch, read_ecg_files, read_ecg_file, interpolate_time_data, resample_time_columns, column_vectors, memory_nbytes, mesh_nbytes
+import pytest
 import pandas as pd
 import numpy as np
+import pyvista as pv
 
 def test_snake_to_camel_case():
     test_strings = ["camel_case", "imp_ort_ant_var"]
@@ -35,4 +38,104 @@ def test_convert_df_dtypes():
 
     convert_df_dtypes(df, inplace=True)
     assert np.issubdtype(df.a.dtype, np.integer)
-    assert np.issubdtype(df.b.dtype, np.floating)
\ No newline at end of file
+    assert np.issubdtype(df.b.dtype, np.floating)
+
+def test_balance_batches():
+    sizes = np.array([1, 10, 3, 7, 5, 5])
+    batches = balance_batches(sizes, 3)
+    assert len(batches) == 3 and sorted(np.concatenate(batches).tolist()) == list(range(6))
+    batch_sizes = [sizes[batch].sum() for batch in batches]
+    assert batch_sizes == sorted(batch_sizes, reverse=True) and max(batch_sizes) - min(batch_sizes) <= 3
+    assert len(balance_batches(sizes[:2], 4)) == 2 #No empty batches
+
+def test_read_point_data_batch(tmp_path):
+    ecg_header = "".join([f"{name:<15s}" for name in ["I(110)", "II(111)", "20A_1(22)"]])
+    for point_id, nr_samples in [(1, 4), (2, 6)]:
+        (tmp_path / f"Map_P{point_id}_Point_Export.xml").write_text(
+            f'<Point ID="{point_id}"><ECG FileName="Map_P{point_id}_ECG_Export.txt"/><WOI From="-10" To="10"/></Point>')
+        (tmp_path / f"Map_P{point_id}_ECG_Export.txt").write_text("ECG_Export_4.0\nRaw ECG to MV (gain) = 0.003000\nChannels\n" + ecg_header + "\n" +
+                                                                 "\n".join([f"{i} {-i} {point_id}" for i in range(nr_samples)]) + "\n")
+
+    (tmp_path / "VisiTagExport").mkdir()
+    (tmp_path / "VisiTagExport" / "Map_P1_Grid.txt").write_text("Not a point file")
+    sizes = point_data_sizes("Map", [2, 1, 3], str(tmp_path)).tolist()
+    assert sizes[1] == sum([os.path.getsize(tmp_path / f"Map_P1_{suffix}") for suffix in ["Point_Export.xml", "ECG_Export.txt"]]) and sizes[2] == 0
+    points_data, ecg_batch = read_point_data_batch("Map", [1, 2], str(tmp_path))
+    assert ecg_batch["values"].dtype == np.int16 and ecg_batch["values"].size == 3 * (4 + 6)
+    assert ecg_batch["offsets"].tolist() == [[0, 4, 3], [12, 6, 3]] and len(ecg_batch["headers"]) == 1
+
+    points_data = unpack_point_data_batch(points_data, ecg_batch)
+    for (point_id, nr_samples), (metadata, data) in zip([(1, 4), (2, 6)], points_data):
+        expected = read_point_data("Map", point_id, str(tmp_path))[1]["ecg"][1]
+        assert metadata["WOI"]["From"] == "-10" and data["ecg"][0][0] == "ECG_Export_4.0"
+        assert data["ecg"][1].equals(expected) and data["ecg"][1].shape == (nr_samples, 3)
+
+def test_read_ecg_files(tmp_path):
+    ecg_header = "".join([f"{name:<15s}" for name in ["I(110)", "II(111)", "20A_1(22)"]])
+    bodies = ["1 -2 3\n4 5 -6\n", "-32768    32767 0\r\n7 8 9\r\n10 11 12", "1 2 3\n\n4 5 6\n"] #The last file has an empty line
+    fnames = []
+    for i, body in enumerate(bodies):
+        fnames.append(str(tmp_path / f"Map_P{i}_ECG_Export.txt"))
+        with open(fnames[-1], "w", newline="") as f:
+            f.write("ECG_Export_4.0\nRaw ECG to MV (gain) = 0.003000\nChannels\n" + ecg_header + "\n" + body)
+
+    metadata, headers, values, nr_samples = read_ecg_files(fnames[:2])
+    assert metadata[1][1] == "Raw ECG to MV (gain) = 0.003000" and headers[0] == ["I(110)", "II(111)", "20A_1(22)"]
+    assert values.dtype == np.int16 and nr_samples.tolist() == [2, 3]
+    assert values[6:9].tolist() == [-32768, 32767, 0]
+    for engine in ["numpy", "pandas"]:
+        assert np.array_equal(read_ecg_files(fnames, engine=engine)[2], read_ecg_files(fnames, engine="pandas")[2])
+
+    metadata, ecg_data = read_ecg_file(fnames[2]) #Falls back to pandas
+    assert ecg_data.shape == (2, 3) and ecg_data.dtypes.unique().tolist() == [np.int16]
+    assert ecg_data.columns.tolist() == headers[0] and ecg_data.to_numpy().tolist() == [[1, 2, 3], [4, 5, 6]]
+
+@pytest.mark.parametrize("kind", ["linear", "nearest", "previous", "next", "quadratic", "cubic"])
+def test_interpolate_time_data(kind):
+    rng = np.random.default_rng(0)
+    times = [np.sort(rng.choice(np.arange(0, 20000, 7), 500, replace=False)), np.arange(50, 19000, 100)]
+    dfs = [pd.DataFrame({"TimeStamp": t, "Session": t // 5000, "Force": rng.random(len(t)), "Tag": rng.choice(["a", "b"], len(t))}) for t in times]
+    dfs[0].loc[10, "Force"] = np.nan
+    dfs[1] = dfs[1].drop(columns=["Force", "Session"]).assign(Impedance=rng.random(len(times[1])) * 100).iloc[::-1] #Unsorted time stamps
+    time_steps = np.arange(100, 18900, 100)
+
+    merged = interpolate_time_data(dfs, "TimeStamp", time_steps, kind=kind)
+    merged_interp1d = interpolate_time_data(dfs, "TimeStamp", time_steps, engine="interp1d", kind=kind)
+    assert merged.columns.tolist() == merged_interp1d.columns.tolist() == ["TimeStamp", "Force", "Impedance", "Session", "Tag"]
+    assert merged.Session.dtype == merged_interp1d.Session.dtype and np.all(merged.Session == merged_interp1d.Session)
+    assert np.all(merged.Tag == merged_interp1d.Tag)
+    for col_name in ["Force", "Impedance"]:
+        assert np.allclose(merged[col_name], merged_interp1d[col_name], equal_nan=True)
+
+    with pytest.raises(ValueError):
+        resample_time_columns(dfs[0], "TimeStamp", [-1.], kind)
+
+def test_column_vectors():
+    xyz = np.arange(15, dtype=np.float64).reshape([5, 3])
+    df = pd.concat([pd.DataFrame({"id": np.arange(5)}), pd.DataFrame(xyz, columns=["x", "y", "z"]), pd.DataFrame({"w": np.ones(5)})], axis=1)
+    view = column_vectors(df, ["x", "y", "z"])
+    assert np.all(view == xyz) and np.shares_memory(view, df["x"].to_numpy()) and not view.flags.writeable
+    assert np.all(column_vectors(df, ["z", "x"]) == xyz[:, [2, 0]])
+
+    df["y"] = -df["y"] #Columns no longer share a block
+    stacked = column_vectors(df, ["x", "y", "z"])
+    assert np.all(stacked == xyz * [1, -1, 1]) and not np.shares_memory(stacked, df["x"].to_numpy())
+
+def test_memory_nbytes(tmp_path):
+    values = np.zeros([100, 10])
+    seen = {}
+    assert memory_nbytes([values, values[10:], values.T], seen=seen) == values.nbytes #Views share the buffer
+    assert memory_nbytes(values, seen=seen) == 0 and memory_nbytes(values) == values.nbytes
+    assert memory_nbytes({"a": "text", "b": 1}) == 0 and memory_nbytes({"a": "text", "b": 1}, deep=True) > 0
+
+    df = pd.DataFrame({"a": np.arange(10), "b": ["x"] * 10})
+    assert memory_nbytes(df) == df.memory_usage(index=True).sum() and memory_nbytes(df, deep=True) > memory_nbytes(df)
+
+    np.save(tmp_path / "values.npy", values)
+    assert memory_nbytes(np.load(tmp_path / "values.npy", mmap_mode="r")) == 0 #Backed by the file
+
+    mesh = pv.Sphere(theta_resolution=8, phi_resolution=8).cast_to_unstructured_grid()
+    mesh_usage = mesh_nbytes(mesh)
+    assert mesh_usage["points"] == mesh.points.nbytes and mesh_usage["cells"] >= mesh.cell_connectivity.nbytes + mesh.celltypes.nbytes
+    assert mesh_usage["data"] == sum([mesh.point_data[k].nbytes for k in mesh.point_data.keys()])
+    assert memory_nbytes(mesh) == sum(mesh_usage.values())